@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import AttendanceRecord, AttendanceCorrection
+from .models import AttendanceRecord, AttendanceCorrection, AttendanceMonthlySummary
 
 @admin.register(AttendanceRecord)
 class AttendanceRecordAdmin(admin.ModelAdmin):
@@ -36,3 +36,20 @@ class AttendanceCorrectionAdmin(admin.ModelAdmin):
     )
     ordering = ('-created_at',)
     readonly_fields = ('created_at',)
+
+
+@admin.register(AttendanceMonthlySummary)
+class AttendanceMonthlySummaryAdmin(admin.ModelAdmin):
+    list_display = (
+        'user',
+        'year',
+        'month',
+        'present_days',
+        'late_logins',
+        'early_logouts',
+        'worked_hours'
+    )
+    list_filter = ('year', 'month')
+    search_fields = ('user__email', 'user__first_name', 'user__last_name')
+    ordering = ('-year', '-month')
+    readonly_fields = ('updated_at',)
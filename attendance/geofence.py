@@ -0,0 +1,197 @@
+import math
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+from django.conf import settings
+
+from config.cache_versions import get_version
+from organizations.models import OfficeLocation
+
+EARTH_RADIUS_METERS = 6371000
+METERS_PER_DEGREE = 111320
+# Grid cell size of the office index, roughly 1.1 km of latitude
+GRID_DEGREES = 0.01
+
+# organization id -> (version, built at, OfficeIndex), least recently used
+# first. Rebuilt when the shared version moves or the entry is too old.
+_office_indexes = OrderedDict()
+_lock = threading.Lock()
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance in meters between points given in degrees.
+    Accepts scalars or arrays and broadcasts like any NumPy ufunc.
+    """
+    lat1, lon1, lat2, lon2 = (
+        np.radians(np.asarray(value, dtype=float))
+        for value in (lat1, lon1, lat2, lon2)
+    )
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+class OfficeGeofence:
+    """
+    Coordinates of a set of offices held as NumPy arrays, so the distance
+    from one or many punches to every office is a single vectorized call.
+    """
+
+    def __init__(self, offices):
+        self.offices = list(offices)
+        self.index = {office.id: i for i, office in enumerate(self.offices)}
+        self.latitudes = np.array([float(o.latitude) for o in self.offices])
+        self.longitudes = np.array([float(o.longitude) for o in self.offices])
+        self.radii = np.array(
+            [o.geo_radius_meters for o in self.offices], dtype=float
+        )
+        self.active = np.array([o.is_active for o in self.offices], dtype=bool)
+
+    def __len__(self):
+        return len(self.offices)
+
+    def distance_matrix(self, latitudes, longitudes):
+        """
+        Distances of shape (punches, offices)
+        """
+        latitudes = np.asarray(latitudes, dtype=float).reshape(-1, 1)
+        longitudes = np.asarray(longitudes, dtype=float).reshape(-1, 1)
+        return haversine(latitudes, longitudes, self.latitudes, self.longitudes)
+
+    def distances_to(self, office_ids, latitudes, longitudes):
+        """
+        Element-wise distance from each punch to its own office
+        """
+        columns = np.array([self.index[office_id] for office_id in office_ids], dtype=int)
+        distances = haversine(
+            latitudes,
+            longitudes,
+            self.latitudes[columns],
+            self.longitudes[columns],
+        )
+        return distances, distances <= self.radii[columns]
+
+    def nearest_within(self, distances):
+        """
+        Column of the nearest active office whose radius contains each row
+        of ``distances``, or -1 when the punch is outside every geofence.
+        Inactive offices only serve distances to records already at them.
+        """
+        if not self.offices:
+            return np.full(len(distances), -1)
+        inside = np.where((distances <= self.radii) & self.active, distances, np.inf)
+        nearest = inside.argmin(axis=1)
+        return np.where(np.isfinite(inside.min(axis=1)), nearest, -1)
+
+    def locate_many(self, latitudes, longitudes):
+        """
+        Resolve many punches at once. Returns a list of
+        ``(office, distance)`` pairs, ``(None, None)`` when a punch is not
+        inside any office's geofence.
+        """
+        distances = self.distance_matrix(latitudes, longitudes)
+        columns = self.nearest_within(distances)
+        return [
+            (self.offices[column], float(distances[row, column]))
+            if column >= 0 else (None, None)
+            for row, column in enumerate(columns)
+        ]
+
+    def nearest(self, latitude, longitude):
+        return self.locate_many([latitude], [longitude])[0]
+
+
+class OfficeIndex(OfficeGeofence):
+    """
+    Active offices of one organization held in worker memory, with a grid
+    of cells mapping to every office whose geofence overlaps the cell.
+    Lookups by id and nearest-office checks need no database query.
+    """
+
+    def __init__(self, offices):
+        super().__init__(offices)
+        self.grid = defaultdict(list)
+        for column, office in enumerate(self.offices):
+            latitude = float(office.latitude)
+            longitude = float(office.longitude)
+            lat_span = office.geo_radius_meters / METERS_PER_DEGREE
+            lon_span = lat_span / max(math.cos(math.radians(latitude)), 0.01)
+            min_cell = _cell(latitude - lat_span, longitude - lon_span)
+            max_cell = _cell(latitude + lat_span, longitude + lon_span)
+            for row in range(min_cell[0], max_cell[0] + 1):
+                for col in range(min_cell[1], max_cell[1] + 1):
+                    self.grid[(row, col)].append(column)
+
+    def get(self, office_id):
+        try:
+            column = self.index.get(int(office_id))
+        except (TypeError, ValueError):
+            return None
+        return self.offices[column] if column is not None else None
+
+    def nearest(self, latitude, longitude):
+        columns = self.grid.get(_cell(float(latitude), float(longitude)))
+        if not columns:
+            return None, None
+
+        columns = np.array(columns)
+        distances = haversine(
+            latitude,
+            longitude,
+            self.latitudes[columns],
+            self.longitudes[columns],
+        )
+        inside = np.flatnonzero(distances <= self.radii[columns])
+        if not len(inside):
+            return None, None
+        best = inside[distances[inside].argmin()]
+        return self.offices[columns[best]], float(distances[best])
+
+
+def _cell(latitude, longitude):
+    return (
+        math.floor(latitude / GRID_DEGREES),
+        math.floor(longitude / GRID_DEGREES),
+    )
+
+
+def office_index_version_key(organization_id):
+    return f"attendance:office-index:{organization_id}"
+
+
+def get_office_index(organization_id):
+    """
+    The organization's OfficeIndex, rebuilt after an OfficeLocation of that
+    organization was saved or deleted in any worker. Without a shared cache
+    other workers do not see the version move, so indexes also expire after
+    OFFICE_INDEX_MAX_AGE seconds.
+    """
+    version = get_version(office_index_version_key(organization_id))
+    now = time.monotonic()
+    with _lock:
+        cached = _office_indexes.get(organization_id)
+        if (
+            cached is not None
+            and cached[0] == version
+            and now - cached[1] < settings.OFFICE_INDEX_MAX_AGE
+        ):
+            _office_indexes.move_to_end(organization_id)
+            return cached[2]
+
+    index = OfficeIndex(
+        OfficeLocation.objects.filter(
+            organization_id=organization_id,
+            is_active=True,
+        )
+    )
+    with _lock:
+        _office_indexes[organization_id] = (version, now, index)
+        _office_indexes.move_to_end(organization_id)
+        while len(_office_indexes) > settings.OFFICE_INDEX_CACHE_SIZE:
+            _office_indexes.popitem(last=False)
+    return index
@@ -1,22 +1,30 @@
 import strawberry
 from datetime import date, time
-from typing import Optional
+from typing import List, Optional
 
 from attendance.graphql.types import (
     AttendanceRecordType,
-    AttendanceCorrectionType
+    AttendanceCorrectionType,
+    CorrectionReviewResult,
+    PunchResult,
 )
 from attendance.models import AttendanceRecord, AttendanceCorrection
-from attendance.services import check_in_user, check_out_user
+from attendance.services import (
+    check_in_user,
+    check_out_user,
+    ingest_punches,
+    review_corrections,
+)
 from django.db import transaction
 from graphql import GraphQLError
 
 @strawberry.input
 class CheckInInput:
-    office_location_id: strawberry.ID
     latitude: float
     longitude: float
     login_time: time
+    # Omit to check in at the nearest office whose geofence contains the punch
+    office_location_id: Optional[strawberry.ID] = None
 
 @strawberry.input
 class CheckOutInput:
@@ -24,6 +32,16 @@ class CheckOutInput:
     longitude: float
     logout_time: time
  
+@strawberry.input
+class PunchInput:
+    user_id: strawberry.ID
+    punch_type: str
+    punch_time: time
+    latitude: float
+    longitude: float
+    office_location_id: Optional[strawberry.ID] = None
+    attendance_date: Optional[date] = None
+
 @strawberry.input
 class AttendanceCorrectionInput:
     attendance_record_id: strawberry.ID
@@ -76,6 +94,42 @@ class AttendanceMutation:
 
         return attendance
 
+    @strawberry.mutation
+    def bulk_punch(
+        self,
+        info,
+        input: List[PunchInput],
+    ) -> List[PunchResult]:
+        """
+        Batch upload from kiosks / biometric terminals
+        """
+        user = info.context.request.user
+        if not user.is_authenticated:
+            raise Exception("Not authenticated")
+        if user.role not in ["hr", "admin"]:
+            raise GraphQLError("Not authorized")
+
+        try:
+            results = ingest_punches(
+                [
+                    {
+                        "user_id": punch.user_id,
+                        "office_id": punch.office_location_id,
+                        "punch_type": punch.punch_type,
+                        "attendance_date": punch.attendance_date,
+                        "time": punch.punch_time,
+                        "latitude": punch.latitude,
+                        "longitude": punch.longitude,
+                    }
+                    for punch in input
+                ],
+                organization_id=user.organization_id,
+            )
+        except ValueError as e:
+            raise GraphQLError(str(e))
+
+        return [PunchResult(**result) for result in results]
+
         
     @strawberry.mutation
     def request_attendance_correction(
@@ -86,7 +140,7 @@ class AttendanceMutation:
 
         user = info.context.request.user
 
-        record = AttendanceRecord.objects.get(id=input.attendance_record_id)
+        record = AttendanceRecord.objects.select_related("user").get(id=input.attendance_record_id)
 
         return AttendanceCorrection.objects.create(
             attendance_record=record,
@@ -118,7 +172,7 @@ class AttendanceMutation:
         # 🔎 Fetch correction
         try:
             correction = AttendanceCorrection.objects.select_related(
-                "attendance_record"
+                "attendance_record__user"
             ).get(id=correction_id)
         except AttendanceCorrection.DoesNotExist:
             raise GraphQLError("Attendance correction not found")
@@ -139,4 +193,32 @@ class AttendanceMutation:
 
         return True
 
+    @strawberry.mutation
+    def review_attendance_corrections(
+        self,
+        info,
+        correction_ids: List[strawberry.ID],
+        status: str,
+        approval_comments: Optional[str] = None,
+    ) -> List[CorrectionReviewResult]:
+        """
+        Approve or reject many corrections at once (month-end clean-up)
+        """
+        approver = info.context.request.user
+        if not approver.is_authenticated:
+            raise GraphQLError("Authentication required")
+        if approver.role not in ["admin", "hr", "manager"]:
+            raise GraphQLError("Not authorized")
 
+        try:
+            results = review_corrections(
+                correction_ids,
+                status,
+                approver,
+                approval_comments,
+                organization_id=approver.organization_id,
+            )
+        except ValueError as e:
+            raise GraphQLError(str(e))
+
+        return [CorrectionReviewResult(**result) for result in results]
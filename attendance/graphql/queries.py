@@ -1,14 +1,60 @@
 import strawberry
 from typing import List, Optional
 from datetime import date
-from attendance.models import AttendanceRecord, AttendanceCorrection
-from attendance.graphql.types import AttendanceRecordType, AttendanceCorrectionType
+from attendance.models import AttendanceRecord, AttendanceCorrection, AttendanceMonthlySummary
+from attendance.graphql.types import (
+    AttendanceRecordType,
+    AttendanceCorrectionType,
+    AttendanceMonthlySummaryType,
+)
+from graphql_utils.pagination import Connection, paginate
 
 @strawberry.input
 class AttendanceInput:
     start_date: Optional[date]
     end_date: Optional[date]
 
+
+def my_attendance_queryset(user, input):
+    qs = AttendanceRecord.objects.filter(user=user)
+
+    if not input:
+        return qs.filter(attendance_date=date.today())
+
+    if input.start_date and input.end_date:
+        qs = qs.filter(
+            attendance_date__gte=input.start_date,
+            attendance_date__lte=input.end_date,
+        )
+    elif input.start_date:
+        qs = qs.filter(attendance_date__gte=input.start_date)
+    elif input.end_date:
+        qs = qs.filter(attendance_date__lte=input.end_date)
+    else:
+        qs = qs.filter(attendance_date=date.today())
+
+    return qs
+
+
+def attendance_by_user_queryset(requester, user_id):
+    if requester.role not in ["hr", "admin", "manager"]:
+        raise Exception("Not authorized")
+
+    return AttendanceRecord.objects.filter(user_id=user_id)
+
+
+def attendance_corrections_queryset(user, status):
+    qs = AttendanceCorrection.objects.all()
+
+    if user.role == "employee":
+        qs = qs.filter(requested_by=user)
+
+    if status:
+        qs = qs.filter(status=status)
+
+    return qs
+
+
 @strawberry.type
 class AttendanceQuery:
 
@@ -22,28 +68,32 @@ class AttendanceQuery:
         Logged-in user's attendance
         """
         user = info.context.request.user
-
-        qs = AttendanceRecord.objects.filter(user=user)
-
-        if not input:
-            return qs.filter(attendance_date=date.today())
-
-        if input.start_date and input.end_date:
-            qs = qs.filter(
-                attendance_date__gte=input.start_date,
-                attendance_date__lte=input.end_date,
-            )
-        elif input.start_date:
-            qs = qs.filter(attendance_date__gte=input.start_date)
-        elif input.end_date:
-            qs = qs.filter(attendance_date__lte=input.end_date)
-        else:
-            qs = qs.filter(attendance_date=date.today())
-
-        return qs
-
+        return my_attendance_queryset(user, input)
 
     @strawberry.field
+    def my_attendance_connection(
+        self,
+        info,
+        input: Optional[AttendanceInput] = None,
+        first: Optional[int] = None,
+        after: Optional[str] = None,
+    ) -> Connection[AttendanceRecordType]:
+        """
+        Logged-in user's attendance, newest first, one page at a time
+        """
+        user = info.context.request.user
+        return paginate(
+            my_attendance_queryset(user, input),
+            info,
+            keys=("-attendance_date", "-id"),
+            first=first,
+            after=after,
+        )
+
+
+    @strawberry.field(
+        deprecation_reason="Unbounded, use attendanceByUserConnection"
+    )
     def attendance_by_user(
         self,
         info,
@@ -53,13 +103,31 @@ class AttendanceQuery:
         HR / Manager view
         """
         requester = info.context.request.user
-
-        if requester.role not in ["hr", "admin", "manager"]:
-            raise Exception("Not authorized")
-
-        return AttendanceRecord.objects.filter(user_id=user_id)
+        return attendance_by_user_queryset(requester, user_id)
 
     @strawberry.field
+    def attendance_by_user_connection(
+        self,
+        info,
+        user_id: strawberry.ID,
+        first: Optional[int] = None,
+        after: Optional[str] = None,
+    ) -> Connection[AttendanceRecordType]:
+        """
+        HR / Manager view, newest first, one page at a time
+        """
+        requester = info.context.request.user
+        return paginate(
+            attendance_by_user_queryset(requester, user_id),
+            info,
+            keys=("-attendance_date", "-id"),
+            first=first,
+            after=after,
+        )
+
+    @strawberry.field(
+        deprecation_reason="Unbounded, use attendanceCorrectionsConnection"
+    )
     def attendance_corrections(
         self,
         info,
@@ -67,13 +135,48 @@ class AttendanceQuery:
     ) -> List[AttendanceCorrectionType]:
 
         user = info.context.request.user
+        return attendance_corrections_queryset(user, status)
 
-        qs = AttendanceCorrection.objects.all()
+    @strawberry.field
+    def attendance_corrections_connection(
+        self,
+        info,
+        status: Optional[str] = None,
+        first: Optional[int] = None,
+        after: Optional[str] = None,
+    ) -> Connection[AttendanceCorrectionType]:
+
+        user = info.context.request.user
+        return paginate(
+            attendance_corrections_queryset(user, status),
+            info,
+            keys=("-created_at", "-id"),
+            first=first,
+            after=after,
+        )
 
+    @strawberry.field
+    def monthly_attendance_summaries(
+        self,
+        info,
+        year: int,
+        month: int,
+        user_id: Optional[strawberry.ID] = None,
+        first: Optional[int] = None,
+        after: Optional[str] = None,
+    ) -> Connection[AttendanceMonthlySummaryType]:
+        """
+        Precomputed per-employee monthly figures. Employees only see their own.
+        """
+        user = info.context.request.user
+
+        qs = AttendanceMonthlySummary.objects.filter(year=year, month=month)
         if user.role == "employee":
-            qs = qs.filter(requested_by=user)
+            qs = qs.filter(user=user)
+        else:
+            qs = qs.filter(user__organization_id=user.organization_id)
 
-        if status:
-            qs = qs.filter(status=status)
+        if user_id:
+            qs = qs.filter(user_id=user_id)
 
-        return qs
+        return paginate(qs, info, keys=("id",), first=first, after=after)
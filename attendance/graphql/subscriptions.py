@@ -0,0 +1,40 @@
+from typing import AsyncGenerator, Optional
+
+import strawberry
+from asgiref.sync import sync_to_async
+
+from attendance.geofence import get_office_index
+from attendance.graphql.types import AttendanceEventType
+from attendance.services import office_channel, organization_channel
+from graphql_utils.pubsub import subscribe
+
+
+@strawberry.type
+class AttendanceSubscription:
+
+    @strawberry.subscription
+    async def attendance_events(
+        self,
+        info,
+        office_id: Optional[strawberry.ID] = None,
+    ) -> AsyncGenerator[AttendanceEventType, None]:
+        """
+        Live check-ins, check-outs and corrections of the organization, or
+        of one of its offices. HR / Manager view.
+        """
+        user = info.context.request.user
+        if not user.is_authenticated:
+            raise Exception("Not authenticated")
+        if user.role not in ["hr", "admin", "manager"]:
+            raise Exception("Not authorized")
+
+        if office_id:
+            offices = await sync_to_async(get_office_index)(user.organization_id)
+            if offices.get(office_id) is None:
+                raise Exception("Office location not found")
+            channel = office_channel(office_id)
+        else:
+            channel = organization_channel(user.organization_id)
+
+        async for message in subscribe(channel):
+            yield AttendanceEventType.from_message(message)
@@ -1,9 +1,16 @@
+from datetime import date, datetime, time
 from typing import Optional
 import strawberry
 import strawberry.django
 from strawberry import auto
 
-from attendance.models import AttendanceRecord, AttendanceCorrection
+from attendance.models import (
+    AttendanceRecord,
+    AttendanceCorrection,
+    AttendanceMonthlySummary,
+    latest_correction_prefetch,
+)
+from users.cache import get_cached_user
 from users.graphql.types import UserType
 from organizations.graphql.types import OfficeLocationType
 
@@ -33,27 +40,38 @@ class AttendanceRecordType:
     created_at: auto
     updated_at: auto
 
-    @strawberry.field
+    @strawberry.django.field(prefetch_related=latest_correction_prefetch())
     def correction_reason(self) -> Optional[str]:
-        correction = (
-            self.attendancecorrection_set.order_by("-created_at").first()
-        )
+        correction = self.latest_correction
         return correction.reason if correction else None
 
-    @strawberry.field
+    @strawberry.django.field(prefetch_related=latest_correction_prefetch())
     def correction_status(self) -> Optional[str]:
-        correction = (
-            self.attendancecorrection_set.order_by("-created_at").first()
-        )
+        correction = self.latest_correction
         return correction.status if correction else None
 
-    @strawberry.field
+    @strawberry.django.field(prefetch_related=latest_correction_prefetch())
     def approval_comment(self) -> Optional[str]:
-        correction = (
-            self.attendancecorrection_set.order_by("-created_at").first()
-        )
+        correction = self.latest_correction
         return correction.approval_comments if correction else None
 
+
+@strawberry.type
+class PunchResult:
+    index: int
+    success: bool
+    error: Optional[str] = None
+    attendance_id: Optional[strawberry.ID] = None
+    status: Optional[str] = None
+    distance: Optional[float] = None
+
+@strawberry.type
+class CorrectionReviewResult:
+    correction_id: strawberry.ID
+    success: bool
+    status: Optional[str] = None
+    error: Optional[str] = None
+
 @strawberry.django.type(AttendanceCorrection)
 class AttendanceCorrectionType:
     id: strawberry.ID
@@ -69,3 +87,57 @@ class AttendanceCorrectionType:
 
     created_at: auto
 
+@strawberry.django.type(AttendanceMonthlySummary)
+class AttendanceMonthlySummaryType:
+    id: strawberry.ID
+    user: UserType
+    year: auto
+    month: auto
+    present_days: auto
+    late_logins: auto
+    early_logouts: auto
+    worked_hours: auto
+    updated_at: auto
+
+
+@strawberry.type
+class AttendanceEventType:
+    """
+    A check-in, check-out or correction, as pushed to live dashboards
+    """
+    kind: str
+    record_id: strawberry.ID
+    user_id: strawberry.ID
+    office_location_id: Optional[strawberry.ID]
+    attendance_date: date
+    login_time: Optional[time]
+    logout_time: Optional[time]
+    status: Optional[str]
+    worked_hours: Optional[float]
+    is_within_geofence: bool
+    correction_id: Optional[strawberry.ID]
+    occurred_at: datetime
+
+    @classmethod
+    def from_message(cls, message):
+        def parse(value, type_):
+            return type_.fromisoformat(value) if value else None
+
+        return cls(
+            kind=message["kind"],
+            record_id=message["record_id"],
+            user_id=message["user_id"],
+            office_location_id=message["office_location_id"],
+            attendance_date=parse(message["attendance_date"], date),
+            login_time=parse(message["login_time"], time),
+            logout_time=parse(message["logout_time"], time),
+            status=message["status"],
+            worked_hours=float(message["worked_hours"]) if message["worked_hours"] is not None else None,
+            is_within_geofence=message["is_within_geofence"],
+            correction_id=message["correction_id"],
+            occurred_at=parse(message["occurred_at"], datetime),
+        )
+
+    @strawberry.field
+    def user(self) -> Optional[UserType]:
+        return get_cached_user(self.user_id)
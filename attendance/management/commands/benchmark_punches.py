@@ -0,0 +1,72 @@
+import time
+from datetime import time as time_type
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from attendance.services import check_in_user, check_out_user
+from organizations.models import Organization, OfficeLocation
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure database round trips and throughput of check-in/check-out "
+        "against throwaway data (rolled back afterwards)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=200)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            users, office = self._seed(options["users"])
+
+            for label, punch in (
+                ("check-in", lambda user: check_in_user(
+                    user, office.id, 12.9717, 77.5947, time_type(9, 45)
+                )),
+                ("check-out", lambda user: check_out_user(
+                    user, 12.9717, 77.5947, time_type(18, 15)
+                )),
+            ):
+                started = time.perf_counter()
+                with CaptureQueriesContext(connection) as queries:
+                    for user in users:
+                        punch(user)
+                elapsed = time.perf_counter() - started
+
+                self.stdout.write(
+                    f"{label}: {len(users)} punches, "
+                    f"{len(queries) / len(users):.2f} queries/punch, "
+                    f"{len(users) / elapsed:.0f} punches/s"
+                )
+
+            # Monthly summaries are refreshed by a task after commit, which
+            # never happens here
+            transaction.set_rollback(True)
+
+    def _seed(self, count):
+        organization = Organization.objects.create(
+            name="Punch benchmark",
+            headquarters_address="-",
+        )
+        office = OfficeLocation.objects.create(
+            organization=organization,
+            name="Benchmark office",
+            address="-",
+            latitude="12.97160000",
+            longitude="77.59460000",
+            geo_radius_meters=200,
+        )
+        users = CustomUser.objects.bulk_create(
+            CustomUser(
+                username=f"punch-benchmark-{i}",
+                email=f"punch-benchmark-{i}@example.com",
+                organization=organization,
+                office_location=office,
+            )
+            for i in range(count)
+        )
+        return users, office
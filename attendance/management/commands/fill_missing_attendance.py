@@ -0,0 +1,34 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from attendance.services import fill_missing_attendance
+from organizations.models import Organization
+
+
+class Command(BaseCommand):
+    help = "Create absent / leave / holiday records for employees who did not punch"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", help="Day to fill (YYYY-MM-DD), defaults to yesterday")
+        parser.add_argument("--days", type=int, default=1, help="Number of days ending at --date")
+        parser.add_argument("--organization", type=int)
+
+    def handle(self, *args, **options):
+        end = (
+            date.fromisoformat(options["date"]) if options["date"]
+            else timezone.localdate() - timedelta(days=1)
+        )
+        organizations = Organization.objects.filter(is_active=True)
+        if options["organization"]:
+            organizations = organizations.filter(id=options["organization"])
+
+        for organization in organizations:
+            for offset in range(options["days"]):
+                day = end - timedelta(days=offset)
+                counts = fill_missing_attendance(organization.id, day)
+                self.stdout.write(
+                    f"{organization} {day}: {counts['created']} created, "
+                    f"{counts['skipped']} skipped (no office)"
+                )
@@ -0,0 +1,130 @@
+import asyncio
+import random
+import time
+
+import httpx
+from django.core.management.base import BaseCommand
+from rest_framework_simplejwt.tokens import AccessToken
+
+from organizations.models import Organization, OfficeLocation
+from users.models import CustomUser
+
+CHECK_IN = """
+mutation CheckIn($input: CheckInInput!) {
+  checkIn(input: $input) { id status workedHours }
+}
+"""
+
+DASHBOARD = """
+query Dashboard {
+  me { id firstName lastName organization { name } manager { email } }
+  myAttendanceConnection(first: 20) {
+    totalCount
+    edges { node { id attendanceDate loginTime logoutTime status correctionStatus } }
+  }
+  leaveBalance { id }
+}
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test a running server's /graphql/ with a mix of check-ins and "
+        "dashboard loads, e.g. once under gunicorn (WSGI) and once under "
+        "uvicorn (ASGI). Users are created in the server's database and "
+        "deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000/graphql/")
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--concurrency", type=int, default=50)
+        parser.add_argument("--duration", type=float, default=30, help="seconds")
+        parser.add_argument(
+            "--check-in-share", type=float, default=0.2,
+            help="fraction of requests that are check-ins",
+        )
+
+    def handle(self, *args, **options):
+        organization, office, users = self._seed(options["users"])
+        try:
+            tokens = [str(AccessToken.for_user(user)) for user in users]
+            latencies, errors, elapsed = asyncio.run(self._run(tokens, office, options))
+        finally:
+            CustomUser.objects.filter(organization=organization).delete()
+            organization.delete()
+
+        total = sum(len(values) for values in latencies.values())
+        self.stdout.write(
+            f"{total} requests in {elapsed:.1f}s: {total / elapsed:.0f} req/s, "
+            f"{errors} errors, concurrency {options['concurrency']}"
+        )
+        for name, values in latencies.items():
+            if not values:
+                continue
+            values.sort()
+            p50, p95, p99 = (values[min(int(len(values) * q), len(values) - 1)] for q in (0.5, 0.95, 0.99))
+            self.stdout.write(
+                f"  {name}: {len(values)} requests, "
+                f"p50 {p50 * 1000:.0f}ms, p95 {p95 * 1000:.0f}ms, p99 {p99 * 1000:.0f}ms"
+            )
+
+    async def _run(self, tokens, office, options):
+        latencies = {"checkIn": [], "dashboard": []}
+        errors = 0
+        deadline = time.perf_counter() + options["duration"]
+        check_in = {
+            "input": {
+                "latitude": 12.9717,
+                "longitude": 77.5947,
+                "loginTime": "09:45:00",
+                "officeLocationId": str(office.id),
+            },
+        }
+
+        async def worker(client):
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                name = "checkIn" if random.random() < options["check_in_share"] else "dashboard"
+                query, variables = (CHECK_IN, check_in) if name == "checkIn" else (DASHBOARD, None)
+                headers = {"Authorization": f"Bearer {random.choice(tokens)}"}
+                started = time.perf_counter()
+                try:
+                    response = await client.post(
+                        options["url"], json={"query": query, "variables": variables}, headers=headers,
+                    )
+                    failed = response.status_code != 200 or "errors" in response.json()
+                except httpx.HTTPError:
+                    failed = True
+                latencies[name].append(time.perf_counter() - started)
+                errors += failed
+
+        limits = httpx.Limits(max_connections=options["concurrency"])
+        started = time.perf_counter()
+        async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+            await asyncio.gather(*(worker(client) for _ in range(options["concurrency"])))
+        return latencies, errors, time.perf_counter() - started
+
+    def _seed(self, count):
+        organization = Organization.objects.create(
+            name="GraphQL load test",
+            headquarters_address="-",
+        )
+        office = OfficeLocation.objects.create(
+            organization=organization,
+            name="Load test office",
+            address="-",
+            latitude="12.97160000",
+            longitude="77.59460000",
+            geo_radius_meters=200,
+        )
+        users = CustomUser.objects.bulk_create(
+            CustomUser(
+                username=f"graphql-load-test-{i}",
+                email=f"graphql-load-test-{i}@example.com",
+                organization=organization,
+                office_location=office,
+            )
+            for i in range(count)
+        )
+        return organization, office, users
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from attendance.models import AttendanceMonthlySummary
+
+
+class Command(BaseCommand):
+    help = "Rebuild monthly attendance summaries from attendance records"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--year", type=int)
+        parser.add_argument("--month", type=int)
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        written = AttendanceMonthlySummary.objects.rebuild(
+            year=options["year"],
+            month=options["month"],
+            batch_size=options["batch_size"],
+        )
+        self.stdout.write(self.style.SUCCESS(f"{written} summaries rebuilt"))
@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand
+
+from attendance.geofence import OfficeGeofence
+from attendance.models import AttendanceRecord
+from organizations.models import OfficeLocation, Organization
+
+
+class Command(BaseCommand):
+    help = "Recompute login/logout distances and geofence flags of attendance records"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--organization", type=int, help="Only this organization id")
+        parser.add_argument("--since", help="Only records on or after this date (YYYY-MM-DD)")
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        organizations = Organization.objects.all()
+        if options["organization"]:
+            organizations = organizations.filter(id=options["organization"])
+
+        for organization in organizations:
+            geofence = OfficeGeofence(
+                OfficeLocation.objects.filter(organization=organization)
+            )
+            records = AttendanceRecord.objects.filter(
+                office_location__organization=organization,
+                login_latitude__isnull=False,
+                login_longitude__isnull=False,
+            ).only(
+                "id",
+                "office_location_id",
+                "login_latitude",
+                "login_longitude",
+                "logout_latitude",
+                "logout_longitude",
+            )
+            if options["since"]:
+                records = records.filter(attendance_date__gte=options["since"])
+
+            updated = 0
+            batch = []
+            for record in records.iterator(chunk_size=options["batch_size"]):
+                batch.append(record)
+                if len(batch) >= options["batch_size"]:
+                    updated += self._recompute(geofence, batch)
+                    batch = []
+            if batch:
+                updated += self._recompute(geofence, batch)
+
+            self.stdout.write(f"{organization}: {updated} records updated")
+
+    def _recompute(self, geofence, records):
+        office_ids = [record.office_location_id for record in records]
+        login_distances, inside = geofence.distances_to(
+            office_ids,
+            [record.login_latitude for record in records],
+            [record.login_longitude for record in records],
+        )
+        for record, distance, within in zip(records, login_distances, inside):
+            record.login_distance = round(float(distance))
+            record.is_within_geofence = bool(within)
+
+        checked_out = [record for record in records if record.logout_latitude is not None]
+        if checked_out:
+            logout_distances, _ = geofence.distances_to(
+                [record.office_location_id for record in checked_out],
+                [record.logout_latitude for record in checked_out],
+                [record.logout_longitude for record in checked_out],
+            )
+            for record, distance in zip(checked_out, logout_distances):
+                record.logout_distance = round(float(distance))
+
+        AttendanceRecord.objects.bulk_update(
+            records, ["login_distance", "logout_distance", "is_within_geofence"]
+        )
+        return len(records)
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.10 on 2026-10-18 15:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0004_alter_attendancecorrection_corrected_login_time_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendancecorrection',
+            index=models.Index(fields=['created_at', 'id'], name='attendance__created_ba1943_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendancecorrection',
+            index=models.Index(fields=['requested_by', 'created_at', 'id'], name='attendance__request_295c60_idx'),
+        ),
+    ]
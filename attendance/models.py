@@ -1,11 +1,24 @@
+from decimal import Decimal
 from django.db import models, transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, ExtractMonth, ExtractYear
 from users.models import CustomUser
 from organizations.models import OfficeLocation
 from datetime import datetime, date
 
 
+def latest_correction_prefetch(lookup="attendancecorrection_set"):
+    return models.Prefetch(
+        lookup,
+        queryset=AttendanceCorrection.objects.order_by("-created_at")[:1],
+        to_attr="latest_corrections",
+    )
+
+
 class AttendanceRecord(models.Model):
     """Daily attendance record"""
+    PRESENT_STATUSES = ('present', 'late_login', 'early_logout', 'half_day')
+
     STATUS_CHOICES = [
         ('present', 'Present'),
         ('absent', 'Absent'),
@@ -39,6 +52,17 @@ class AttendanceRecord(models.Model):
         unique_together = ('user', 'attendance_date')
         ordering = ['-attendance_date']
 
+    @property
+    def latest_correction(self):
+        """
+        Newest correction, served from the prefetch when one was applied
+        """
+        if not hasattr(self, "latest_corrections"):
+            self.latest_corrections = list(
+                self.attendancecorrection_set.order_by("-created_at")[:1]
+            )
+        return self.latest_corrections[0] if self.latest_corrections else None
+
     def recalculate_worked_hours(self):
         """
         Recalculate worked hours from login & logout time
@@ -85,35 +109,161 @@ class AttendanceCorrection(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # Keyset pagination on (created_at, id)
+            models.Index(fields=["created_at", "id"]),
+            models.Index(fields=["requested_by", "created_at", "id"]),
+        ]
+
+    RECORD_FIELDS = ["login_time", "logout_time", "worked_hours", "status", "is_verified", "updated_at"]
+    DECISION_FIELDS = ["status", "approved_by", "approval_comments"]
+
+    def apply_to_record(self, attendance=None):
+        """
+        Copy the corrected times onto the attendance record (not saved)
+        """
+        attendance = attendance or self.attendance_record
+
+        if self.corrected_login_time:
+            attendance.login_time = self.corrected_login_time
+
+        if self.corrected_logout_time:
+            attendance.logout_time = self.corrected_logout_time
+
+        attendance.recalculate_worked_hours()
+        attendance.status = "present"
+        attendance.is_verified = True
+        return attendance
+
+    def decide(self, status, approver, comments=None):
+        self.status = status
+        self.approved_by = approver
+        self.approval_comments = comments or ""
 
     def approve(self, approver, comments=None):
         """
         Apply correction to attendance but KEEP correction record
         """
         with transaction.atomic():
-            attendance = self.attendance_record
+            attendance = self.apply_to_record()
+            attendance.save(update_fields=self.RECORD_FIELDS)
 
-            if self.corrected_login_time:
-                attendance.login_time = self.corrected_login_time
+            self.decide("approved", approver, comments)
+            self.save(update_fields=self.DECISION_FIELDS)
 
-            if self.corrected_logout_time:
-                attendance.logout_time = self.corrected_logout_time
+            AttendanceMonthlySummary.objects.refresh([
+                (attendance.user_id, attendance.attendance_date.year, attendance.attendance_date.month)
+            ])
 
-            attendance.recalculate_worked_hours()
-            attendance.status = "present"
-            attendance.is_verified = True
-            attendance.save()
+    def reject(self, approver, comments=None):
+        self.decide("rejected", approver, comments)
+        self.save(update_fields=self.DECISION_FIELDS)
 
-            self.status = "approved"
-            self.approved_by = approver
-            self.approval_comments = comments
-            self.save()
+    def __str__(self):
+        return f"Correction for {self.attendance_record}"
 
-    def reject(self, approver, comments=None):
-        self.status = "rejected"
-        self.approved_by = approver
-        self.approval_comments = comments
-        self.save()
+
+class AttendanceMonthlySummaryManager(models.Manager):
+    SUMMARY_FIELDS = ["present_days", "late_logins", "early_logouts", "worked_hours"]
+
+    def _aggregate(self, records):
+        return records.annotate(
+            year=ExtractYear("attendance_date"),
+            month=ExtractMonth("attendance_date"),
+        ).values("user_id", "year", "month").annotate(
+            present_days=Count("id", filter=Q(status__in=AttendanceRecord.PRESENT_STATUSES)),
+            late_logins=Count("id", filter=Q(login_time__gt=F("office_location__login_time"))),
+            early_logouts=Count("id", filter=Q(logout_time__lt=F("office_location__logout_time"))),
+            worked_hours=Coalesce(Sum("worked_hours"), Value(Decimal("0"))),
+        ).order_by()
+
+    def _upsert(self, summaries):
+        return self.bulk_create(
+            summaries,
+            update_conflicts=True,
+            unique_fields=["user", "year", "month"],
+            update_fields=self.SUMMARY_FIELDS + ["updated_at"],
+        )
+
+    def refresh(self, keys):
+        """
+        Recompute the summaries of the given (user_id, year, month) keys with
+        one aggregate query over just those months and one upsert
+        """
+        keys = set(keys)
+        if not keys:
+            return
+
+        months = Q()
+        for user_id, year, month in keys:
+            months |= Q(
+                user_id=user_id,
+                attendance_date__year=year,
+                attendance_date__month=month,
+            )
+        rows = {
+            (row["user_id"], row["year"], row["month"]): row
+            for row in self._aggregate(AttendanceRecord.objects.filter(months))
+        }
+
+        summaries = []
+        for user_id, year, month in keys:
+            row = rows.get((user_id, year, month), {})
+            summaries.append(self.model(
+                user_id=user_id,
+                year=year,
+                month=month,
+                **{field: row.get(field, 0) for field in self.SUMMARY_FIELDS},
+            ))
+        self._upsert(summaries)
+
+    def rebuild(self, year=None, month=None, batch_size=5000):
+        """
+        Recompute every summary (optionally of one year / month) from the raw
+        records with a single grouped scan, written in batches
+        """
+        records = AttendanceRecord.objects.all()
+        summaries = self.all()
+        if year:
+            records = records.filter(attendance_date__year=year)
+            summaries = summaries.filter(year=year)
+        if month:
+            records = records.filter(attendance_date__month=month)
+            summaries = summaries.filter(month=month)
+
+        written = 0
+        with transaction.atomic():
+            summaries.delete()
+            batch = []
+            for row in self._aggregate(records).iterator(chunk_size=batch_size):
+                batch.append(self.model(**row))
+                if len(batch) >= batch_size:
+                    written += len(self._upsert(batch))
+                    batch = []
+            if batch:
+                written += len(self._upsert(batch))
+        return written
+
+
+class AttendanceMonthlySummary(models.Model):
+    """Per-employee monthly attendance figures for dashboards and payroll"""
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='attendance_summaries')
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    present_days = models.PositiveIntegerField(default=0)
+    late_logins = models.PositiveIntegerField(default=0)
+    early_logouts = models.PositiveIntegerField(default=0)
+    worked_hours = models.DecimalField(max_digits=7, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = AttendanceMonthlySummaryManager()
+
+    class Meta:
+        unique_together = ('user', 'year', 'month')
+        ordering = ['-year', '-month']
+        indexes = [
+            models.Index(fields=['year', 'month']),
+        ]
 
     def __str__(self):
-        return f"Correction for {self.attendance_record}"
\ No newline at end of file
+        return f"{self.user} - {self.year}/{self.month:02d}"
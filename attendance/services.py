@@ -1,80 +1,287 @@
-from math import radians, sin, cos, sqrt, atan2
 from datetime import date, datetime
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.http import Http404
 from django.utils import timezone
-from django.shortcuts import get_object_or_404
 
-from attendance.models import AttendanceRecord
+from attendance.geofence import OfficeGeofence, get_office_index, haversine
+from attendance.models import AttendanceRecord, AttendanceCorrection, AttendanceMonthlySummary
+from attendance.tasks import refresh_monthly_summaries
+from graphql_utils.pubsub import publish
+from leaves.models import CompanyHoliday, LeaveRequest
 from organizations.models import OfficeLocation
+from users.models import CustomUser
 from datetime import datetime, time as time_type
 
+PUNCH_IN = "in"
+PUNCH_OUT = "out"
+MAX_PUNCH_BATCH = 5000
 
-def calculate_distance(lat1, lon1, lat2, lon2):
-    R = 6371000
-    phi1 = radians(float(lat1))
-    phi2 = radians(float(lat2))
-    delta_phi = radians(float(lat2) - float(lat1))
-    delta_lambda = radians(float(lon2) - float(lon1))
+# Fields written by the bulk upsert when a (user, attendance_date) row exists
+PUNCH_UPDATE_FIELDS = [
+    "office_location",
+    "login_time",
+    "logout_time",
+    "login_latitude",
+    "login_longitude",
+    "logout_latitude",
+    "logout_longitude",
+    "login_distance",
+    "logout_distance",
+    "is_within_geofence",
+    "status",
+    "worked_hours",
+    "updated_at",
+]
 
-    a = sin(delta_phi / 2) ** 2 + cos(phi1) * cos(phi2) * sin(delta_lambda / 2) ** 2
-    c = 2 * atan2(sqrt(a), sqrt(1 - a))
-    return R * c
+# Live attendance events (attendance.graphql.subscriptions)
+CHECK_IN_EVENT = "check_in"
+CHECK_OUT_EVENT = "check_out"
 
 
-def check_in_user(user, office_id, latitude, longitude, time):
-    office = get_object_or_404(OfficeLocation, id=office_id)
+def organization_channel(organization_id):
+    return f"attendance:organization:{organization_id}"
+
+
+def office_channel(office_id):
+    return f"attendance:office:{office_id}"
+
+
+def attendance_event(kind, record, organization_id, correction=None):
+    return {
+        "kind": kind,
+        "organization_id": organization_id,
+        "record_id": record.id,
+        "user_id": record.user_id,
+        "office_location_id": record.office_location_id,
+        "attendance_date": record.attendance_date,
+        "login_time": record.login_time,
+        "logout_time": record.logout_time,
+        "status": record.status,
+        "worked_hours": record.worked_hours,
+        "is_within_geofence": record.is_within_geofence,
+        "correction_id": correction.id if correction else None,
+        "occurred_at": timezone.now(),
+    }
+
+
+def correction_event(correction):
+    record = correction.attendance_record
+    kind = "correction_requested" if correction.status == "pending" else f"correction_{correction.status}"
+    return attendance_event(kind, record, record.user.organization_id, correction)
+
+
+def publish_attendance_events(events):
+    """
+    Push ``events`` to the organization's and office's live dashboards once
+    the current transaction commits. Events are best effort: a failure to
+    publish is logged and never fails the request that made the change.
+    """
+    def send():
+        for event in events:
+            publish(organization_channel(event["organization_id"]), event)
+            if event["office_location_id"]:
+                publish(office_channel(event["office_location_id"]), event)
+
+    transaction.on_commit(send, robust=True)
+
 
-    distance = calculate_distance(
-        latitude, longitude, office.latitude, office.longitude
+_RECORDS = AttendanceRecord._meta.db_table
+_OFFICES = OfficeLocation._meta.db_table
+
+# Check-in upsert. A second check-in on the same day replaces the login
+# side (and office) of the existing record and keeps its logout side.
+CHECK_IN_SQL = f"""
+    INSERT INTO {_RECORDS} (
+        user_id, office_location_id, attendance_date, login_time,
+        login_latitude, login_longitude, login_distance, is_within_geofence,
+        status, remarks, is_verified, created_at, updated_at
+    )
+    VALUES (
+        %(user_id)s, %(office_location_id)s, %(attendance_date)s, %(login_time)s,
+        %(login_latitude)s, %(login_longitude)s, %(login_distance)s, %(is_within_geofence)s,
+        %(status)s, '', false, %(now)s, %(now)s
     )
+    ON CONFLICT (user_id, attendance_date) DO UPDATE SET
+        office_location_id = EXCLUDED.office_location_id,
+        login_time = EXCLUDED.login_time,
+        login_latitude = EXCLUDED.login_latitude,
+        login_longitude = EXCLUDED.login_longitude,
+        login_distance = EXCLUDED.login_distance,
+        is_within_geofence = EXCLUDED.is_within_geofence,
+        status = EXCLUDED.status,
+        updated_at = EXCLUDED.updated_at
+    RETURNING *
+"""
+
+# Check-out update, the SQL twin of apply_check_out: haversine distance to
+# the record's office, worked hours from the stored login and the status
+# from the office's logout time and the current (login) status. Keep the
+# two in step; attendance.tests.CheckOutParityTests compares them.
+CHECK_OUT_SQL = f"""
+    UPDATE {_RECORDS} AS record SET
+        logout_time = %(logout_time)s,
+        logout_latitude = %(latitude)s,
+        logout_longitude = %(longitude)s,
+        logout_distance = ROUND(2 * 6371000 * ASIN(SQRT(LEAST(1,
+            POWER(SIN(RADIANS(%(latitude)s - office.latitude) / 2), 2)
+            + COS(RADIANS(office.latitude)) * COS(RADIANS(%(latitude)s))
+            * POWER(SIN(RADIANS(%(longitude)s - office.longitude) / 2), 2)
+        )))),
+        worked_hours = CASE
+            WHEN record.login_time IS NULL THEN record.worked_hours
+            ELSE ROUND((EXTRACT(EPOCH FROM %(logout_time)s::time - record.login_time) / 3600)::numeric, 2)
+        END,
+        status = CASE
+            WHEN %(logout_time)s::time < office.logout_time AND record.status = 'late_login' THEN 'absent'
+            WHEN %(logout_time)s::time < office.logout_time THEN 'early_logout'
+            ELSE 'present'
+        END,
+        updated_at = %(now)s
+    FROM {_OFFICES} AS office
+    WHERE office.id = record.office_location_id
+        AND record.user_id = %(user_id)s
+        AND record.attendance_date = %(attendance_date)s
+    RETURNING record.*
+"""
 
-    attendance, _ = AttendanceRecord.objects.get_or_create(
-        user=user,
-        attendance_date=date.today(),
-        office_location=office,
+# Missing-day records, one chunk per statement. Records created by a punch
+# since the employees were selected are left alone and not returned.
+FILL_MISSING_SQL = f"""
+    INSERT INTO {_RECORDS} (
+        user_id, office_location_id, attendance_date, status,
+        is_within_geofence, remarks, is_verified, created_at, updated_at
     )
-    if distance > office.geo_radius_meters:
-        attendance.is_within_geofence = False
+    SELECT missing.user_id, missing.office_location_id, %(attendance_date)s, missing.status,
+        false, '', false, %(now)s, %(now)s
+    FROM UNNEST(
+        %(user_ids)s::integer[], %(office_location_ids)s::integer[], %(statuses)s::varchar[]
+    ) AS missing(user_id, office_location_id, status)
+    ON CONFLICT (user_id, attendance_date) DO NOTHING
+    RETURNING id
+"""
+
+
+def refresh_summary_after_commit(user_id, attendance_date):
+    """
+    Recompute the user's summary of that month in a task, once the punch
+    is committed
+    """
+    transaction.on_commit(lambda: refresh_monthly_summaries.delay(
+        [(user_id, attendance_date.year, attendance_date.month)]
+    ))
+
+
+def calculate_distance(lat1, lon1, lat2, lon2):
+    return float(haversine(lat1, lon1, lat2, lon2))
+
+
+def check_in_user(user, office_id, latitude, longitude, time):
+    offices = get_office_index(user.organization_id)
+    distance = None
+    if office_id:
+        office = offices.get(office_id)
+        if office is None:
+            raise Http404("Office location not found")
+    else:
+        office, distance = offices.nearest(latitude, longitude)
+        if office is None:
+            raise ValueError("Not within any office geofence")
 
-    login_time = normalize_time(time)
+    attendance = AttendanceRecord(user=user, attendance_date=date.today())
+    distance = apply_check_in(
+        attendance, office, latitude, longitude, normalize_time(time), distance
+    )
+    now = timezone.now()
+
+    # One round trip: concurrent check-ins for the same day serialize on
+    # the (user, attendance_date) unique index instead of racing
+    attendance = AttendanceRecord.objects.raw(CHECK_IN_SQL, {
+        "user_id": user.id,
+        "office_location_id": office.id,
+        "attendance_date": attendance.attendance_date,
+        "login_time": attendance.login_time,
+        "login_latitude": latitude,
+        "login_longitude": longitude,
+        "login_distance": round(distance),
+        "is_within_geofence": attendance.is_within_geofence,
+        "status": attendance.status,
+        "now": now,
+    })[0]
+
+    refresh_summary_after_commit(user.id, attendance.attendance_date)
+    publish_attendance_events([
+        attendance_event(CHECK_IN_EVENT, attendance, user.organization_id)
+    ])
+    return attendance, distance
+
+
+def check_out_user(user, latitude, longitude, time):
+    attendance_date = date.today()
+    # Distance, worked hours and status are computed by the UPDATE itself
+    # from the stored login and the record's office
+    records = list(AttendanceRecord.objects.raw(CHECK_OUT_SQL, {
+        "user_id": user.id,
+        "attendance_date": attendance_date,
+        "logout_time": normalize_time(time),
+        "latitude": latitude,
+        "longitude": longitude,
+        "now": timezone.now(),
+    }))
+    if not records:
+        raise Http404("No attendance record for today")
+    attendance = records[0]
+
+    refresh_summary_after_commit(user.id, attendance_date)
+    publish_attendance_events([
+        attendance_event(CHECK_OUT_EVENT, attendance, user.organization_id)
+    ])
+    return attendance, attendance.logout_distance
+
+
+def apply_check_in(attendance, office, latitude, longitude, login_time, distance=None):
+    """
+    Set the login side of ``attendance`` for a punch at ``office``.
+    Returns the distance from the office in meters.
+    """
+    if distance is None:
+        distance = calculate_distance(
+            latitude, longitude, office.latitude, office.longitude
+        )
+
+    attendance.office_location = office
     attendance.login_time = login_time
     attendance.login_latitude = latitude
     attendance.login_longitude = longitude
-    attendance.is_within_geofence = True
-    attendance.login_distance = distance
+    attendance.is_within_geofence = distance <= office.geo_radius_meters
+    attendance.login_distance = round(distance)
     if attendance.login_time > office.login_time:
         attendance.status = "late_login"
     else:
         attendance.status = "present"
-    attendance.save()
-
-    return attendance, distance
+    return distance
 
 
-def check_out_user(user, latitude, longitude, time):
-    attendance = get_object_or_404(
-        AttendanceRecord,
-        user=user,
-        attendance_date=date.today()
-    )
+def apply_check_out(attendance, office, latitude, longitude, logout_time, distance=None):
+    """
+    Set the logout side of ``attendance`` and recompute worked hours/status.
+    Returns the distance from the office in meters.
 
-    office = attendance.office_location
-    distance = calculate_distance(
-        latitude, longitude, office.latitude, office.longitude
-    )
+    CHECK_OUT_SQL applies the same rules in the database; change both
+    together (attendance.tests.CheckOutParityTests).
+    """
+    if distance is None:
+        distance = calculate_distance(
+            latitude, longitude, office.latitude, office.longitude
+        )
 
-    logout_time = normalize_time(time)
     attendance.logout_time = logout_time
     attendance.logout_latitude = latitude
     attendance.logout_longitude = longitude
-    attendance.logout_distance = distance
+    attendance.logout_distance = round(distance)
     if attendance.login_time:
-        login_dt = datetime.combine(date.today(), attendance.login_time)
-        logout_dt = datetime.combine(date.today(), logout_time)
-
-        attendance.worked_hours = round(
-            (logout_dt - login_dt).total_seconds() / 3600,
-            2
-        )
+        attendance.recalculate_worked_hours()
 
     if attendance.logout_time < office.logout_time and attendance.status == "late_login":
         attendance.status = "absent"
@@ -82,8 +289,359 @@ def check_out_user(user, latitude, longitude, time):
         attendance.status = "early_logout"
     else:
         attendance.status = "present"
-    attendance.save()
-    return attendance, distance
+    return distance
+
+
+def ingest_punches(punches, organization_id=None):
+    """
+    Apply a batch of punches from kiosks / biometric devices.
+
+    Each punch is a dict with ``user_id``, ``punch_type`` ("in" or "out"),
+    ``time``, ``latitude``, ``longitude``, an optional ``attendance_date``
+    (defaults to today) and an optional ``office_id``. Check-ins without an
+    office go to the nearest office whose geofence contains the punch.
+
+    Users and existing records are loaded with one query each, offices come
+    from the in-memory office index,
+    distances from every punch to every office are computed in one
+    vectorized call, and all touched records are written with a single
+    upsert on ``(user, attendance_date)``. Returns one result dict per
+    punch, in input order.
+    """
+    if len(punches) > MAX_PUNCH_BATCH:
+        raise ValueError(f"At most {MAX_PUNCH_BATCH} punches per batch")
+
+    results = [None] * len(punches)
+    valid = []
+    for index, punch in enumerate(punches):
+        try:
+            valid.append((index, _normalize_punch(punch)))
+        except (KeyError, TypeError, ValueError) as e:
+            results[index] = _punch_result(index, error=str(e))
+
+    users = CustomUser.objects.filter(id__in={p["user_id"] for _, p in valid})
+    if organization_id is not None:
+        users = users.filter(organization_id=organization_id)
+    user_organizations = dict(users.values_list("id", "organization_id"))
+    user_ids = set(user_organizations)
+
+    existing = {
+        (record.user_id, record.attendance_date): record
+        for record in AttendanceRecord.objects.filter(
+            user_id__in=user_ids,
+            attendance_date__in={p["attendance_date"] for _, p in valid},
+        )
+    }
+
+    office_ids = (
+        {p["office_id"] for _, p in valid if p["office_id"]}
+        | {record.office_location_id for record in existing.values()}
+    )
+    offices = {}
+    if organization_id is not None:
+        offices = {
+            office.id: office
+            for office in get_office_index(organization_id).offices
+        }
+    # Inactive offices still referenced by punches or records: records
+    # at one can be checked out of, nobody can check in to one
+    missing = OfficeLocation.objects.filter(id__in=office_ids - offices.keys())
+    if organization_id is not None:
+        missing = missing.filter(organization_id=organization_id)
+    if office_ids - offices.keys():
+        offices.update((office.id, office) for office in missing)
+
+    geofence = OfficeGeofence(offices.values())
+    distances_to_offices = geofence.distance_matrix(
+        [p["latitude"] for _, p in valid],
+        [p["longitude"] for _, p in valid],
+    )
+    nearest_offices = geofence.nearest_within(distances_to_offices)
+    rows = {index: row for row, (index, _) in enumerate(valid)}
+
+    touched = {}
+    distances = {}
+    # Apply punches in time order so a check-in and check-out for the same
+    # day in one upload end up in the right order
+    valid.sort(key=lambda item: (
+        item[1]["user_id"], item[1]["attendance_date"], item[1]["time"]
+    ))
+    for index, punch in valid:
+        key = (punch["user_id"], punch["attendance_date"])
+        if punch["user_id"] not in user_ids:
+            results[index] = _punch_result(index, error="User not found")
+            continue
+
+        row = rows[index]
+        attendance = touched.get(key) or existing.get(key)
+        if punch["punch_type"] == PUNCH_IN:
+            if punch["office_id"]:
+                office = offices.get(punch["office_id"])
+                if office is not None and not office.is_active:
+                    office = None
+            elif nearest_offices[row] >= 0:
+                office = geofence.offices[nearest_offices[row]]
+            else:
+                results[index] = _punch_result(index, error="Not within any office geofence")
+                continue
+            if office is None:
+                results[index] = _punch_result(index, error="Office location not found")
+                continue
+            if attendance is None:
+                attendance = AttendanceRecord(
+                    user_id=punch["user_id"],
+                    attendance_date=punch["attendance_date"],
+                )
+            distances[index] = apply_check_in(
+                attendance,
+                office,
+                punch["latitude"],
+                punch["longitude"],
+                punch["time"],
+                float(distances_to_offices[row, geofence.index[office.id]]),
+            )
+        else:
+            if attendance is None:
+                results[index] = _punch_result(index, error="No check-in found")
+                continue
+            office = offices.get(attendance.office_location_id)
+            if office is None:
+                results[index] = _punch_result(index, error="Office location not found")
+                continue
+            distances[index] = apply_check_out(
+                attendance,
+                office,
+                punch["latitude"],
+                punch["longitude"],
+                punch["time"],
+                float(distances_to_offices[row, geofence.index[office.id]]),
+            )
+        touched[key] = attendance
+
+    with transaction.atomic():
+        AttendanceRecord.objects.bulk_create(
+            touched.values(),
+            update_conflicts=True,
+            unique_fields=["user", "attendance_date"],
+            update_fields=PUNCH_UPDATE_FIELDS,
+        )
+        AttendanceMonthlySummary.objects.refresh(
+            (user_id, attendance_date.year, attendance_date.month)
+            for user_id, attendance_date in touched
+        )
+        publish_attendance_events([
+            attendance_event(
+                CHECK_OUT_EVENT if record.logout_time else CHECK_IN_EVENT,
+                record,
+                user_organizations[record.user_id],
+            )
+            for record in touched.values()
+        ])
+
+    for index, punch in valid:
+        if results[index] is None:
+            attendance = touched[(punch["user_id"], punch["attendance_date"])]
+            results[index] = _punch_result(
+                index, attendance=attendance, distance=distances[index]
+            )
+    return results
+
+
+def _normalize_punch(punch):
+    punch_type = punch["punch_type"]
+    if punch_type not in (PUNCH_IN, PUNCH_OUT):
+        raise ValueError("punch_type must be 'in' or 'out'")
+
+    office_id = punch.get("office_id")
+    attendance_date = punch.get("attendance_date") or date.today()
+    if isinstance(attendance_date, str):
+        attendance_date = date.fromisoformat(attendance_date)
+
+    return {
+        "user_id": int(punch["user_id"]),
+        "office_id": int(office_id) if office_id else None,
+        "punch_type": punch_type,
+        "attendance_date": attendance_date,
+        "time": normalize_time(punch["time"]),
+        "latitude": float(punch["latitude"]),
+        "longitude": float(punch["longitude"]),
+    }
+
+
+def _punch_result(index, attendance=None, distance=None, error=None):
+    return {
+        "index": index,
+        "success": error is None,
+        "error": error,
+        "attendance_id": attendance.pk if attendance else None,
+        "status": attendance.status if attendance else None,
+        "distance": distance,
+    }
+
+
+def review_corrections(correction_ids, decision, approver, comments=None, organization_id=None):
+    """
+    Approve or reject many corrections in one transaction.
+
+    The corrections and their attendance records are locked with a single
+    SELECT ... FOR UPDATE, changes are applied in memory and written back
+    with one bulk_update per table. Returns one result dict per id, in
+    input order; ids that are not numbers get a "not found" result too.
+    """
+    if decision not in ("approved", "rejected"):
+        raise ValueError("Invalid status. Use 'approved' or 'rejected'.")
+
+    with transaction.atomic():
+        # Locked in primary key order, so overlapping batches queue up
+        # behind each other instead of deadlocking
+        corrections = AttendanceCorrection.objects.select_for_update(
+            of=("self", "attendance_record")
+        ).select_related("attendance_record__user").filter(
+            id__in={_correction_pk(correction_id) for correction_id in correction_ids} - {None}
+        ).order_by("pk")
+        if organization_id is not None:
+            corrections = corrections.filter(
+                attendance_record__user__organization_id=organization_id
+            )
+        corrections = {correction.id: correction for correction in corrections}
+
+        results = []
+        decided = {}
+        records = {}
+        now = timezone.now()
+        for correction_id in correction_ids:
+            pk = _correction_pk(correction_id)
+            correction = decided.get(pk) or corrections.get(pk)
+            if correction is None:
+                results.append(_review_result(correction_id, error="Attendance correction not found"))
+                continue
+            if correction.status != "pending":
+                results.append(_review_result(correction_id, error="This correction has already been processed"))
+                continue
+
+            if decision == "approved":
+                # Several corrections of one record apply to the same instance
+                attendance = records.setdefault(
+                    correction.attendance_record_id, correction.attendance_record
+                )
+                correction.attendance_record = attendance
+                correction.apply_to_record(attendance)
+                attendance.updated_at = now
+            correction.decide(decision, approver, comments)
+            decided[correction.id] = correction
+            results.append(_review_result(correction_id, status=decision))
+
+        AttendanceCorrection.objects.bulk_update(
+            decided.values(), AttendanceCorrection.DECISION_FIELDS
+        )
+        AttendanceRecord.objects.bulk_update(
+            records.values(), AttendanceCorrection.RECORD_FIELDS
+        )
+        AttendanceMonthlySummary.objects.refresh(
+            (record.user_id, record.attendance_date.year, record.attendance_date.month)
+            for record in records.values()
+        )
+        publish_attendance_events([
+            correction_event(correction) for correction in decided.values()
+        ])
+
+    return results
+
+
+def _correction_pk(correction_id):
+    try:
+        return int(correction_id)
+    except (TypeError, ValueError):
+        return None
+
+
+def _review_result(correction_id, status=None, error=None):
+    return {
+        "correction_id": correction_id,
+        "success": error is None,
+        "status": status,
+        "error": error,
+    }
+
+
+def fill_missing_attendance(organization_id, day, chunk_size=5000):
+    """
+    Create the records of employees who never punched on ``day``:
+    'holiday' on company holidays, 'leave' for approved leave, otherwise
+    'absent'. Employees are streamed in chunks and inserted with
+    FILL_MISSING_SQL, so re-runs and late punches are safe and only the
+    rows actually inserted are counted.
+    """
+    counts = {"created": 0, "skipped": 0}
+    if day.weekday() in settings.ATTENDANCE_WEEKLY_OFF_DAYS:
+        return counts
+
+    is_holiday = CompanyHoliday.objects.filter(
+        organization_id=organization_id,
+        holiday_date=day,
+        is_optional=False,
+    ).exists()
+    on_leave = set(
+        LeaveRequest.objects.filter(
+            user__organization_id=organization_id,
+            status="approved",
+            from_date__lte=day,
+            to_date__gte=day,
+        ).values_list("user_id", flat=True)
+    )
+    offices = get_office_index(organization_id).offices
+    default_office_id = offices[0].id if offices else None
+
+    employees = CustomUser.objects.filter(
+        organization_id=organization_id,
+        is_active=True,
+        date_of_joining__lte=day,
+    ).filter(
+        Q(date_of_exit__isnull=True) | Q(date_of_exit__gte=day)
+    ).exclude(
+        id__in=AttendanceRecord.objects.filter(
+            attendance_date=day
+        ).values("user_id")
+    ).values_list("id", "office_location_id")
+
+    batch = []
+    for user_id, office_id in employees.iterator(chunk_size=chunk_size):
+        office_id = office_id or default_office_id
+        if office_id is None:
+            counts["skipped"] += 1
+            continue
+
+        if is_holiday:
+            status = "holiday"
+        elif user_id in on_leave:
+            status = "leave"
+        else:
+            status = "absent"
+        batch.append((user_id, office_id, status))
+        if len(batch) >= chunk_size:
+            counts["created"] += _insert_missing(batch, day)
+            batch = []
+
+    if batch:
+        counts["created"] += _insert_missing(batch, day)
+    return counts
+
+
+def _insert_missing(rows, day):
+    """
+    Insert (user id, office id, status) ``rows`` for ``day``, skipping
+    employees who punched in the meantime. Returns the number inserted.
+    """
+    user_ids, office_ids, statuses = zip(*rows)
+    with connection.cursor() as cursor:
+        cursor.execute(FILL_MISSING_SQL, {
+            "user_ids": list(user_ids),
+            "office_location_ids": list(office_ids),
+            "statuses": list(statuses),
+            "attendance_date": day,
+            "now": timezone.now(),
+        })
+        return cursor.rowcount
 
 
 def normalize_time(value):
@@ -0,0 +1,31 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from attendance import services
+from attendance.geofence import office_index_version_key
+from attendance.models import AttendanceCorrection, AttendanceRecord
+from config.cache_versions import bump_version
+from organizations.models import OfficeLocation
+
+
+@receiver(post_save, sender=OfficeLocation)
+@receiver(post_delete, sender=OfficeLocation)
+def invalidate_office_index(sender, instance, **kwargs):
+    bump_version(office_index_version_key(instance.organization_id))
+
+
+@receiver(post_save, sender=AttendanceCorrection)
+def publish_correction(sender, instance, **kwargs):
+    # Requests, and decisions made one at a time; services.review_corrections
+    # publishes its bulk decisions itself. Callers usually load the record
+    # and its user already; otherwise both come in one query.
+    record = instance.attendance_record if _cached(instance, "attendance_record") else None
+    if record is None or not _cached(record, "user"):
+        instance.attendance_record = AttendanceRecord.objects.select_related("user").get(
+            pk=instance.attendance_record_id
+        )
+    services.publish_attendance_events([services.correction_event(instance)])
+
+
+def _cached(instance, field_name):
+    return instance._meta.get_field(field_name).is_cached(instance)
@@ -0,0 +1,36 @@
+from datetime import date, timedelta
+
+from celery import shared_task
+from django.utils import timezone
+
+from attendance import services
+from attendance.models import AttendanceMonthlySummary
+from organizations.models import Organization
+
+
+@shared_task
+def mark_daily_attendance(day=None):
+    """
+    Nightly job: fill in the previous day's missing records, one task per
+    organization
+    """
+    day = day or (timezone.localdate() - timedelta(days=1)).isoformat()
+    organization_ids = Organization.objects.filter(
+        is_active=True
+    ).values_list("id", flat=True)
+    for organization_id in organization_ids:
+        mark_organization_attendance.delay(organization_id, day)
+
+
+@shared_task
+def mark_organization_attendance(organization_id, day):
+    return services.fill_missing_attendance(organization_id, date.fromisoformat(day))
+
+
+@shared_task
+def refresh_monthly_summaries(keys):
+    """
+    Recompute the summary rows of (user_id, year, month) ``keys``, off the
+    punch request path
+    """
+    AttendanceMonthlySummary.objects.refresh(tuple(key) for key in keys)
@@ -1,3 +1,654 @@
-from django.test import TestCase
+import asyncio
+import base64
+from datetime import date, time, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import redis
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from attendance import geofence, services
+from attendance.geofence import OfficeGeofence, get_office_index, haversine
+from attendance.models import AttendanceCorrection, AttendanceMonthlySummary, AttendanceRecord
+from graphql_api.schema import schema
+from graphql_utils import pubsub
+from graphql_utils.websockets import WebSocketContext
+from organizations.models import Organization, OfficeLocation
+from users.models import CustomUser
+
+
+class AttendanceTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = Organization.objects.create(name="Acme", headquarters_address="-")
+        cls.office = OfficeLocation.objects.create(
+            organization=cls.organization,
+            name="HQ",
+            address="-",
+            latitude="12.97160000",
+            longitude="77.59460000",
+            geo_radius_meters=200,
+        )
+        cls.hr = CustomUser.objects.create_user(
+            email="hr@example.com", username="hr", password="secret-password",
+            organization=cls.organization, role="hr",
+        )
+        cls.employee = CustomUser.objects.create_user(
+            email="employee@example.com", username="employee", password="secret-password",
+            organization=cls.organization, office_location=cls.office, manager=cls.hr,
+        )
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+        return client
+
+    def graphql(self, user, query, variables=None):
+        response = self.client_for(user).post(
+            "/graphql/", {"query": query, "variables": variables or {}}, format="json"
+        )
+        return response.json()
+
+
+class AttendanceRoutesTests(AttendanceTestCase):
+    def test_anonymous_requests_are_refused(self):
+        client = APIClient()
+        for url in ("/api/attendance/check_in/", "/api/attendance/check_out/", "/api/attendance/bulk_punch/"):
+            self.assertEqual(client.post(url, {}, format="json").status_code, 401)
+
+    def test_records_cannot_be_written_directly(self):
+        record = AttendanceRecord.objects.create(
+            user=self.employee, office_location=self.office, attendance_date=date.today(),
+            login_time=time(10, 30), status="late_login",
+        )
+        client = self.client_for(self.employee)
+        response = client.patch(f"/api/attendance/{record.id}/", {"status": "present"}, format="json")
+        self.assertEqual(response.status_code, 404)
+        response = client.post("/api/attendance/", {"user": self.employee.id, "status": "present"}, format="json")
+        self.assertEqual(response.status_code, 405)
+        record.refresh_from_db()
+        self.assertEqual(record.status, "late_login")
+
+    def test_check_in(self):
+        response = self.client_for(self.employee).post("/api/attendance/check_in/", {
+            "office_id": self.office.id, "latitude": 12.9717, "longitude": 77.5947,
+        }, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(AttendanceRecord.objects.filter(user=self.employee, attendance_date=date.today()).exists())
+
+    def test_check_in_outside_geofence(self):
+        response = self.client_for(self.employee).post("/api/attendance/check_in/", {
+            "office_id": self.office.id, "latitude": 13.5, "longitude": 77.5947,
+        }, format="json")
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(AttendanceRecord.objects.filter(user=self.employee).exists())
+
+    def test_bulk_punch_is_limited_to_hr(self):
+        response = self.client_for(self.employee).post(
+            "/api/attendance/bulk_punch/", {"punches": []}, format="json"
+        )
+        self.assertEqual(response.status_code, 403)
+        response = self.client_for(self.hr).post(
+            "/api/attendance/bulk_punch/", {"punches": []}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+class GeofenceTests(SimpleTestCase):
+    def office(self, id, latitude, longitude, radius):
+        return OfficeLocation(id=id, latitude=latitude, longitude=longitude, geo_radius_meters=radius)
+
+    def test_haversine(self):
+        # A degree along a meridian is exactly R * pi / 180
+        self.assertAlmostEqual(float(haversine(10, 77, 11, 77)), 6371000 * np.pi / 180, places=6)
+        # Paris to London
+        self.assertAlmostEqual(float(haversine(48.8566, 2.3522, 51.5074, -0.1278)), 343556, delta=100)
+        self.assertEqual(float(haversine(12.9716, 77.5946, 12.9716, 77.5946)), 0)
+        distances = haversine([10, 10], [77, 77], [11, 10], [77, 77])
+        np.testing.assert_allclose(distances, [6371000 * np.pi / 180, 0])
+
+    def test_radius_boundary_is_inside(self):
+        distance = float(haversine(12.9716, 77.5946, 12.9726, 77.5946))
+        inside = OfficeGeofence([self.office(1, 12.9716, 77.5946, distance)])
+        outside = OfficeGeofence([self.office(1, 12.9716, 77.5946, distance - 0.01)])
+        office, found = inside.nearest(12.9726, 77.5946)
+        self.assertEqual((office.id, found), (1, distance))
+        self.assertEqual(outside.nearest(12.9726, 77.5946), (None, None))
+
+    def test_nearest_containing_office_wins(self):
+        geofence = OfficeGeofence([
+            self.office(1, 12.9800, 77.5946, 5000),
+            self.office(2, 12.9750, 77.5946, 5000),
+            # Nearest of all, but its geofence does not reach the punch
+            self.office(3, 12.9716, 77.5950, 10),
+        ])
+        located = geofence.locate_many([12.9716, 12.9850, 20.0], [77.5946, 77.5946, 77.5946])
+        self.assertEqual(
+            [office.id if office else None for office, _ in located], [2, 1, None]
+        )
+        self.assertAlmostEqual(located[0][1], float(haversine(12.9716, 77.5946, 12.9750, 77.5946)))
+
+    def test_inactive_offices_are_never_nearest(self):
+        closed = self.office(1, 12.9716, 77.5946, 5000)
+        closed.is_active = False
+        geofence = OfficeGeofence([closed, self.office(2, 12.9750, 77.5946, 5000)])
+        self.assertEqual(geofence.nearest(12.9716, 77.5946)[0].id, 2)
+
+    def test_no_offices(self):
+        geofence = OfficeGeofence([])
+        self.assertEqual(geofence.locate_many([12.9716, 13.0], [77.5946, 77.0]), [(None, None), (None, None)])
+        self.assertEqual(geofence.nearest(12.9716, 77.5946), (None, None))
+
+
+class OfficeIndexTests(AttendanceTestCase):
+    def test_non_numeric_office_id_is_not_found(self):
+        self.assertIsNone(get_office_index(self.organization.id).get("not-a-number"))
+        response = self.client_for(self.employee).post("/api/attendance/check_in/", {
+            "office_id": "not-a-number", "latitude": 12.9717, "longitude": 77.5947,
+        }, format="json")
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(OFFICE_INDEX_CACHE_SIZE=1)
+    def test_indexes_are_bounded(self):
+        other = Organization.objects.create(name="Other", headquarters_address="-")
+        get_office_index(self.organization.id)
+        get_office_index(other.id)
+        self.assertEqual(list(geofence._office_indexes), [other.id])
+
+    def test_saving_an_office_rebuilds_the_index(self):
+        self.assertIsNotNone(get_office_index(self.organization.id).get(self.office.id))
+        self.office.is_active = False
+        self.office.save()
+        self.assertIsNone(get_office_index(self.organization.id).get(self.office.id))
+
+
+class AttendanceConnectionTests(AttendanceTestCase):
+    QUERY = """
+    query($start: Date, $end: Date, $after: String) {
+      myAttendanceConnection(input: {startDate: $start, endDate: $end}, first: 2, after: $after) {
+        edges { cursor node { attendanceDate } }
+        pageInfo { hasNextPage endCursor }
+      }
+    }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for days in range(3):
+            AttendanceRecord.objects.create(
+                user=cls.employee, office_location=cls.office,
+                attendance_date=date.today() - timedelta(days=days), status="present",
+            )
+
+    def page(self, after=None):
+        start = str(date.today() - timedelta(days=2))
+        end = str(date.today())
+        return self.graphql(self.employee, self.QUERY, {"start": start, "end": end, "after": after})
+
+    def test_pages_follow_each_other(self):
+        first = self.page()["data"]["myAttendanceConnection"]
+        self.assertTrue(first["pageInfo"]["hasNextPage"])
+        second = self.page(first["pageInfo"]["endCursor"])["data"]["myAttendanceConnection"]
+        self.assertFalse(second["pageInfo"]["hasNextPage"])
+        dates = [edge["node"]["attendanceDate"] for edge in first["edges"] + second["edges"]]
+        self.assertEqual(dates, [str(date.today() - timedelta(days=days)) for days in range(3)])
+
+    def test_tampered_cursors_are_invalid(self):
+        for payload in (b"5", b"null", b'{"a": 1}', b'["2024-01-01"]', b"[1, 2]", b'["x", "y"]'):
+            cursor = base64.urlsafe_b64encode(payload).decode()
+            result = self.page(cursor)
+            self.assertIsNone(result["data"], payload)
+            self.assertEqual(result["errors"][0]["message"], "Invalid cursor", payload)
+        result = self.page("not base64!")
+        self.assertEqual(result["errors"][0]["message"], "Invalid cursor")
+
+
+class AttendanceQueryCountTests(AttendanceTestCase):
+    NESTED = """
+    query($userId: ID!) {
+      attendanceByUser(userId: $userId) {
+        status
+        user { email manager { email } organization { name } officeLocation { name } }
+        officeLocation { name }
+      }
+    }
+    """
+    CORRECTIONS = """
+    query($userId: ID!, $first: Int) {
+      attendanceByUserConnection(userId: $userId, first: $first) {
+        edges { node { correctionReason correctionStatus approvalComment user { email } } }
+      }
+    }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for days in range(4):
+            record = AttendanceRecord.objects.create(
+                user=cls.employee, office_location=cls.office,
+                attendance_date=date.today() - timedelta(days=days), status="present",
+            )
+            for reason in ("first", "second"):
+                AttendanceCorrection.objects.create(
+                    attendance_record=record, requested_by=cls.employee, reason=f"{reason} {days}",
+                )
+
+    def count_queries(self, query, **variables):
+        variables["userId"] = self.employee.id
+        # Authenticating the first request loads the user into users.cache
+        self.graphql(self.hr, query, variables)
+        with CaptureQueriesContext(connection) as queries:
+            result = self.graphql(self.hr, query, variables)
+        self.assertNotIn("errors", result)
+        return len(queries), result["data"]
+
+    def test_nested_relations_are_joined(self):
+        count, data = self.count_queries(self.NESTED)
+        self.assertEqual(count, 1)
+        self.assertEqual(len(data["attendanceByUser"]), 4)
+        self.assertEqual(data["attendanceByUser"][0]["user"]["manager"], {"email": "hr@example.com"})
+        self.assertEqual(data["attendanceByUser"][0]["officeLocation"], {"name": "HQ"})
+
+    def test_latest_corrections_are_prefetched_once(self):
+        count, data = self.count_queries(self.CORRECTIONS)
+        self.assertEqual(count, 2)
+        self.assertEqual(self.count_queries(self.CORRECTIONS, first=1)[0], 2)
+        reasons = [edge["node"]["correctionReason"] for edge in data["attendanceByUserConnection"]["edges"]]
+        self.assertEqual(reasons, [f"second {days}" for days in range(4)])
+
+
+class FillMissingAttendanceTests(AttendanceTestCase):
+    # A Wednesday
+    DAY = date(2024, 1, 10)
+
+    def setUp(self):
+        CustomUser.objects.update(date_of_joining=date(2023, 1, 1))
+
+    def test_absent_employees_get_records(self):
+        counts = services.fill_missing_attendance(self.organization.id, self.DAY)
+        self.assertEqual(counts, {"created": 2, "skipped": 0})
+        self.assertEqual(
+            set(AttendanceRecord.objects.filter(attendance_date=self.DAY).values_list("status", flat=True)),
+            {"absent"},
+        )
+        counts = services.fill_missing_attendance(self.organization.id, self.DAY)
+        self.assertEqual(counts, {"created": 0, "skipped": 0})
+
+    def test_punches_made_meanwhile_are_not_counted(self):
+        insert_missing = services._insert_missing
+
+        def punch_first(rows, day):
+            AttendanceRecord.objects.create(
+                user=self.employee, office_location=self.office,
+                attendance_date=day, login_time=time(9, 0), status="present",
+            )
+            return insert_missing(rows, day)
+
+        with mock.patch.object(services, "_insert_missing", punch_first):
+            counts = services.fill_missing_attendance(self.organization.id, self.DAY)
+        self.assertEqual(counts["created"], 1)
+        self.assertEqual(
+            AttendanceRecord.objects.get(user=self.employee, attendance_date=self.DAY).status, "present"
+        )
+
+
+class CheckOutParityTests(AttendanceTestCase):
+    """
+    check_out_user computes the check-out in SQL (CHECK_OUT_SQL),
+    ingest_punches in Python (apply_check_out). Both must agree.
+    """
+
+    CASES = {
+        "late login, full day": (time(9, 45), time(18, 10)),
+        "late login, half day": (time(9, 45), time(13, 30)),
+        "on time, half day": (time(8, 55), time(13, 30)),
+        "on time, full day": (time(8, 55), time(17, 0)),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other = CustomUser.objects.create_user(
+            email="other@example.com", username="other", password="secret-password",
+            organization=cls.organization, office_location=cls.office,
+        )
+
+    def check_in(self, user, login_time):
+        services.check_in_user(user, self.office.id, 12.9717, 77.5947, login_time)
+
+    def test_sql_and_python_check_outs_agree(self):
+        for case, (login_time, logout_time) in self.CASES.items():
+            with self.subTest(case), transaction.atomic():
+                self.check_in(self.employee, login_time)
+                self.check_in(self.other, login_time)
+                by_sql, _ = services.check_out_user(self.employee, 12.9721, 77.5952, logout_time)
+                results = services.ingest_punches([{
+                    "user_id": self.other.id, "punch_type": "out",
+                    "time": logout_time.isoformat(), "latitude": 12.9721, "longitude": 77.5952,
+                }], organization_id=self.organization.id)
+                self.assertTrue(results[0]["success"], results)
+
+                by_sql.refresh_from_db()
+                by_python = AttendanceRecord.objects.get(user=self.other, attendance_date=date.today())
+                for field in ("status", "worked_hours", "logout_time", "logout_distance"):
+                    self.assertEqual(getattr(by_sql, field), getattr(by_python, field), f"{case}: {field}")
+                transaction.set_rollback(True)
+
+
+class IngestPunchesTests(AttendanceTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other = CustomUser.objects.create_user(
+            email="other@example.com", username="other", password="secret-password",
+            organization=cls.organization,
+        )
+        # Closed since the employee checked in there, right on top of the punches
+        cls.closed = OfficeLocation.objects.create(
+            organization=cls.organization, name="Annex", address="-",
+            latitude="12.97170000", longitude="77.59470000", geo_radius_meters=500, is_active=False,
+        )
+        AttendanceRecord.objects.create(
+            user=cls.employee, office_location=cls.closed, attendance_date=date.today(),
+            login_time=time(9, 0), status="present",
+        )
+
+    def ingest(self, **punch):
+        punch = {"time": "17:00:00", "latitude": 12.9717, "longitude": 77.5947, **punch}
+        return services.ingest_punches([punch], organization_id=self.organization.id)[0]
+
+    def test_check_ins_skip_inactive_offices(self):
+        result = self.ingest(user_id=self.other.id, punch_type="in")
+        self.assertTrue(result["success"], result)
+        record = AttendanceRecord.objects.get(user=self.other, attendance_date=date.today())
+        self.assertEqual(record.office_location_id, self.office.id)
+
+        result = self.ingest(user_id=self.other.id, punch_type="in", office_id=self.closed.id)
+        self.assertEqual(result["error"], "Office location not found")
+
+    def test_records_at_inactive_offices_can_be_checked_out(self):
+        result = self.ingest(user_id=self.employee.id, punch_type="out")
+        self.assertTrue(result["success"], result)
+        record = AttendanceRecord.objects.get(user=self.employee, attendance_date=date.today())
+        self.assertEqual((record.office_location_id, record.logout_time), (self.closed.id, time(17, 0)))
+
+
+class AttendanceEventTests(AttendanceTestCase):
+    QUERY = "subscription($officeId: ID) { attendanceEvents(officeId: $officeId) { kind userId } }"
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other = Organization.objects.create(name="Other", headquarters_address="-")
+        cls.other_office = OfficeLocation.objects.create(
+            organization=cls.other, name="Branch", address="-",
+            latitude="12.00000000", longitude="77.00000000", geo_radius_meters=200,
+        )
+        cls.record = AttendanceRecord.objects.create(
+            user=cls.employee, office_location=cls.office, attendance_date=date.today(),
+            login_time=time(9, 0), status="present",
+        )
+
+    def setUp(self):
+        self.broker = pubsub.MemoryBroker()
+        patcher = mock.patch.object(pubsub, "_broker", self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def event(self, organization_id):
+        return services.attendance_event(services.CHECK_IN_EVENT, self.record, organization_id)
+
+    async def next_event(self, user, channel, event, office_id=None):
+        """
+        What ``user``'s subscription gets once ``event`` is published on
+        ``channel``, or None
+        """
+        context = WebSocketContext({"headers": []})
+        context.request.user = user
+        events = await schema.subscribe(self.QUERY, {"officeId": office_id}, context_value=context)
+        received = asyncio.ensure_future(events.__anext__())
+        try:
+            # Let the resolver subscribe first
+            for _ in range(100):
+                if received.done() or channel in self.broker.subscribers:
+                    break
+                await asyncio.sleep(0.01)
+            pubsub.publish(channel, event)
+            try:
+                return await asyncio.wait_for(received, 0.5)
+            except asyncio.TimeoutError:
+                return None
+        finally:
+            await events.aclose()
+
+    async def test_memory_broker_delivers_to_subscribers(self):
+        messages = self.broker.subscribe("channel")
+        received = asyncio.ensure_future(messages.__anext__())
+        await asyncio.sleep(0)
+        self.broker.publish("channel", {"day": date(2024, 1, 10)})
+        self.assertEqual(await asyncio.wait_for(received, 1), {"day": "2024-01-10"})
+        await messages.aclose()
+        self.assertEqual(dict(self.broker.subscribers), {})
+
+    async def test_dashboards_receive_their_organizations_events(self):
+        result = await self.next_event(
+            self.hr, services.organization_channel(self.organization.id), self.event(self.organization.id)
+        )
+        self.assertIsNone(result.errors)
+        self.assertEqual(result.data["attendanceEvents"], {"kind": "check_in", "userId": str(self.employee.id)})
+
+        result = await self.next_event(
+            self.hr, services.office_channel(self.office.id), self.event(self.organization.id), self.office.id
+        )
+        self.assertEqual(result.data["attendanceEvents"]["kind"], "check_in")
+
+    async def test_other_organizations_events_are_not_delivered(self):
+        result = await self.next_event(
+            self.hr, services.organization_channel(self.other.id), self.event(self.other.id)
+        )
+        self.assertIsNone(result)
+
+        result = await self.next_event(
+            self.hr, services.office_channel(self.other_office.id), self.event(self.other.id), self.other_office.id
+        )
+        self.assertEqual(result.errors[0].message, "Office location not found")
+
+    async def test_employees_cannot_subscribe(self):
+        result = await self.next_event(
+            self.employee, services.organization_channel(self.organization.id), self.event(self.organization.id)
+        )
+        self.assertEqual(result.errors[0].message, "Not authorized")
+
+    def test_publish_failures_do_not_fail_the_punch(self):
+        broker = pubsub.RedisBroker("redis://localhost:1/0")
+        broker.redis = mock.Mock(publish=mock.Mock(side_effect=redis.ConnectionError))
+        with mock.patch.object(pubsub, "_broker", broker), self.assertLogs("graphql_utils.pubsub"):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client_for(self.employee).post("/api/attendance/check_in/", {
+                    "office_id": self.office.id, "latitude": 12.9717, "longitude": 77.5947,
+                }, format="json")
+        self.assertEqual(response.status_code, 200)
+        broker.redis.publish.assert_called()
+
+    def test_correction_events_load_the_record_once(self):
+        record = AttendanceRecord.objects.get(pk=self.record.pk)
+        correction = AttendanceCorrection(attendance_record=record, requested_by=self.employee, reason="-")
+        # The insert, then the record with its user
+        with self.assertNumQueries(2):
+            correction.save()
+        correction = AttendanceCorrection.objects.select_related("attendance_record__user").get(pk=correction.pk)
+        with self.assertNumQueries(1):
+            correction.save()
+
+
+class ReviewCorrectionsTests(AttendanceTestCase):
+    MUTATION = """
+    mutation($ids: [ID!]!, $status: String!) {
+      reviewAttendanceCorrections(correctionIds: $ids, status: $status) {
+        correctionId success status error
+      }
+    }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.record = AttendanceRecord.objects.create(
+            user=cls.employee, office_location=cls.office, attendance_date=date(2024, 1, 10),
+            login_time=time(10, 30), logout_time=time(18, 0), status="late_login",
+        )
+        cls.pending = AttendanceCorrection.objects.create(
+            attendance_record=cls.record, requested_by=cls.employee,
+            corrected_login_time=time(9, 0), reason="Badge reader was down",
+        )
+        cls.processed = AttendanceCorrection.objects.create(
+            attendance_record=cls.record, requested_by=cls.employee, reason="-", status="rejected",
+        )
+        other = Organization.objects.create(name="Other", headquarters_address="-")
+        outsider = CustomUser.objects.create_user(
+            email="outsider@example.com", username="outsider", password="secret-password", organization=other,
+        )
+        cls.foreign = AttendanceCorrection.objects.create(
+            attendance_record=AttendanceRecord.objects.create(
+                user=outsider, office_location=cls.office, attendance_date=date(2024, 1, 10), status="absent",
+            ),
+            requested_by=outsider, reason="-",
+        )
+
+    def review(self, user, ids, status="approved"):
+        return self.graphql(user, self.MUTATION, {"ids": [str(i) for i in ids], "status": status})
+
+    def test_mixed_batch(self):
+        ids = [self.pending.id, self.processed.id, self.foreign.id, 999999, "abc", self.pending.id]
+        results = self.review(self.hr, ids)["data"]["reviewAttendanceCorrections"]
+        self.assertEqual([result["correctionId"] for result in results], [str(i) for i in ids])
+        self.assertEqual(
+            [(result["success"], result["status"], result["error"]) for result in results],
+            [
+                (True, "approved", None),
+                (False, None, "This correction has already been processed"),
+                (False, None, "Attendance correction not found"),
+                (False, None, "Attendance correction not found"),
+                (False, None, "Attendance correction not found"),
+                (False, None, "This correction has already been processed"),
+            ],
+        )
+        self.record.refresh_from_db()
+        self.assertEqual((self.record.login_time, self.record.status), (time(9, 0), "present"))
+        self.foreign.refresh_from_db()
+        self.assertEqual(self.foreign.status, "pending")
+
+    def test_rejection_leaves_the_record(self):
+        results = self.review(self.hr, [self.pending.id], "rejected")["data"]["reviewAttendanceCorrections"]
+        self.assertEqual(results[0]["status"], "rejected")
+        self.pending.refresh_from_db()
+        self.assertEqual((self.pending.status, self.pending.approved_by), ("rejected", self.hr))
+        self.record.refresh_from_db()
+        self.assertEqual(self.record.login_time, time(10, 30))
+
+    def test_employees_cannot_review(self):
+        result = self.review(self.employee, [self.pending.id])
+        self.assertEqual(result["errors"][0]["message"], "Not authorized")
+
+    def test_corrections_are_locked_in_primary_key_order(self):
+        with CaptureQueriesContext(connection) as queries:
+            services.review_corrections([self.processed.id, self.pending.id], "approved", self.hr)
+        locking = [query["sql"] for query in queries if "FOR UPDATE" in query["sql"]]
+        self.assertEqual(len(locking), 1)
+        self.assertIn('ORDER BY "attendance_attendancecorrection"."id" ASC', locking[0])
+
+
+class MonthlySummaryTests(AttendanceTestCase):
+    def summary(self, user=None, day=None):
+        day = day or date.today()
+        return AttendanceMonthlySummary.objects.get(user=user or self.employee, year=day.year, month=day.month)
+
+    def test_punches_update_the_month(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            services.check_in_user(self.employee, self.office.id, 12.9717, 77.5947, time(9, 30))
+        summary = self.summary()
+        self.assertEqual((summary.present_days, summary.late_logins, summary.worked_hours), (1, 1, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            services.check_out_user(self.employee, 12.9717, 77.5947, time(16, 30))
+        summary = self.summary()
+        self.assertEqual((summary.early_logouts, summary.worked_hours), (1, Decimal("7.00")))
+
+    def test_approved_corrections_update_the_month(self):
+        day = date(2024, 1, 10)
+        record = AttendanceRecord.objects.create(
+            user=self.employee, office_location=self.office, attendance_date=day,
+            login_time=time(10, 0), logout_time=time(17, 0), status="late_login", worked_hours=7,
+        )
+        AttendanceMonthlySummary.objects.refresh([(self.employee.id, 2024, 1)])
+        self.assertEqual(self.summary(day=day).late_logins, 1)
+
+        correction = AttendanceCorrection.objects.create(
+            attendance_record=record, requested_by=self.employee, corrected_login_time=time(9, 0), reason="-",
+        )
+        correction.approve(self.hr)
+        summary = self.summary(day=day)
+        self.assertEqual((summary.late_logins, summary.worked_hours), (0, Decimal("8.00")))
+
+    def test_rebuild_matches_the_records(self):
+        punches = [
+            (self.employee, date(2024, 1, 10), time(9, 0), time(17, 0), "present"),
+            (self.employee, date(2024, 1, 11), time(9, 20), time(16, 0), "late_login"),
+            (self.employee, date(2024, 2, 1), None, None, "absent"),
+            (self.hr, date(2024, 1, 10), time(8, 50), time(17, 30), "present"),
+        ]
+        for user, day, login, logout, status in punches:
+            record = AttendanceRecord(
+                user=user, office_location=self.office, attendance_date=day,
+                login_time=login, logout_time=logout, status=status,
+            )
+            record.recalculate_worked_hours()
+            record.save()
+        # Left over from records that no longer exist
+        AttendanceMonthlySummary.objects.create(user=self.employee, year=2024, month=3, present_days=5)
+
+        AttendanceMonthlySummary.objects.rebuild()
+
+        expected = {}
+        for user, day, login, logout, status in punches:
+            row = expected.setdefault((user.id, day.year, day.month), [0, 0, 0, Decimal("0")])
+            row[0] += status in AttendanceRecord.PRESENT_STATUSES
+            row[1] += bool(login and login > self.office.login_time)
+            row[2] += bool(logout and logout < self.office.logout_time)
+            if login and logout:
+                row[3] += Decimal(str(round((logout.hour * 60 + logout.minute - login.hour * 60 - login.minute) / 60, 2)))
+        summaries = {
+            (summary.user_id, summary.year, summary.month):
+                [summary.present_days, summary.late_logins, summary.early_logouts, summary.worked_hours]
+            for summary in AttendanceMonthlySummary.objects.all()
+        }
+        self.assertEqual(summaries, expected)
+
+    def test_rebuilding_a_month_without_records(self):
+        AttendanceMonthlySummary.objects.create(user=self.employee, year=2024, month=3, present_days=5)
+        AttendanceMonthlySummary.objects.create(user=self.employee, year=2024, month=4, present_days=5)
+        self.assertEqual(AttendanceMonthlySummary.objects.rebuild(2024, 3), 0)
+        self.assertEqual(
+            list(AttendanceMonthlySummary.objects.values_list("month", flat=True)), [4]
+        )
+        AttendanceMonthlySummary.objects.refresh([(self.employee.id, 2024, 4)])
+        self.assertEqual(self.summary(day=date(2024, 4, 1)).present_days, 0)
+
+    def test_summaries_query_is_scoped(self):
+        for user in (self.employee, self.hr):
+            AttendanceMonthlySummary.objects.create(user=user, year=2024, month=1, present_days=20)
+        query = "{ monthlyAttendanceSummaries(year: 2024, month: 1) { edges { node { user { email } presentDays } } } }"
+
+        def emails(user):
+            edges = self.graphql(user, query)["data"]["monthlyAttendanceSummaries"]["edges"]
+            return {edge["node"]["user"]["email"] for edge in edges}
+
+        self.assertEqual(emails(self.hr), {"hr@example.com", "employee@example.com"})
+        self.assertEqual(emails(self.employee), {"employee@example.com"})
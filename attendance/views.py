@@ -1,31 +1,20 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from math import radians, sin, cos, sqrt, atan2
+from django.http import Http404
 from django.utils import timezone
-from attendance.models import AttendanceRecord, AttendanceCorrection
-from attendance.serializers import AttendanceRecordSerializer, AttendanceCorrectionSerializer
-from organizations.models import OfficeLocation
-
-class AttendanceRecordViewSet(viewsets.ModelViewSet):
-    """Attendance management"""
-    serializer_class = AttendanceRecordSerializer
-    permission_classes = []
-
-    def get_queryset(self):
-        return AttendanceRecord.objects.filter(user=self.request.user)
-
-    def calculate_distance(self, lat1, lon1, lat2, lon2):
-        """Calculate distance between two coordinates"""
-        R = 6371000  # Earth radius in meters
-        phi1 = radians(float(lat1))
-        phi2 = radians(float(lat2))
-        delta_phi = radians(float(lat2) - float(lat1))
-        delta_lambda = radians(float(lon2) - float(lon1))
-
-        a = sin(delta_phi/2)**2 + cos(phi1)*cos(phi2)*sin(delta_lambda/2)**2
-        c = 2*atan2(sqrt(a), sqrt(1-a))
-        return R*c
+from attendance.models import AttendanceCorrection
+from attendance.serializers import AttendanceCorrectionSerializer
+from attendance.geofence import get_office_index
+from attendance.services import calculate_distance, check_in_user, check_out_user, ingest_punches
+
+class AttendanceRecordViewSet(viewsets.GenericViewSet):
+    """
+    Check-in, check-out and bulk punches. Records themselves are never
+    written directly: changes go through the geofence or a correction.
+    """
+    permission_classes = [IsAuthenticated]
 
     @action(detail=False, methods=['post'])
     def check_in(self, request):
@@ -42,9 +31,11 @@ class AttendanceRecordViewSet(viewsets.ModelViewSet):
         except (TypeError, ValueError):
             return Response({'error': 'Latitude and longitude must be valid numbers'},status=status.HTTP_400_BAD_REQUEST)
 
-        office = get_object_or_404(OfficeLocation, id=office_id)
+        office = get_office_index(request.user.organization_id).get(office_id)
+        if office is None:
+            raise Http404("Office location not found")
 
-        distance = self.calculate_distance(latitude, longitude, office.latitude, office.longitude)
+        distance = calculate_distance(latitude, longitude, office.latitude, office.longitude)
         is_within_geofence = distance <= office.geo_radius_meters
 
         if distance > office.geo_radius_meters:
@@ -58,19 +49,14 @@ class AttendanceRecordViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        attendance, created = AttendanceRecord.objects.get_or_create(
-            user=request.user,
-            attendance_date=timezone.now().date(),
-            office_location=office
+        check_in_user(
+            request.user,
+            office.id,
+            latitude,
+            longitude,
+            timezone.localtime().time(),
         )
 
-        attendance.login_time = timezone.now()
-        attendance.login_latitude = latitude
-        attendance.login_longitude = longitude
-        attendance.is_within_geofence = is_within_geofence
-        attendance.status = 'present'
-        attendance.save()
-
         return Response({
             'message': 'Check-in successful',
             'is_within_geofence': is_within_geofence,
@@ -100,41 +86,20 @@ class AttendanceRecordViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # 2. Fetch today's attendance
-        attendance = get_object_or_404(
-            AttendanceRecord,
-            user=request.user,
-            attendance_date=timezone.now().date()
-        )
-
-        office = attendance.office_location
-
-        # 3. Calculate logout distance
-        logout_distance = self.calculate_distance(
+        # 2. Update today's attendance
+        attendance, logout_distance = check_out_user(
+            request.user,
             latitude,
             longitude,
-            office.latitude,
-            office.longitude
+            timezone.localtime().time(),
         )
 
+        office = (
+            get_office_index(request.user.organization_id).get(attendance.office_location_id)
+            or attendance.office_location
+        )
         is_within_geofence = logout_distance <= office.geo_radius_meters
 
-        # 4. Update attendance
-        attendance.logout_time = timezone.now()
-        attendance.logout_latitude = latitude
-        attendance.logout_longitude = longitude
-        attendance.logout_distance = logout_distance  # optional field
-        attendance.is_within_geofence_logout = is_within_geofence  # optional field
-
-        # 5. Calculate worked hours
-        if attendance.login_time:
-            attendance.worked_hours = round(
-                (attendance.logout_time - attendance.login_time).total_seconds() / 3600,
-                2
-            )
-
-        attendance.save()
-
         return Response(
             {
                 'message': 'Check-out successful',
@@ -146,6 +111,28 @@ class AttendanceRecordViewSet(viewsets.ModelViewSet):
             status=status.HTTP_200_OK
         )
 
+    @action(detail=False, methods=['post'])
+    def bulk_punch(self, request):
+        """Batch upload of punches from kiosks / biometric terminals"""
+        user = request.user
+        if not user.is_authenticated or user.role not in ['hr', 'admin']:
+            return Response({'error': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
+
+        punches = request.data.get('punches')
+        if not isinstance(punches, list):
+            return Response({'error': 'punches must be a list'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            results = ingest_punches(punches, organization_id=user.organization_id)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'processed': sum(1 for result in results if result['success']),
+            'failed': sum(1 for result in results if not result['success']),
+            'results': results,
+        }, status=status.HTTP_200_OK)
+
     class AttendanceCorrectionViewSet(viewsets.ModelViewSet):
         """Attendance correction requests"""
         serializer_class = AttendanceCorrectionSerializer
@@ -165,16 +152,6 @@ class AttendanceRecordViewSet(viewsets.ModelViewSet):
         def approve(self, request, pk=None):
             """Approve correction"""
             correction = self.get_object()
-            attendance = correction.attendance_record
-
-            if correction.corrected_login_time:
-                attendance.login_time = correction.corrected_login_time
-            if correction.corrected_logout_time:
-                attendance.logout_time = correction.corrected_logout_time
-
-            attendance.save()
-            correction.status = 'approved'
-            correction.approved_by = request.user
-            correction.save()
+            correction.approve(request.user)
 
             return Response(AttendanceCorrectionSerializer(correction).data)
@@ -12,5 +12,20 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# GraphQL is executed asynchronously when served through this module
+os.environ.setdefault('GRAPHQL_ASYNC', 'true')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up
+from graphql_api.schema import schema  # noqa: E402
+from graphql_utils.websockets import GraphQLWebSocketApp  # noqa: E402
+
+websocket_application = GraphQLWebSocketApp(schema)
+
+
+async def application(scope, receive, send):
+    """GraphQL subscriptions over websockets, everything else through Django"""
+    if scope["type"] == "websocket":
+        return await websocket_application(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -0,0 +1,52 @@
+"""
+Version stamps shared between workers through the Django cache.
+
+Workers keep derived data (indexes, snapshots) in memory together with the
+version they were built from, and rebuild when the shared stamp moves.
+Stamps start from the current time in milliseconds, so a stamp that was
+evicted and recreated never repeats an old value.
+
+Bump after the change commits: a worker reading the old row before the
+commit would otherwise keep it under the new stamp.
+"""
+
+import time
+
+from django.core.cache import cache
+
+
+def _initial():
+    return int(time.time() * 1000)
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def get_versions(keys):
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            versions[key] = get_version(key)
+    return versions
+
+
+def bump_version(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial(), timeout=None)
+        return cache.get(key)
+
+
+def bump_versions(keys):
+    """
+    Move every stamp in ``keys`` with a single cache call. They are set to
+    the current time in nanoseconds, far above any counted stamp.
+    """
+    if keys:
+        cache.set_many(dict.fromkeys(keys, time.time_ns()), timeout=None)
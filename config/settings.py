@@ -10,9 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
+from celery.schedules import crontab
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -40,6 +43,7 @@ INSTALLED_APPS = [
     'cloudinary_storage',
     'cloudinary',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     "rest_framework",
     "corsheaders",
     "drf_spectacular",
@@ -53,6 +57,7 @@ INSTALLED_APPS = [
     "leaves",
     "ai_engine",
     "graphql",
+    "graphql_api",
     ]
 
 MIDDLEWARE = [
@@ -119,6 +124,73 @@ DATABASES = {
 }
 
 
+# Cache
+# Shared between workers through Redis when REDIS_URL is set; version stamps
+# in config.cache_versions rely on this to invalidate in-process indexes.
+
+REDIS_URL = os.environ.get("REDIS_URL")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+
+# Celery
+# Without a broker, tasks run eagerly in-process (tests, local development).
+
+CELERY_BROKER_URL = os.environ.get("CELERY_BROKER_URL", REDIS_URL)
+CELERY_TASK_ALWAYS_EAGER = CELERY_BROKER_URL is None
+CELERY_TASK_EAGER_PROPAGATES = True
+CELERY_TIMEZONE = "UTC"
+
+CELERY_BEAT_SCHEDULE = {
+    "mark-daily-attendance": {
+        "task": "attendance.tasks.mark_daily_attendance",
+        "schedule": crontab(hour=1, minute=0),
+    },
+}
+
+# Office indexes (attendance.geofence): organizations kept in each worker,
+# and seconds after which an index is rebuilt even if no version moved
+OFFICE_INDEX_CACHE_SIZE = 1024
+OFFICE_INDEX_MAX_AGE = 300
+
+# Weekdays (Monday=0) on which no attendance is expected
+ATTENDANCE_WEEKLY_OFF_DAYS = [5, 6]
+
+# Authenticated-user cache (users.cache): seconds in the shared cache,
+# number of users kept in each worker and seconds a worker keeps one
+USER_CACHE_TIMEOUT = 300
+USER_CACHE_SIZE = 1024
+USER_CACHE_LOCAL_MAX_AGE = 30
+
+# Login throttling (users.throttling): token buckets of (failed attempts,
+# seconds) per client IP and per account
+LOGIN_THROTTLE_RATES = {
+    "ip": (300, 60),
+    "account": (10, 60),
+}
+
+# Async login (users.login_pool): password-hashing threads per worker and
+# attempts allowed to wait for one before new ones are refused
+LOGIN_HASH_WORKERS = 4
+LOGIN_MAX_PENDING = 2000
+
+# Revoked JWTs (users.revocation): how often a worker checks for revocations
+# made by other workers, in seconds
+REVOCATION_SYNC_SECONDS = 1
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -157,16 +229,82 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 STATIC_URL = "/static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"
+MEDIA_URL = "/media/"
+MEDIA_ROOT = BASE_DIR / "media"
+
 # Static & Media Storage (Django 4.2+)
+# MEDIA_STORAGE=filesystem keeps media under MEDIA_ROOT (tests, local development)
 STORAGES = {
     "default": {
-        "BACKEND": "cloudinary_storage.storage.MediaCloudinaryStorage",
+        "BACKEND": (
+            "django.core.files.storage.FileSystemStorage"
+            if os.environ.get("MEDIA_STORAGE") == "filesystem"
+            else "cloudinary_storage.storage.MediaCloudinaryStorage"
+        ),
     },
     "staticfiles": {
         "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
     },
 }
 
+# Employee CSV imports (users.importers): uploads wait here for the import
+# task, and job reports are kept this many seconds
+EMPLOYEE_IMPORT_STAGING_DIR = Path(
+    os.environ.get("EMPLOYEE_IMPORT_STAGING_DIR", BASE_DIR / "media" / "staging" / "imports")
+)
+EMPLOYEE_IMPORT_JOB_TIMEOUT = 24 * 60 * 60
+
+# Employee search (users.search): organizations up to this size are served
+# from an in-memory prefix index, larger ones from the trigram indexes;
+# number of organizations' indexes kept in each worker
+SEARCH_INDEX_MAX_USERS = 100000
+SEARCH_INDEX_CACHE_SIZE = 32
+
+# Persisted GraphQL queries (graphql_utils.persisted_queries): a manifest
+# generated by the client build, and whether to serve only its documents
+GRAPHQL_PERSISTED_QUERIES_MANIFEST = os.environ.get("GRAPHQL_PERSISTED_QUERIES_MANIFEST")
+GRAPHQL_PERSISTED_QUERIES_ONLY = os.environ.get("GRAPHQL_PERSISTED_QUERIES_ONLY") == "true"
+# Documents registered at runtime: seconds they are kept, and the largest
+# one registered (larger documents still run, sent in full every time)
+GRAPHQL_APQ_TTL = int(os.environ.get("GRAPHQL_APQ_TTL", 24 * 60 * 60))
+GRAPHQL_APQ_MAX_BYTES = 16 * 1024
+
+# Parsed and validated documents kept per worker (graphql_utils.document_cache),
+# and how many lookups between two logs of its hit and miss counters
+GRAPHQL_DOCUMENT_CACHE_SIZE = 1000
+GRAPHQL_DOCUMENT_CACHE_STATS_EVERY = 1000
+
+# Async GraphQL execution, enabled by config.asgi: root resolvers run in a
+# pool of this many threads, each holding at most one database connection
+GRAPHQL_ASYNC = os.environ.get("GRAPHQL_ASYNC") == "true"
+GRAPHQL_ORM_THREADS = int(os.environ.get("GRAPHQL_ORM_THREADS", 8))
+
+# Query budgets (graphql_utils.query_cost). Connections called without
+# first hold a default page (graphql_utils.pagination.DEFAULT_PAGE_SIZE);
+# other lists are assumed to hold GRAPHQL_DEFAULT_LIST_SIZE items. Fields
+# cost 1 if they return an object, 0 for scalars, unless weighted here.
+GRAPHQL_MAX_QUERY_DEPTH = 10
+GRAPHQL_MAX_QUERY_COST = 5000
+GRAPHQL_DEFAULT_LIST_SIZE = 20
+GRAPHQL_FIELD_COSTS = {
+    # Resolved through the closure table, one query per call
+    "UserType.reports": 5,
+    "UserType.managementChain": 5,
+}
+
+# Profile pictures (users.media): uploads are written here first and
+# processed by a Celery task, so the directory must be shared with the
+# workers. Renditions are WebP, longest side in pixels.
+PROFILE_PICTURE_STAGING_DIR = Path(
+    os.environ.get("PROFILE_PICTURE_STAGING_DIR", BASE_DIR / "media" / "staging")
+)
+PROFILE_PICTURE_MAX_BYTES = 10 * 1024 * 1024
+PROFILE_PICTURE_SIZES = {
+    "profile_picture": 1024,
+    "profile_picture_medium": 256,
+    "profile_picture_small": 64,
+}
+
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "DEFAULT_AUTHENTICATION_CLASSES": (
@@ -175,6 +313,9 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.IsAuthenticated",
     ),
+    # Trusted reverse proxies in front of the app: client IPs (throttling)
+    # are read from their X-Forwarded-For hops
+    "NUM_PROXIES": int(os.environ["NUM_PROXIES"]) if os.environ.get("NUM_PROXIES") else None,
 }
 
 SPECTACULAR_SETTINGS = {
@@ -192,7 +333,10 @@ SIMPLE_JWT = {
     "AUTH_TOKEN_CLASSES": ("rest_framework_simplejwt.tokens.AccessToken",),
 
     "ROTATE_REFRESH_TOKENS": True,
+    # Rotated refresh tokens are revoked in users.revocation rather than the
+    # token_blacklist app's SQL tables
     "BLACKLIST_AFTER_ROTATION": True,
+    "TOKEN_REFRESH_SERIALIZER": "users.serializers.RevocableTokenRefreshSerializer",
 }
 CSRF_TRUSTED_ORIGINS = ['http://localhost:3000']
 
@@ -1,26 +1,58 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib import admin
 from django.urls import include, path
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
-from strawberry.django.views import GraphQLView
+from strawberry.django.views import AsyncGraphQLView, GraphQLView
+from strawberry.types import ExecutionResult
 from graphql_api.schema import schema
 from graphql_utils.context import CustomContext
+from graphql_utils.persisted_queries import PersistedQueryError, resolve_query
 
 class CustomGraphQLView(GraphQLView):
     def get_context(self, request, response):
         return CustomContext(request, response)
 
+    def execute_single(self, request_data, **kwargs):
+        try:
+            request_data.query = resolve_query(request_data.query, request_data.extensions)
+        except PersistedQueryError as e:
+            return ExecutionResult(data=None, errors=[e.as_graphql_error()])
+        return super().execute_single(request_data=request_data, **kwargs)
+
+
+class AsyncCustomGraphQLView(AsyncGraphQLView):
+    """Served under ASGI, see graphql_utils.offload"""
+
+    async def get_context(self, request, response):
+        return CustomContext(request, response)
+
+    async def execute_single(self, request_data, **kwargs):
+        try:
+            # Persisted queries may come from the shared cache: keep that off the loop
+            request_data.query = await sync_to_async(resolve_query, thread_sensitive=False)(
+                request_data.query, request_data.extensions
+            )
+        except PersistedQueryError as e:
+            return ExecutionResult(data=None, errors=[e.as_graphql_error()])
+        return await super().execute_single(request_data=request_data, **kwargs)
+
+
+graphql_view = (AsyncCustomGraphQLView if settings.GRAPHQL_ASYNC else CustomGraphQLView).as_view(schema=schema)
+
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from users.views import LoginView, CookieTokenRefreshView
+from users.views import CookieTokenRefreshView, async_login
 
 from django.views.decorators.csrf import csrf_exempt
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path("graphql/", csrf_exempt(CustomGraphQLView.as_view(schema=schema))),
+    path("graphql/", csrf_exempt(graphql_view)),
     path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
     path("api/docs/", SpectacularSwaggerView.as_view(url_name="schema")), 
-    path("api/auth/login/", LoginView.as_view(), name="token_obtain_pair"),
+    path("api/auth/login/", async_login, name="token_obtain_pair"),
     path("api/auth/refresh/", CookieTokenRefreshView.as_view(), name="token_refresh"),  
     path("api/users/", include("users.urls")),
+    path("api/attendance/", include("attendance.urls")),
     path("api/", include("organizations.urls")),
 ]
@@ -1,7 +1,10 @@
 from django.contrib.auth import authenticate
 from rest_framework_simplejwt.tokens import RefreshToken
+import math
 import strawberry
 
+from users.throttling import check_login_throttle, client_ip, record_failed_login
+
 @strawberry.type
 class AuthPayload:
     access: str
@@ -11,8 +14,16 @@ class AuthPayload:
 class Mutation:
     @strawberry.mutation
     def login(self, info, email: str, password: str) -> AuthPayload:
+        ip = client_ip(info.context.request)
+        retry_after = check_login_throttle(ip, email)
+        if retry_after is not None:
+            raise Exception(
+                f"Too many login attempts, retry in {math.ceil(retry_after)} seconds"
+            )
+
         user = authenticate(username=email, password=password)
         if not user:
+            record_failed_login(ip, email)
             raise Exception("Invalid credentials")
 
         refresh = RefreshToken.for_user(user)
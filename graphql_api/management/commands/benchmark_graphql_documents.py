@@ -0,0 +1,72 @@
+import time
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from graphql import parse, specified_rules
+from strawberry.schema.schema import validate_document
+
+from graphql_api.schema import schema
+from graphql_utils.document_cache import document_cache, document_key
+
+OPERATIONS = {
+    "me": """
+        query Me {
+          me {
+            id email firstName lastName role employeeId
+            organization { id name }
+            department { id name }
+            designation { id name }
+            manager { id firstName lastName email }
+          }
+        }
+    """,
+    "myAttendance": """
+        query MyAttendance($input: AttendanceInput) {
+          myAttendance(input: $input) {
+            id attendanceDate loginTime logoutTime status workedHours
+            isWithinGeofence loginDistance logoutDistance remarks
+            correctionReason
+            officeLocation { id name }
+          }
+        }
+    """,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the CPU time per request that the document cache saves on "
+        "the me and myAttendance operations"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        rules = tuple(specified_rules)
+
+        for name, query in OPERATIONS.items():
+            document = parse(query)
+            errors = validate_document(schema._schema, document, rules)
+            assert not errors, errors
+
+            uncached = self._cpu_per_call(iterations, lambda: validate_document(
+                schema._schema, parse(query), rules
+            ))
+            # What DocumentCacheExtension does on a hit
+            context = SimpleNamespace(schema=schema, query=query)
+            document_cache.put(document_key(context), document, ())
+            cached = self._cpu_per_call(iterations, lambda: document_cache.get(document_key(context)))
+
+            self.stdout.write(
+                f"{name}: parse+validate {uncached:.0f}us, cache hit {cached:.1f}us, "
+                f"saves {uncached - cached:.0f}us CPU per request"
+            )
+        self.stdout.write(f"cache: {document_cache.stats()}")
+
+    def _cpu_per_call(self, iterations, call):
+        started = time.process_time()
+        for _ in range(iterations):
+            call()
+        return (time.process_time() - started) / iterations * 1e6
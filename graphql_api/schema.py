@@ -1,10 +1,15 @@
 import strawberry
+from strawberry_django.optimizer import DjangoOptimizerExtension
 
 from users.graphql.queries import UserQuery
 from attendance.graphql.queries import AttendanceQuery
 from attendance.graphql.mutations import AttendanceMutation
+from attendance.graphql.subscriptions import AttendanceSubscription
 from users.graphql.mutations import UserMutation
 from leaves.graphql.queries import LeaveQuery
+from graphql_utils.document_cache import DocumentCacheExtension
+from graphql_utils.offload import ResolverOffloadExtension
+from graphql_utils.query_cost import QueryCostExtension
 
 
 @strawberry.type
@@ -30,7 +35,27 @@ class Mutation(UserMutation, AttendanceMutation):
     pass
 
 
+@strawberry.type
+class Subscription(AttendanceSubscription):
+    """
+    Root Subscription (websockets, graphql-transport-ws):
+    - attendanceEvents
+    """
+    pass
+
+
 schema = strawberry.Schema(
     query=Query,
-    mutation=Mutation
+    mutation=Mutation,
+    subscription=Subscription,
+    extensions=[
+        DocumentCacheExtension,
+        QueryCostExtension,
+        # Plans select_related/prefetch_related from the selection set. It
+        # must sit before ResolverOffloadExtension, which wraps it, to see
+        # the querysets resolvers return. only() is left off: computed
+        # fields read columns the selection does not name.
+        DjangoOptimizerExtension(enable_only_optimization=False),
+        ResolverOffloadExtension,
+    ],
 )
@@ -0,0 +1,211 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from attendance.models import AttendanceRecord
+from attendance.services import check_in_user
+from graphql_api.schema import schema
+from graphql_utils import context as graphql_context, persisted_queries
+from graphql_utils.context import CustomContext
+from graphql_utils.document_cache import document_cache
+from graphql_utils.pagination import DEFAULT_PAGE_SIZE
+from graphql_utils.persisted_queries import query_hash
+from organizations.models import OfficeLocation, Organization
+from users.models import CustomUser
+
+
+class GraphQLTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = Organization.objects.create(name="Acme", headquarters_address="-")
+        cls.user = CustomUser.objects.create_user(
+            email="employee@example.com", username="employee", password="secret-password",
+            organization=cls.organization, first_name="Evan",
+        )
+
+    def graphql(self, payload, user=None):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user or self.user)}")
+        return client.post("/graphql/", payload, format="json").json()
+
+
+class ContextTests(GraphQLTestCase):
+    def setUp(self):
+        # A user lookup would have to hit the database
+        cache.clear()
+
+    def test_queries_not_touching_the_user_skip_authentication(self):
+        with mock.patch("graphql_utils.context._authentication.authenticate") as authenticate:
+            with self.assertNumQueries(0):
+                result = self.graphql({"query": "query { __typename }"})
+        self.assertEqual(result["data"], {"__typename": "Query"})
+        authenticate.assert_not_called()
+
+    def test_the_token_is_checked_once(self):
+        authentication = graphql_context._authentication
+        with mock.patch.object(authentication, "authenticate", wraps=authentication.authenticate) as spy:
+            result = self.graphql({"query": "query { me { firstName } other: me { email } }"})
+        self.assertEqual(result["data"]["other"], {"email": "employee@example.com"})
+        spy.assert_called_once()
+
+    def test_bad_tokens_fall_back_to_anonymous(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION="Bearer not-a-token")
+        result = client.post("/graphql/", {"query": "query { me { firstName } }"}, format="json").json()
+        self.assertEqual(result["data"], {"me": None})
+
+
+class PersistedQueryTests(GraphQLTestCase):
+    QUERY = "query { me { firstName } }"
+
+    def setUp(self):
+        cache.clear()
+        persisted_queries._local.clear()
+
+    def send(self, query=None):
+        payload = {"extensions": {"persistedQuery": {"version": 1, "sha256Hash": query_hash(self.QUERY)}}}
+        if query is not None:
+            payload["query"] = query
+        return self.graphql(payload)
+
+    def assertNotFound(self, result):
+        self.assertEqual(result["errors"][0]["extensions"]["code"], "PERSISTED_QUERY_NOT_FOUND")
+
+    def test_documents_are_registered_by_hash(self):
+        self.assertNotFound(self.send())
+        self.assertEqual(self.send(self.QUERY)["data"], {"me": {"firstName": "Evan"}})
+        self.assertEqual(self.send()["data"], {"me": {"firstName": "Evan"}})
+
+    def test_hash_must_match_the_document(self):
+        result = self.send("query { me { lastName } }")
+        self.assertEqual(result["errors"][0]["extensions"]["code"], "INVALID_PERSISTED_QUERY")
+
+    @override_settings(GRAPHQL_APQ_TTL=0)
+    def test_documents_expire(self):
+        self.send(self.QUERY)
+        self.assertNotFound(self.send())
+
+    @override_settings(GRAPHQL_APQ_MAX_BYTES=10)
+    def test_large_documents_run_but_are_not_registered(self):
+        self.assertEqual(self.send(self.QUERY)["data"], {"me": {"firstName": "Evan"}})
+        self.assertNotFound(self.send())
+
+
+class DocumentCacheTests(GraphQLTestCase):
+    QUERY = "query { me { firstName } }"
+
+    def setUp(self):
+        document_cache.clear()
+
+    def test_repeated_documents_are_served_from_the_cache(self):
+        for _ in range(3):
+            self.assertEqual(self.graphql({"query": self.QUERY})["data"], {"me": {"firstName": "Evan"}})
+        self.assertEqual(document_cache.stats()["misses"], 1)
+        self.assertEqual(document_cache.stats()["hits"], 2)
+
+    def test_invalid_documents_keep_their_errors(self):
+        for _ in range(2):
+            result = self.graphql({"query": "query { me { noSuchField } }"})
+            self.assertEqual(len(result["errors"]), 1)
+        self.assertEqual(document_cache.stats()["hits"], 1)
+
+    @override_settings(GRAPHQL_DOCUMENT_CACHE_STATS_EVERY=2)
+    def test_counters_are_logged(self):
+        with self.assertLogs("graphql_utils.document_cache") as logs:
+            self.graphql({"query": self.QUERY})
+            self.graphql({"query": self.QUERY})
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn("'hits': 1, 'misses': 1", logs.output[0])
+
+
+class QueryCostTests(GraphQLTestCase):
+    CONNECTION = """
+    query($first: Int) {
+      myAttendanceConnection(input: {startDate: "2024-01-01", endDate: "2024-01-31"}, first: $first) {
+        edges { node { id officeLocation { id } } }
+      }
+    }
+    """
+
+    def cost(self, query, variables=None):
+        result = self.graphql({"query": query, "variables": variables or {}})
+        return result["extensions"]["cost"]
+
+    def test_cost_is_reported(self):
+        cost = self.cost("query { me { firstName manager { id } } }")
+        self.assertEqual((cost["requested"], cost["depth"]), (2, 3))
+
+    def test_connections_without_first_are_priced_at_the_default_page(self):
+        self.assertEqual(
+            self.cost(self.CONNECTION)["requested"],
+            self.cost(self.CONNECTION, {"first": DEFAULT_PAGE_SIZE})["requested"],
+        )
+        self.assertLess(
+            self.cost(self.CONNECTION, {"first": 10})["requested"],
+            self.cost(self.CONNECTION)["requested"],
+        )
+
+    @override_settings(GRAPHQL_MAX_QUERY_COST=50)
+    def test_costly_queries_are_rejected(self):
+        self.assertEqual(self.cost(self.CONNECTION, {"first": 10})["requested"], 31)
+        result = self.graphql({"query": self.CONNECTION})
+        self.assertIsNone(result["data"])
+        self.assertEqual(result["errors"][0]["extensions"]["code"], "QUERY_TOO_COMPLEX")
+        self.assertEqual(result["extensions"]["cost"]["requested"], 151)
+
+    @override_settings(GRAPHQL_MAX_QUERY_DEPTH=2)
+    def test_deep_queries_are_rejected(self):
+        result = self.graphql({"query": "query { me { manager { manager { id } } } }"})
+        self.assertIsNone(result["data"])
+        self.assertEqual(result["errors"][0]["extensions"]["code"], "QUERY_TOO_COMPLEX")
+
+
+class AsyncExecutionTests(TransactionTestCase):
+    # Resolvers run in the ORM pool, whose threads have their own database
+    # connections and would not see a TestCase's uncommitted rows
+
+    def setUp(self):
+        organization = Organization.objects.create(name="Acme", headquarters_address="-")
+        self.office = OfficeLocation.objects.create(
+            organization=organization, name="HQ", address="-",
+            latitude="12.97160000", longitude="77.59460000", geo_radius_meters=200,
+        )
+        self.user = CustomUser.objects.create_user(
+            email="hr@example.com", username="hr", password="secret-password",
+            organization=organization, office_location=self.office, role="hr", first_name="Hannah",
+        )
+        CustomUser.objects.create_user(
+            email="employee@example.com", username="employee", password="secret-password",
+            organization=organization, manager=self.user,
+        )
+
+    async def execute(self, query):
+        request = RequestFactory().post(
+            "/graphql/", HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}"
+        )
+        return await schema.execute(query, context_value=CustomContext(request, None))
+
+    async def test_orm_backed_fields(self):
+        result = await self.execute("query { me { firstName profilePictureUrl reports { email } } }")
+        self.assertIsNone(result.errors)
+        self.assertEqual(result.data["me"], {
+            "firstName": "Hannah", "profilePictureUrl": None, "reports": [{"email": "employee@example.com"}],
+        })
+
+    async def test_mutations_run_once(self):
+        with mock.patch("attendance.graphql.mutations.check_in_user", wraps=check_in_user) as check_in:
+            result = await self.execute(f"""
+                mutation {{
+                  checkIn(input: {{
+                    officeLocationId: {self.office.id}, latitude: 12.9717, longitude: 77.5947, loginTime: "09:00:00"
+                  }}) {{
+                    status
+                  }}
+                }}
+            """)
+        self.assertIsNone(result.errors)
+        check_in.assert_called_once()
+        self.assertEqual(await AttendanceRecord.objects.filter(user_id=self.user.id).acount(), 1)
@@ -1,21 +1,45 @@
+from django.contrib.auth.models import AnonymousUser
+from django.utils.functional import SimpleLazyObject
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
 from strawberry.django.context import StrawberryDjangoContext
 from users.authentication import CookieJWTAuthentication
 
+# Stateless, shared by all requests
+_authentication = CookieJWTAuthentication()
+
+
 class CustomContext(StrawberryDjangoContext):
     def __init__(self, request, response):
         super().__init__(request=request, response=response)
-        
-        # Always try JWT authentication first. 
-        # This ensures that if an access_token is present (e.g. from cookie), 
-        # it takes precedence over any session-based auth (e.g. from Django Admin).
-        auth = CookieJWTAuthentication()
-        try:
-            user_auth_tuple = auth.authenticate(request)
-            if user_auth_tuple is not None:
-                self.request.user, _ = user_auth_tuple
-        except Exception:
-            # If JWT auth fails (e.g. invalid token), we generally want to leave request.user as is 
-            # (which might be AnonymousUser or a valid Session user), 
-            # OR we might want to force it to AnonymousUser if we want strictly API behavior.
-            # For now, let's allow fallback but priority is given to JWT.
-            pass
+
+        # JWT takes precedence over any session-based auth (e.g. from Django
+        # Admin), but the token is only checked the first time a resolver
+        # touches request.user. Introspection and public queries never pay
+        # for it.
+        session_user = getattr(request, "user", None)
+        if session_user is None:
+            session_user = AnonymousUser()
+        self._jwt = None
+        self.request.user = SimpleLazyObject(
+            lambda: self._jwt_user() or session_user
+        )
+
+    @property
+    def token(self):
+        """
+        The validated access token of this request, or None
+        """
+        return self._authenticate()[1]
+
+    def _jwt_user(self):
+        return self._authenticate()[0]
+
+    def _authenticate(self):
+        if self._jwt is None:
+            try:
+                self._jwt = _authentication.authenticate(self.request) or (None, None)
+            except (InvalidToken, TokenError, AuthenticationFailed):
+                # Invalid or expired token: fall back to the session user
+                # (AnonymousUser when there is none)
+                self._jwt = (None, None)
+        return self._jwt
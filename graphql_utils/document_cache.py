@@ -0,0 +1,117 @@
+"""
+Parsed and validated GraphQL documents, cached per worker.
+
+Clients send the same few dozen operations over and over, so the parse and
+validation of each one is done once per worker. Entries are keyed by the
+schema version (a hash of its SDL) and a hash of the document text.
+Changing the schema therefore never serves a document validated against
+an older one. Documents that fail to parse are not cached. The hit and
+miss counters are logged every GRAPHQL_DOCUMENT_CACHE_STATS_EVERY lookups.
+
+strawberry's ParserCache and ValidationCache are not used: they are two
+lookups per request, the second one hashing the whole AST, neither knows
+the schema version, and ValidationCache hands every request the same
+errors list, which strawberry then appends to.
+"""
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from strawberry.extensions import SchemaExtension
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentCache:
+    """
+    Bounded LRU of (document AST, validation errors)
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries.move_to_end(key)
+            lookups = self.hits + self.misses
+        if lookups % settings.GRAPHQL_DOCUMENT_CACHE_STATS_EVERY == 0:
+            logger.info("GraphQL document cache: %s", self.stats())
+        return entry
+
+    def put(self, key, document, errors):
+        with self.lock:
+            self.entries[key] = (document, errors)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+document_cache = DocumentCache(settings.GRAPHQL_DOCUMENT_CACHE_SIZE)
+
+_schema_versions = {}
+
+
+def schema_version(schema):
+    version = _schema_versions.get(id(schema))
+    if version is None:
+        version = _schema_versions[id(schema)] = hashlib.sha256(str(schema).encode()).hexdigest()[:16]
+    return version
+
+
+def document_key(context):
+    return (
+        schema_version(context.schema),
+        hashlib.sha256(context.query.encode()).hexdigest(),
+    )
+
+
+class DocumentCacheExtension(SchemaExtension):
+    """
+    Serves parse and validation from ``document_cache``. On a hit the
+    validation errors are restored too, which makes strawberry skip
+    validation. The extension instance is shared by every request, so it
+    keeps no per-request state of its own.
+    """
+
+    def on_parse(self):
+        context = self.execution_context
+        entry = document_cache.get(document_key(context))
+        if entry is not None:
+            context.graphql_document, errors = entry
+            # A fresh list: strawberry appends to it when processing errors
+            context.pre_execution_errors = list(errors)
+        yield
+
+    def on_validate(self):
+        context = self.execution_context
+        yield
+        key = document_key(context)
+        if key not in document_cache.entries:
+            document_cache.put(key, context.graphql_document, tuple(context.pre_execution_errors or ()))
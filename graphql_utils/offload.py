@@ -0,0 +1,122 @@
+"""
+Running synchronous resolvers off the event loop.
+
+Under ASGI the schema is executed asynchronously. The Django ORM cannot
+be used on the event loop, and our resolvers are synchronous. Every
+synchronous root field (queries and mutations) and every @strawberry.field
+resolver is therefore run in a bounded thread pool, querysets it returns
+included. Independent siblings, such as a dashboard's me, attendance and
+leave queries, then resolve concurrently. Model fields of
+strawberry_django types take care of themselves.
+
+Nested resolvers that only read what is already loaded are marked with
+@on_event_loop and skip the thread hop. Whether a resolver is offloaded is
+decided before it runs, never by retrying it: a retry would run a
+resolver's side effects twice.
+
+Pool threads go through close_old_connections() around every call, as a
+request would, so CONN_MAX_AGE and CONN_HEALTH_CHECKS govern how long they
+keep their connection and broken connections are replaced.
+"""
+
+import asyncio
+import contextvars
+import functools
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import QuerySet
+from django.db.models.manager import BaseManager
+from strawberry.extensions import SchemaExtension
+from strawberry_django.fields.field import StrawberryDjangoField
+
+_pool = None
+
+
+def get_orm_pool():
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(
+            max_workers=settings.GRAPHQL_ORM_THREADS,
+            thread_name_prefix="graphql-orm",
+        )
+    return _pool
+
+
+def on_event_loop(resolver):
+    """
+    Mark a nested resolver as free of database and other blocking calls,
+    e.g. one reading a prefetched relation, so it is not offloaded
+    """
+    resolver.on_event_loop = True
+    return resolver
+
+
+def _run(resolver, *args, **kwargs):
+    close_old_connections()
+    try:
+        result = resolver(*args, **kwargs)
+        if isinstance(result, BaseManager):
+            result = result.all()
+        if isinstance(result, QuerySet):
+            # Evaluate here: iterating it on the event loop would query
+            result._fetch_all()
+        return result
+    finally:
+        close_old_connections()
+
+
+async def run_in_orm_pool(resolver, *args, **kwargs):
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, _run, resolver, *args, **kwargs)
+    result = await asyncio.get_running_loop().run_in_executor(get_orm_pool(), call)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+# (type name, field name) -> whether its resolver runs in the pool
+_offloaded = {}
+
+
+def _needs_pool(info):
+    key = (info.parent_type.name, info.field_name)
+    if key not in _offloaded:
+        # Meta fields such as __typename are not among the type's fields
+        definition = info.parent_type.fields.get(info.field_name)
+        field = definition and definition.extensions.get("strawberry-definition")
+        if (
+            field is None
+            or isinstance(field, StrawberryDjangoField)
+            or field.base_resolver is None
+            or field.is_async
+        ):
+            _offloaded[key] = False
+        elif info.path.prev is None:
+            _offloaded[key] = True
+        else:
+            resolver = field.base_resolver.wrapped_func
+            _offloaded[key] = not getattr(resolver, "on_event_loop", False)
+    return _offloaded[key]
+
+
+def _in_event_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class ResolverOffloadExtension(SchemaExtension):
+    """
+    Moves synchronous resolvers to the ORM pool during async execution.
+    Sync execution (WSGI, tests) is left untouched.
+    """
+
+    def resolve(self, _next, root, info, *args, **kwargs):
+        if not _needs_pool(info) or not _in_event_loop():
+            return _next(root, info, *args, **kwargs)
+        return run_in_orm_pool(_next, root, info, *args, **kwargs)
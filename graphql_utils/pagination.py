@@ -0,0 +1,147 @@
+import base64
+import json
+from typing import Generic, List, Optional, TypeVar
+
+import strawberry
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from graphql import GraphQLError, get_named_type
+from graphql.execution.collect_fields import collect_sub_fields
+from strawberry_django.optimizer import optimizer
+
+T = TypeVar("T")
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+@strawberry.type
+class PageInfo:
+    has_next_page: bool
+    end_cursor: Optional[str] = None
+
+
+@strawberry.type
+class Edge(Generic[T]):
+    cursor: str
+    node: T
+
+
+@strawberry.type
+class Connection(Generic[T]):
+    edges: List[Edge[T]]
+    page_info: PageInfo
+    queryset: strawberry.Private[object] = None
+
+    @strawberry.field
+    def total_count(self) -> int:
+        """
+        Only counted when selected
+        """
+        return self.queryset.count()
+
+
+def paginate(queryset, info, keys, first=None, after=None):
+    """
+    Keyset (seek) pagination over ``keys``, e.g. ``("-attendance_date", "-id")``.
+    The last key must be unique. Each page is one indexed range scan no
+    matter how deep into the history the cursor points.
+    """
+    page_size = DEFAULT_PAGE_SIZE if first is None else first
+    if not 0 < page_size <= MAX_PAGE_SIZE:
+        raise GraphQLError(f"first must be between 1 and {MAX_PAGE_SIZE}")
+
+    page = queryset.order_by(*keys)
+    if after:
+        page = page.filter(_after(queryset.model, keys, _decode(after, len(keys))))
+
+    rows = list(_optimize(page, info)[: page_size + 1])
+    has_next_page = len(rows) > page_size
+    rows = rows[:page_size]
+
+    edges = [Edge(cursor=_encode(row, keys), node=row) for row in rows]
+    return Connection(
+        edges=edges,
+        page_info=PageInfo(
+            has_next_page=has_next_page,
+            end_cursor=edges[-1].cursor if edges else None,
+        ),
+        queryset=queryset,
+    )
+
+
+def _optimize(queryset, info):
+    """
+    Let DjangoOptimizerExtension plan the joins for the selected
+    ``edges { node }``. It only looks inside its own connection types, so
+    it is handed the node field as if it were being resolved.
+    """
+    extension = optimizer.get()
+    node_info = _field_info(info._raw_info, ("edges", "node"))
+    if extension is None or node_info is None:
+        return queryset
+    return extension.optimize(queryset, node_info)
+
+
+def _field_info(info, path):
+    """
+    ``info`` for the field at ``path`` below the current one, or None
+    when it is not selected
+    """
+    for name in path:
+        parent_type = get_named_type(info.return_type)
+        selected = collect_sub_fields(
+            info.schema, info.fragments, info.variable_values, parent_type, info.field_nodes
+        )
+        field_nodes = [node for nodes in selected.values() for node in nodes if node.name.value == name]
+        if not field_nodes:
+            return None
+        info = info._replace(
+            field_name=name,
+            field_nodes=field_nodes,
+            return_type=parent_type.fields[name].type,
+            parent_type=parent_type,
+            path=info.path.add_key(name, parent_type.name),
+        )
+    return info
+
+
+def _encode(row, keys):
+    values = [getattr(row, key.lstrip("-")) for key in keys]
+    payload = json.dumps([str(value) for value in values])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def _decode(cursor, length):
+    """
+    The ``length`` key values _encode wrote into ``cursor``
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise GraphQLError("Invalid cursor")
+    if (
+        not isinstance(values, list)
+        or len(values) != length
+        or not all(isinstance(value, str) for value in values)
+    ):
+        raise GraphQLError("Invalid cursor")
+    return values
+
+
+def _after(model, keys, values):
+    """
+    (k1 > v1) OR (k1 = v1 AND k2 > v2) OR ..., with < for descending keys
+    """
+    condition = Q()
+    equal = Q()
+    for key, raw in zip(keys, values):
+        name = key.lstrip("-")
+        try:
+            value = model._meta.get_field(name).to_python(raw)
+        except ValidationError:
+            raise GraphQLError("Invalid cursor")
+        lookup = "lt" if key.startswith("-") else "gt"
+        condition |= equal & Q(**{f"{name}__{lookup}": value})
+        equal &= Q(**{name: value})
+    return condition
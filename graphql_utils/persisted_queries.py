@@ -0,0 +1,141 @@
+"""
+Automatic persisted queries (the Apollo APQ protocol).
+
+Clients send ``extensions.persistedQuery.sha256Hash`` instead of the query
+text. An unknown hash is answered with PERSISTED_QUERY_NOT_FOUND, and the
+client retries once with both the text and the hash. The server then
+registers the document in the shared Django cache for every worker, for
+GRAPHQL_APQ_TTL seconds. Documents over GRAPHQL_APQ_MAX_BYTES are executed
+but not registered, so anonymous clients cannot fill the cache with them.
+
+Documents listed in GRAPHQL_PERSISTED_QUERIES_MANIFEST are known from
+startup. The manifest is generated with the client build, either in the
+Apollo persisted-query manifest format or as a plain {hash: query} object.
+With GRAPHQL_PERSISTED_QUERIES_ONLY set, only manifest documents are
+executed: ad-hoc query text and runtime registration are rejected.
+"""
+
+import hashlib
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from graphql import GraphQLError
+
+# Hot documents kept per worker in front of the shared cache
+LOCAL_SIZE = 1000
+
+_manifest = None
+# sha -> (query, expiry on the monotonic clock)
+_local = {}
+_lock = threading.Lock()
+
+
+class PersistedQueryError(Exception):
+    def __init__(self, message, code):
+        super().__init__(message)
+        self.code = code
+
+    def as_graphql_error(self):
+        return GraphQLError(str(self), extensions={"code": self.code})
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+def _load_manifest(path):
+    with open(path) as f:
+        data = json.load(f)
+    if "operations" in data:
+        # Apollo persisted-query manifest
+        return {operation["id"]: operation["body"] for operation in data["operations"]}
+    return data
+
+
+def get_manifest():
+    global _manifest
+    if _manifest is None:
+        path = settings.GRAPHQL_PERSISTED_QUERIES_MANIFEST
+        manifest = _load_manifest(path) if path else {}
+        for sha, query in manifest.items():
+            if query_hash(query) != sha:
+                raise ValueError(f"Persisted query manifest entry {sha} does not match its document")
+        _manifest = manifest
+    return _manifest
+
+
+def _cache_key(sha):
+    return f"graphql:apq:{sha}"
+
+
+def get_persisted_query(sha):
+    query = get_manifest().get(sha)
+    if query is not None or settings.GRAPHQL_PERSISTED_QUERIES_ONLY:
+        return query
+    query = _local_query(sha)
+    if query is None:
+        query = cache.get(_cache_key(sha))
+        if query is not None:
+            _remember(sha, query)
+    return query
+
+
+def register_persisted_query(sha, query):
+    """
+    Register ``query`` under ``sha`` for GRAPHQL_APQ_TTL seconds. Returns
+    False, registering nothing, when it is over GRAPHQL_APQ_MAX_BYTES.
+    """
+    if len(query.encode()) > settings.GRAPHQL_APQ_MAX_BYTES:
+        return False
+    cache.set(_cache_key(sha), query, timeout=settings.GRAPHQL_APQ_TTL)
+    _remember(sha, query)
+    return True
+
+
+def _local_query(sha):
+    entry = _local.get(sha)
+    if entry is None or entry[1] < time.monotonic():
+        return None
+    return entry[0]
+
+
+def _remember(sha, query):
+    with _lock:
+        if len(_local) >= LOCAL_SIZE:
+            _local.clear()
+        _local[sha] = (query, time.monotonic() + settings.GRAPHQL_APQ_TTL)
+
+
+def resolve_query(query, extensions):
+    """
+    The document to execute for a request's ``query`` and ``extensions``.
+    Raises PersistedQueryError when the request cannot be served.
+    """
+    persisted = (extensions or {}).get("persistedQuery")
+    if not persisted:
+        if settings.GRAPHQL_PERSISTED_QUERIES_ONLY:
+            raise PersistedQueryError("PersistedQueryNotSupported", "PERSISTED_QUERY_NOT_SUPPORTED")
+        return query
+
+    sha = persisted.get("sha256Hash") if isinstance(persisted, dict) else None
+    if not isinstance(sha, str) or persisted.get("version") != 1:
+        raise PersistedQueryError("Unsupported persisted query", "PERSISTED_QUERY_NOT_SUPPORTED")
+    sha = sha.lower()
+
+    if query is None:
+        query = get_persisted_query(sha)
+        if query is None:
+            raise PersistedQueryError("PersistedQueryNotFound", "PERSISTED_QUERY_NOT_FOUND")
+        return query
+
+    if query_hash(query) != sha:
+        raise PersistedQueryError("provided sha does not match query", "INVALID_PERSISTED_QUERY")
+    if sha not in get_manifest():
+        if settings.GRAPHQL_PERSISTED_QUERIES_ONLY:
+            raise PersistedQueryError("PersistedQueryNotSupported", "PERSISTED_QUERY_NOT_SUPPORTED")
+        if _local_query(sha) is None:
+            register_persisted_query(sha, query)
+    return query
@@ -0,0 +1,139 @@
+"""
+Publish/subscribe of JSON messages for GraphQL subscriptions.
+
+Subscribers are asyncio queues of the serving process. Publishers may be
+any thread: request handlers, the ORM pool, Celery tasks. With REDIS_URL
+set, messages go through Redis PUBLISH. Every process subscribes once per
+channel that has local subscribers and fans messages out to them itself.
+Without Redis, messages only reach subscribers of the publishing process
+(development, tests).
+
+A subscriber that falls behind by more than QUEUE_SIZE messages loses the
+oldest ones rather than holding memory for a dead connection.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+
+import redis
+import redis.asyncio
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 100
+
+
+def _offer(queue, message):
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(message)
+
+
+class MemoryBroker:
+    def __init__(self):
+        # channel -> {(event loop, queue)}
+        self.subscribers = defaultdict(set)
+        self.lock = threading.Lock()
+
+    def publish(self, channel, message):
+        # Subscribers get the same plain JSON values as through Redis
+        self.deliver(channel, json.loads(json.dumps(message, cls=DjangoJSONEncoder)))
+
+    def deliver(self, channel, message):
+        with self.lock:
+            subscribers = list(self.subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(_offer, queue, message)
+
+    async def subscribe(self, channel):
+        """
+        Messages published on ``channel`` from now on, until the consumer
+        stops iterating
+        """
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(QUEUE_SIZE))
+        with self.lock:
+            first = not self.subscribers[channel]
+            self.subscribers[channel].add(subscriber)
+        try:
+            if first:
+                await self.on_first_subscriber(channel)
+            while True:
+                yield await subscriber[1].get()
+        finally:
+            with self.lock:
+                self.subscribers[channel].discard(subscriber)
+                last = not self.subscribers[channel]
+                if last:
+                    del self.subscribers[channel]
+            if last:
+                await self.on_last_subscriber(channel)
+
+    async def on_first_subscriber(self, channel):
+        pass
+
+    async def on_last_subscriber(self, channel):
+        pass
+
+
+class RedisBroker(MemoryBroker):
+    def __init__(self, url):
+        super().__init__()
+        self.url = url
+        self.redis = redis.Redis.from_url(url)
+        self.pubsub = None
+        self.listener = None
+
+    def publish(self, channel, message):
+        try:
+            self.redis.publish(channel, json.dumps(message, cls=DjangoJSONEncoder))
+        except redis.RedisError:
+            # Live events are best effort; the change they report is committed
+            logger.exception("Could not publish to %s", channel)
+
+    async def on_first_subscriber(self, channel):
+        if self.pubsub is None:
+            self.pubsub = redis.asyncio.Redis.from_url(self.url).pubsub(ignore_subscribe_messages=True)
+        await self.pubsub.subscribe(channel)
+        if self.listener is None or self.listener.done():
+            self.listener = asyncio.create_task(self.listen())
+
+    async def on_last_subscriber(self, channel):
+        await self.pubsub.unsubscribe(channel)
+
+    async def listen(self):
+        while self.subscribers:
+            try:
+                message = await self.pubsub.get_message(timeout=1.0)
+            except redis.RedisError:
+                logger.exception("Lost the Redis subscription, retrying")
+                await asyncio.sleep(1)
+                continue
+            if message is not None:
+                self.deliver(message["channel"].decode(), json.loads(message["data"]))
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        redis_url = getattr(settings, "REDIS_URL", None)
+        _broker = RedisBroker(redis_url) if redis_url else MemoryBroker()
+    return _broker
+
+
+def publish(channel, message):
+    """
+    Send ``message`` (JSON-serializable) to the subscribers of ``channel``
+    """
+    get_broker().publish(channel, message)
+
+
+def subscribe(channel):
+    return get_broker().subscribe(channel)
@@ -0,0 +1,174 @@
+"""
+Static cost and depth analysis of GraphQL operations.
+
+Before execution, every selected field is priced: 0 for scalars, 1 for
+objects (usually a lazy load), or its GRAPHQL_FIELD_COSTS weight. The cost
+of its selection is then multiplied by the number of items it may return.
+That number is the field's ``first``/``limit`` argument when given, the
+page paginate() returns (DEFAULT_PAGE_SIZE) when such an argument is left
+unset, and GRAPHQL_DEFAULT_LIST_SIZE for other lists. Operations deeper
+than GRAPHQL_MAX_QUERY_DEPTH or costlier than GRAPHQL_MAX_QUERY_COST are
+rejected without running a resolver. Every response reports the computed
+cost under ``extensions.cost``.
+"""
+
+from contextvars import ContextVar
+
+from django.conf import settings
+from graphql import (
+    FieldNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    InlineFragmentNode,
+    get_named_type,
+    is_composite_type,
+    is_list_type,
+)
+from graphql.execution import ExecutionResult
+from graphql.execution.values import get_argument_values
+from graphql.type.definition import get_nullable_type
+from graphql.utilities import get_operation_ast
+from strawberry.extensions import SchemaExtension
+
+from graphql_utils.pagination import DEFAULT_PAGE_SIZE
+
+# Arguments that bound how many items a field returns
+SIZE_ARGUMENTS = ("first", "limit")
+
+# The current operation's cost report. Not kept on the extension, which
+# strawberry shares between the requests of every thread.
+_query_cost = ContextVar("query_cost", default=None)
+
+
+class QueryCostAnalysis:
+    def __init__(self, schema, document, variables):
+        self.schema = schema
+        self.variables = variables or {}
+        self.fragments = {
+            definition.name.value: definition
+            for definition in document.definitions
+            if definition.kind == "fragment_definition"
+        }
+
+    def selection_cost(self, selection_set, parent_type, sized=False):
+        """
+        (cost, depth) of ``selection_set`` on ``parent_type``. ``sized``
+        means the parent field's size argument already counts the items
+        of lists directly below it (connection edges).
+        """
+        cost = depth = 0
+        for node, node_parent_type in self._fields(selection_set, parent_type):
+            field_cost, field_depth = self.field_cost(node, node_parent_type, sized)
+            cost += field_cost
+            depth = max(depth, field_depth)
+        return cost, depth
+
+    def field_cost(self, node, parent_type, sized):
+        name = node.name.value
+        if name.startswith("__"):
+            # Introspection is schema metadata, served without resolvers
+            return 0, 0
+        field = parent_type.fields[name]
+        field_type = get_named_type(field.type)
+        weight = settings.GRAPHQL_FIELD_COSTS.get(
+            f"{parent_type.name}.{name}", 1 if is_composite_type(field_type) else 0
+        )
+        if node.selection_set is None:
+            return weight, 1
+
+        size = bound = self._size(field, node)
+        if size is None:
+            listed = is_list_type(get_nullable_type(field.type))
+            size = settings.GRAPHQL_DEFAULT_LIST_SIZE if listed and not sized else 1
+        child_cost, child_depth = self.selection_cost(node.selection_set, field_type, bound is not None)
+        return weight + size * child_cost, child_depth + 1
+
+    def _size(self, field, node):
+        if not any(name in field.args for name in SIZE_ARGUMENTS):
+            return None
+        try:
+            values = get_argument_values(field, node, self.variables)
+        except GraphQLError:
+            return None
+        for name in SIZE_ARGUMENTS:
+            if isinstance(values.get(name), int):
+                return max(values[name], 1)
+        # Left unset (None by default): paginate() returns a default page
+        return DEFAULT_PAGE_SIZE
+
+    def _fields(self, selection_set, parent_type):
+        """
+        (field node, parent type) of every field in ``selection_set``, with
+        fragments expanded
+        """
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                yield selection, parent_type
+                continue
+            if isinstance(selection, FragmentSpreadNode):
+                fragment = self.fragments[selection.name.value]
+            elif isinstance(selection, InlineFragmentNode):
+                fragment = selection
+            else:
+                continue
+            fragment_type = parent_type
+            if fragment.type_condition is not None:
+                fragment_type = self.schema.get_type(fragment.type_condition.name.value)
+            if hasattr(fragment_type, "fields"):
+                yield from self._fields(fragment.selection_set, fragment_type)
+
+
+def operation_cost(schema, document, operation_name=None, variables=None):
+    """
+    (cost, depth) of the operation of ``document`` that would be executed
+    """
+    operation = get_operation_ast(document, operation_name)
+    if operation is None:
+        return 0, 0
+    root_type = schema.get_root_type(operation.operation)
+    return QueryCostAnalysis(schema, document, variables).selection_cost(
+        operation.selection_set, root_type
+    )
+
+
+class QueryCostExtension(SchemaExtension):
+    """
+    Runs after validation, so the document is known to be well formed
+    """
+
+    def on_operation(self):
+        # Nothing left over from the thread's previous operation
+        _query_cost.set(None)
+        yield
+
+    def on_execute(self):
+        context = self.execution_context
+        cost, depth = operation_cost(
+            context.schema._schema,
+            context.graphql_document,
+            context.operation_name,
+            context.variables,
+        )
+        _query_cost.set({
+            "requested": cost,
+            "maximum": settings.GRAPHQL_MAX_QUERY_COST,
+            "depth": depth,
+            "maxDepth": settings.GRAPHQL_MAX_QUERY_DEPTH,
+        })
+
+        error = None
+        if depth > settings.GRAPHQL_MAX_QUERY_DEPTH:
+            error = f"Query depth {depth} exceeds the maximum of {settings.GRAPHQL_MAX_QUERY_DEPTH}"
+        elif cost > settings.GRAPHQL_MAX_QUERY_COST:
+            error = f"Query cost {cost} exceeds the maximum of {settings.GRAPHQL_MAX_QUERY_COST}"
+        if error:
+            # A result set here stops strawberry from executing the operation
+            context.result = ExecutionResult(
+                data=None,
+                errors=[GraphQLError(error, extensions={"code": "QUERY_TOO_COMPLEX"})],
+            )
+        yield
+
+    def get_results(self):
+        cost = _query_cost.get()
+        return {"cost": cost} if cost else {}
@@ -0,0 +1,168 @@
+"""
+GraphQL subscriptions over websockets (the graphql-transport-ws protocol).
+
+config.asgi sends websocket connections here and everything else to Django.
+The protocol itself is strawberry's handler. This module adapts raw ASGI
+websocket events to it and authenticates the connection once, when it is
+initialised. The access token comes from the connection_init payload
+(``{"Authorization": "Bearer <token>"}``) or from the access_token cookie.
+Browsers send cookies with websocket handshakes from any site, so the
+Origin header is checked against CORS_ALLOWED_ORIGINS first.
+"""
+
+import json
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import close_old_connections
+from django.http import parse_cookie
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from strawberry.exceptions import ConnectionRejectionError
+from strawberry.http.async_base_view import AsyncWebSocketAdapter
+from strawberry.http.exceptions import (
+    NonJsonMessageReceived,
+    NonTextMessageReceived,
+    WebSocketDisconnected,
+)
+from strawberry.subscriptions.protocols.graphql_transport_ws.handlers import (
+    BaseGraphQLTransportWSHandler,
+)
+from strawberry.types.unset import UNSET
+
+from users.authentication import CookieJWTAuthentication
+from users.revocation import is_token_revoked
+
+PROTOCOL = "graphql-transport-ws"
+CONNECTION_INIT_TIMEOUT = timedelta(seconds=30)
+
+_authentication = CookieJWTAuthentication()
+
+
+def _authenticate(raw_token):
+    try:
+        token = _authentication.get_validated_token(raw_token)
+        if is_token_revoked(token):
+            return None
+        return _authentication.get_user(token)
+    except (InvalidToken, AuthenticationFailed, TokenError):
+        return None
+    finally:
+        # No request_finished here to release the connection
+        close_old_connections()
+
+
+class WebSocketRequest:
+    """
+    The parts of a Django request that resolvers use
+    """
+
+    def __init__(self, scope):
+        self.headers = {
+            name.decode("latin-1").lower(): value.decode("latin-1")
+            for name, value in scope.get("headers", [])
+        }
+        self.COOKIES = parse_cookie(self.headers.get("cookie", ""))
+        self.user = AnonymousUser()
+
+
+class WebSocketContext:
+    def __init__(self, scope):
+        self.request = WebSocketRequest(scope)
+        self.response = None
+        self.connection_params = {}
+
+
+class ASGIWebSocket(AsyncWebSocketAdapter):
+    def __init__(self, view, receive, send):
+        super().__init__(view)
+        self.receive = receive
+        self.send = send
+
+    async def iter_json(self, *, ignore_parsing_errors=False):
+        while True:
+            event = await self.receive()
+            if event["type"] == "websocket.disconnect":
+                return
+            text = event.get("text")
+            if text is None:
+                raise NonTextMessageReceived
+            try:
+                yield json.loads(text)
+            except json.JSONDecodeError as e:
+                if not ignore_parsing_errors:
+                    raise NonJsonMessageReceived from e
+
+    async def send_json(self, message):
+        try:
+            await self.send({"type": "websocket.send", "text": json.dumps(message)})
+        except OSError as e:
+            # uvicorn raises ClientDisconnected (an OSError) once the peer left
+            raise WebSocketDisconnected from e
+
+    async def close(self, code, reason):
+        try:
+            await self.send({"type": "websocket.close", "code": code, "reason": reason})
+        except OSError:
+            pass
+
+
+class GraphQLWebSocketApp:
+    """
+    ASGI application serving ``schema``'s subscriptions on ``path``
+    """
+
+    def __init__(self, schema, path="/graphql/"):
+        self.schema = schema
+        self.path = path
+
+    async def __call__(self, scope, receive, send):
+        event = await receive()
+        if event["type"] != "websocket.connect":
+            return
+        # Closing before accepting answers the handshake with 403
+        if scope["path"] != self.path or not self.origin_allowed(scope):
+            await send({"type": "websocket.close", "code": 4403})
+            return
+        if PROTOCOL not in scope.get("subprotocols", []):
+            await send({"type": "websocket.close", "code": 4406})
+            return
+
+        await send({"type": "websocket.accept", "subprotocol": PROTOCOL})
+        handler = BaseGraphQLTransportWSHandler(
+            view=self,
+            websocket=ASGIWebSocket(self, receive, send),
+            context=WebSocketContext(scope),
+            root_value=None,
+            schema=self.schema,
+            connection_init_wait_timeout=CONNECTION_INIT_TIMEOUT,
+        )
+        await handler.handle()
+
+    def origin_allowed(self, scope):
+        headers = dict(scope.get("headers", []))
+        origin = headers.get(b"origin")
+        if origin is None:
+            # Not a browser
+            return True
+        origin = origin.decode("latin-1")
+        host = headers.get(b"host", b"").decode("latin-1")
+        return origin in settings.CORS_ALLOWED_ORIGINS or urlsplit(origin).netloc == host
+
+    async def on_ws_connect(self, context):
+        """
+        Called by the protocol handler with the connection_init payload
+        """
+        authorization = context.connection_params.get("Authorization")
+        if isinstance(authorization, str) and authorization.startswith("Bearer "):
+            raw_token = authorization.split(" ", 1)[1]
+        else:
+            raw_token = context.request.COOKIES.get("access_token")
+
+        user = await sync_to_async(_authenticate)(raw_token) if raw_token else None
+        if user is None:
+            raise ConnectionRejectionError()
+        context.request.user = user
+        return UNSET
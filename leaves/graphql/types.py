@@ -2,6 +2,7 @@ from typing import Optional
 import strawberry
 import strawberry.django
 from strawberry import auto
+from graphql_utils.offload import on_event_loop
 from users.graphql.types import UserType
 from organizations.graphql.types import OrganizationType
 from leaves.models import LeaveType, LeaveBalance, LeaveRequest, CompanyHoliday
@@ -45,6 +46,7 @@ class LeaveBalanceType:
     locked_at: auto
     last_updated: auto
     @strawberry.field
+    @on_event_loop
     def available_balance(self) -> float:
         return float(self.get_available_balance())
 
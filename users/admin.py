@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import CustomUser
+from .models import CustomUser, UserHierarchy
 
 @admin.register(CustomUser)
 class CustomUserAdmin(admin.ModelAdmin):
@@ -10,3 +10,10 @@ class CustomUserAdmin(admin.ModelAdmin):
     list_filter = ('role', 'is_active', 'department')
     search_fields = ('email', 'first_name', 'last_name')
     ordering = ('-created_at',)
+
+
+@admin.register(UserHierarchy)
+class UserHierarchyAdmin(admin.ModelAdmin):
+    list_display = ('ancestor', 'descendant', 'depth')
+    list_filter = ('depth',)
+    raw_id_fields = ('ancestor', 'descendant')
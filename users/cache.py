@@ -0,0 +1,136 @@
+"""
+Two-tier cache of authenticated users.
+
+Users are stored pickled, in a small per-worker LRU in front of the shared
+Django cache (Redis in production), under a per-user version stamp. Saving
+a user (profile edits, password changes, deactivation) bumps the stamp
+once the transaction commits, so every worker drops its copy on the next
+request; CustomUser's queryset does the same for update() and
+bulk_update(), which send no signal. Worker copies are also dropped after
+USER_CACHE_LOCAL_MAX_AGE seconds whatever the stamp says.
+Authentication of a cached user costs one cache read and no database query.
+
+The `me` snapshots (REST payload and GraphQL user with its relations) are
+cached the same way, under an ETag built from the stamps of everything
+they show.
+"""
+
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from config.cache_versions import bump_versions, get_version, get_versions
+from users.models import CustomUser
+
+# user id -> (version, loaded at on the monotonic clock, pickled user),
+# least recently used first
+_local = OrderedDict()
+_lock = threading.Lock()
+
+
+def user_version_key(user_id):
+    return f"users:user:{user_id}"
+
+
+def invalidate_cached_users(user_ids):
+    """
+    Drop the users from every worker's cache once the current transaction
+    commits, with one cache call
+    """
+    keys = [user_version_key(user_id) for user_id in user_ids]
+    if keys:
+        transaction.on_commit(lambda: bump_versions(keys))
+
+
+def get_cached_user(user_id):
+    """
+    The user with ``user_id`` as a fresh instance, or None if there is no
+    such user
+    """
+    user_id = int(user_id)
+    version = get_version(user_version_key(user_id))
+
+    with _lock:
+        cached = _local.get(user_id)
+        if (
+            cached is not None
+            and cached[0] == version
+            and time.monotonic() - cached[1] < settings.USER_CACHE_LOCAL_MAX_AGE
+        ):
+            _local.move_to_end(user_id)
+            return pickle.loads(cached[2])
+
+    shared_key = f"{user_version_key(user_id)}:{version}"
+    data = cache.get(shared_key)
+    if data is None:
+        user = CustomUser.objects.filter(pk=user_id).first()
+        if user is None:
+            return None
+        data = pickle.dumps(user)
+        cache.set(shared_key, data, timeout=settings.USER_CACHE_TIMEOUT)
+
+    with _lock:
+        _local[user_id] = (version, time.monotonic(), data)
+        _local.move_to_end(user_id)
+        while len(_local) > settings.USER_CACHE_SIZE:
+            _local.popitem(last=False)
+    return pickle.loads(data)
+
+
+# Bump when the shape of the `me` payloads changes
+ME_SNAPSHOT_SCHEMA = 1
+ME_RELATIONS = ("organization", "department", "designation", "office_location", "manager")
+
+
+def organization_version_key(organization_id):
+    return f"organizations:organization:{organization_id}"
+
+
+def me_etag(user):
+    """
+    ETag of the user's `me` snapshot. It moves when the user, their manager,
+    or their organization's departments, designations and offices change.
+    """
+    keys = [user_version_key(user.pk)]
+    if user.manager_id:
+        keys.append(user_version_key(user.manager_id))
+    if user.organization_id:
+        keys.append(organization_version_key(user.organization_id))
+    versions = get_versions(keys)
+    stamp = ":".join(str(versions[key]) for key in keys)
+    digest = hashlib.sha1(f"{ME_SNAPSHOT_SCHEMA}:{user.pk}:{stamp}".encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def _me_user(user_id):
+    return CustomUser.objects.select_related(*ME_RELATIONS).get(pk=user_id)
+
+
+def get_me_user(user, etag=None):
+    """
+    The user with every ME_RELATIONS object loaded, from the snapshot cache
+    """
+    key = f"users:me-user:{user.pk}:{etag or me_etag(user)}"
+    data = cache.get(key)
+    if data is None:
+        data = pickle.dumps(_me_user(user.pk))
+        cache.set(key, data, timeout=settings.USER_CACHE_TIMEOUT)
+    return pickle.loads(data)
+
+
+def get_me_payload(user, serialize, etag=None):
+    """
+    ``serialize(user)`` of the snapshot user, cached for the snapshot version
+    """
+    key = f"users:me-payload:{user.pk}:{etag or me_etag(user)}"
+    payload = cache.get(key)
+    if payload is None:
+        payload = serialize(get_me_user(user, etag))
+        cache.set(key, payload, timeout=settings.USER_CACHE_TIMEOUT)
+    return payload
@@ -1,6 +1,10 @@
+from typing import List
+
 import strawberry
 from strawberry.types import Info
-from .types import UserType
+from users.cache import get_me_user
+from users.search import search_employees
+from .types import EmployeeSearchHit, UserType
 
 @strawberry.type
 class UserQuery:
@@ -9,4 +13,23 @@ class UserQuery:
         user = info.context.request.user
         if not user.is_authenticated:
             return None
-        return user
+        # Relations come preloaded from the snapshot cache
+        return get_me_user(user)
+
+    @strawberry.field
+    def search_employees(self, info: Info, query: str, limit: int = 10) -> List[EmployeeSearchHit]:
+        """
+        Prefix autocomplete over name, email and employee id within the
+        caller's organization
+        """
+        user = info.context.request.user
+        if not user.is_authenticated:
+            raise Exception("Not authenticated")
+        if user.organization_id is None:
+            return []
+
+        return [
+            EmployeeSearchHit(**row)
+            for row in search_employees(user.organization_id, query, limit)
+        ]
+
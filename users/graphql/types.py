@@ -1,11 +1,25 @@
-from typing import Optional
+from typing import List, Optional
 import strawberry
+from graphql import GraphQLError
 from strawberry import auto
 import strawberry.django
+from graphql_utils.offload import on_event_loop
 from users.models import CustomUser
 from organizations.models import Department, Designation, OfficeLocation
 from organizations.graphql.types import OfficeLocationType, OrganizationType
 
+# Deepest level of the hierarchy fields below a single query may ask for
+MAX_HIERARCHY_DEPTH = 10
+
+
+def _hierarchy_depth(depth):
+    if depth is None:
+        return MAX_HIERARCHY_DEPTH
+    if not 1 <= depth <= MAX_HIERARCHY_DEPTH:
+        raise GraphQLError(f"depth must be between 1 and {MAX_HIERARCHY_DEPTH}")
+    return depth
+
+
 @strawberry.django.type(Department)
 class DepartmentType:
     id: strawberry.ID
@@ -52,8 +66,70 @@ class UserType:
     created_at: auto
     updated_at: auto
 
+    profile_picture_status: auto
+
     @strawberry.field
+    @on_event_loop
     def profile_picture_url(self) -> str | None:
         if self.profile_picture:
             return self.profile_picture.url
         return None
+
+    @strawberry.field
+    @on_event_loop
+    def profile_picture_medium_url(self) -> str | None:
+        """
+        256px WebP thumbnail
+        """
+        if self.profile_picture_medium:
+            return self.profile_picture_medium.url
+        return None
+
+    @strawberry.field
+    @on_event_loop
+    def profile_picture_small_url(self) -> str | None:
+        """
+        64px WebP thumbnail, meant for lists and directories
+        """
+        if self.profile_picture_small:
+            return self.profile_picture_small.url
+        return None
+
+    @strawberry.field
+    def reports(self, depth: int = 1) -> List['UserType']:
+        """
+        Direct and indirect reports down to ``depth`` levels, nearest first
+        """
+        return self.get_descendants(max_depth=_hierarchy_depth(depth)).order_by(
+            'ancestor_links__depth', 'first_name', 'last_name'
+        )
+
+    @strawberry.field
+    def management_chain(self, depth: Optional[int] = None) -> List['UserType']:
+        """
+        Managers above this user, nearest first
+        """
+        return self.get_ancestors(max_depth=_hierarchy_depth(depth))
+
+
+@strawberry.type
+class EmployeeSearchHit:
+    """
+    Lightweight search result, served from the in-memory search index
+    """
+    id: strawberry.ID
+    first_name: str
+    last_name: str
+    email: str
+    employee_id: str | None
+    profile_picture_small: strawberry.Private[str | None] = None
+
+    @strawberry.field
+    @on_event_loop
+    def profile_picture_small_url(self) -> str | None:
+        if self.profile_picture_small:
+            return CustomUser._meta.get_field('profile_picture_small').storage.url(
+                self.profile_picture_small
+            )
+        return None
+
@@ -0,0 +1,156 @@
+"""
+Maintenance of the UserHierarchy closure table.
+
+Moving a user under a new manager moves their whole subtree: links from
+the old management chain to the subtree are deleted and the new chain is
+cross-joined with the subtree in a single INSERT ... SELECT.
+"""
+
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+
+from users.models import CustomUser, UserHierarchy
+
+
+MANAGER_CYCLE_ERROR = "A user cannot report to themselves or to someone in their own reporting line"
+
+
+def closes_cycle(user_id, manager_id):
+    """
+    Whether reporting to ``manager_id`` would close a cycle in the hierarchy
+    """
+    if manager_id is None or user_id is None:
+        return False
+    return manager_id == user_id or UserHierarchy.objects.filter(
+        ancestor_id=user_id, descendant_id=manager_id
+    ).exists()
+
+
+def check_manager(user_id, manager_id):
+    """
+    Refuse a manager that would close a cycle in the hierarchy. Serializers
+    and CustomUser.clean() validate this up front; here it only guards the
+    closure table.
+    """
+    if closes_cycle(user_id, manager_id):
+        raise ValidationError({"manager": MANAGER_CYCLE_ERROR})
+
+
+def add_user(user):
+    """
+    Links of a newly created user: self at depth 0 plus the manager's chain
+    """
+    with transaction.atomic():
+        UserHierarchy.objects.bulk_create(
+            [UserHierarchy(ancestor_id=user.pk, descendant_id=user.pk, depth=0)],
+            ignore_conflicts=True,
+        )
+        if user.manager_id:
+            _link_subtree(user.pk, user.manager_id)
+
+
+def move_subtree(user_id, manager_id):
+    """
+    Re-hang ``user_id`` and everyone below them under ``manager_id``
+    (None detaches the subtree)
+    """
+    check_manager(user_id, manager_id)
+    with transaction.atomic():
+        # Users created in bulk may have no links yet
+        UserHierarchy.objects.bulk_create(
+            [UserHierarchy(ancestor_id=user_id, descendant_id=user_id, depth=0)],
+            ignore_conflicts=True,
+        )
+        subtree = UserHierarchy.objects.filter(ancestor_id=user_id).values("descendant_id")
+        UserHierarchy.objects.filter(
+            descendant_id__in=subtree
+        ).exclude(
+            ancestor_id__in=subtree
+        ).delete()
+        if manager_id:
+            _link_subtree(user_id, manager_id)
+
+
+def link_new_users(user_ids, parents, batch_size=5000):
+    """
+    Links of users created in bulk. ``parents`` maps some of them to their
+    manager, who is either one of them or an existing user; it must be
+    free of cycles.
+    """
+    new = set(user_ids)
+    chains = defaultdict(list)
+    existing_managers = {manager for manager in parents.values() if manager not in new}
+    for ancestor_id, descendant_id, depth in UserHierarchy.objects.filter(
+        descendant_id__in=existing_managers
+    ).values_list("ancestor_id", "descendant_id", "depth"):
+        chains[descendant_id].append((ancestor_id, depth))
+
+    rows = []
+    for user_id in user_ids:
+        current, depth = user_id, 0
+        while current is not None:
+            rows.append(UserHierarchy(ancestor_id=current, descendant_id=user_id, depth=depth))
+            manager = parents.get(current)
+            if manager is not None and manager not in new:
+                rows.extend(
+                    UserHierarchy(ancestor_id=ancestor_id, descendant_id=user_id, depth=depth + 1 + up)
+                    for ancestor_id, up in chains[manager]
+                )
+                break
+            current, depth = manager, depth + 1
+    UserHierarchy.objects.bulk_create(rows, batch_size=batch_size, ignore_conflicts=True)
+
+
+def _link_subtree(user_id, manager_id):
+    table = UserHierarchy._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table} (ancestor_id, descendant_id, depth)
+            SELECT up.ancestor_id, down.descendant_id, up.depth + down.depth + 1
+            FROM {table} AS up, {table} AS down
+            WHERE up.descendant_id = %s AND down.ancestor_id = %s
+            """,
+            [manager_id, user_id],
+        )
+
+
+def closure_rows(parents):
+    """
+    (ancestor, descendant, depth) for every user of ``parents``, a
+    {user_id: manager_id} dict. A cycle left by bulk updates is cut where
+    it closes.
+    """
+    for user_id in parents:
+        seen = set()
+        current, depth = user_id, 0
+        while current is not None and current not in seen:
+            seen.add(current)
+            yield current, user_id, depth
+            current, depth = parents.get(current), depth + 1
+
+
+def rebuild_hierarchy(batch_size=5000):
+    """
+    Recompute the whole table from CustomUser.manager
+    """
+    parents = dict(CustomUser.objects.values_list("id", "manager_id"))
+    written = 0
+    with transaction.atomic():
+        UserHierarchy.objects.all().delete()
+        batch = []
+        for ancestor_id, descendant_id, depth in closure_rows(parents):
+            batch.append(UserHierarchy(
+                ancestor_id=ancestor_id,
+                descendant_id=descendant_id,
+                depth=depth,
+            ))
+            if len(batch) >= batch_size:
+                UserHierarchy.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        UserHierarchy.objects.bulk_create(batch)
+        written += len(batch)
+    return written
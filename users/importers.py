@@ -0,0 +1,401 @@
+"""
+Streaming CSV import of employees.
+
+Rows are read lazily and handled in chunks: each chunk is validated against
+dictionaries of departments, designations and offices built once up front,
+and against the users already holding its emails, usernames and employee
+ids (one query per chunk). Its initial passwords are hashed in a thread
+pool (PBKDF2 releases the GIL) and it is written with one bulk_create.
+Managers are matched by employee_id once every chunk is in, so a manager
+may appear anywhere in the file. Invalid rows are skipped and reported as
+errors; the rest are imported in one transaction, with a warning when
+their manager could not be set.
+
+The HR API stages uploads and imports them in the users.tasks.import_employees
+Celery task; its report is kept in the cache under the job id.
+
+Columns: email, username, first_name, last_name, employee_id, organization,
+department, designation, manager_employee_id, office, role,
+employment_type, date_of_joining (YYYY-MM-DD), phone_number, password.
+Only email is required; rows without a password get an unusable one.
+"""
+
+import csv
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from organizations.models import Department, Designation, OfficeLocation, Organization
+from config.cache_versions import bump_version
+from users.hierarchy import link_new_users
+from users.models import CustomUser
+from users.search import employee_search_version_key
+
+IMPORT_CHUNK_SIZE = 1000
+
+ROLES = {value for value, _ in CustomUser.ROLE_CHOICES}
+EMPLOYMENT_TYPES = {value for value, _ in CustomUser.EMPLOYMENT_TYPES}
+
+
+def _names(model, organization):
+    objects = model.objects.all()
+    if organization is not None:
+        objects = objects.filter(organization=organization)
+    return {
+        (organization_id, name.strip().lower()): pk
+        for pk, organization_id, name in objects.values_list("id", "organization_id", "name")
+    }
+
+
+class EmployeeImporter:
+    def __init__(self, organization=None, chunk_size=IMPORT_CHUNK_SIZE, workers=None, dry_run=False):
+        """
+        ``organization`` pins every row to one tenant (the HR API); without
+        it the organization column is looked up by name.
+        """
+        self.organization = organization
+        self.chunk_size = chunk_size
+        self.workers = workers or os.cpu_count()
+        self.dry_run = dry_run
+
+        organizations = Organization.objects.all()
+        if organization is not None:
+            organizations = organizations.filter(pk=organization.pk)
+        self.organizations = {
+            name.strip().lower(): pk for pk, name in organizations.values_list("id", "name")
+        }
+        self.departments = _names(Department, organization)
+        self.designations = _names(Designation, organization)
+        self.offices = _names(OfficeLocation, organization)
+
+        # Unique values claimed by rows of this file
+        self.emails = set()
+        self.usernames = set()
+        # employee_id -> (organization_id, user id or None while pending)
+        self.employee_ids = {}
+
+        self.errors = []
+        # Imported rows whose manager could not be set
+        self.warnings = []
+        self.created = 0
+        self.new_user_ids = []
+        self.organization_ids = set()
+        # new user id -> manager employee_id
+        self.pending_managers = {}
+
+    def run(self, rows):
+        """
+        Import ``rows`` (an iterable of dicts, e.g. a csv.DictReader) and
+        return the report. Nothing is written when the import fails.
+        """
+        if self.dry_run:
+            self._import_chunks(rows, None)
+            return self.report()
+
+        try:
+            with transaction.atomic(), ThreadPoolExecutor(self.workers) as pool:
+                self._import_chunks(rows, pool)
+                self._assign_managers()
+                # bulk_create skips the signals that keep search indexes fresh
+                organization_ids = set(self.organization_ids)
+                transaction.on_commit(lambda: [
+                    bump_version(employee_search_version_key(organization_id))
+                    for organization_id in organization_ids
+                ])
+        except IntegrityError:
+            # A user created meanwhile took one of the file's unique values
+            self.created = 0
+            self.warnings = []
+            self.errors.append({"row": None, "errors": {"non_field_errors": [
+                "Another change conflicted with this import; nothing was imported. Try again."
+            ]}})
+        return self.report()
+
+    def _import_chunks(self, rows, pool):
+        chunk = []
+        for number, row in enumerate(rows, start=2):  # line 1 is the header
+            chunk.append((number, row))
+            if len(chunk) >= self.chunk_size:
+                self._import_chunk(chunk, pool)
+                chunk = []
+        if chunk:
+            self._import_chunk(chunk, pool)
+
+    def report(self):
+        return {
+            "created": self.created,
+            "failed": len(self.errors),
+            "dry_run": self.dry_run,
+            "errors": self.errors,
+            "warnings": self.warnings,
+        }
+
+    def _import_chunk(self, chunk, pool):
+        chunk = [
+            (number, {key.strip().lower(): (value or "").strip() for key, value in row.items() if key})
+            for number, row in chunk
+        ]
+        taken = self._taken([row for _, row in chunk])
+        users = []
+        passwords = []
+        managers = []
+        for number, row in chunk:
+            try:
+                user, password, manager_employee_id = self._build(row, taken)
+            except ValidationError as e:
+                self.errors.append({"row": number, "errors": e.message_dict})
+                continue
+            users.append(user)
+            passwords.append(password)
+            managers.append(manager_employee_id)
+
+        if self.dry_run:
+            self.created += len(users)
+            return
+
+        # Only real passwords are worth shipping to the pool
+        to_hash = [i for i, password in enumerate(passwords) if password]
+        hashed = pool.map(make_password, [passwords[i] for i in to_hash], chunksize=32)
+        for i, password in zip(to_hash, hashed):
+            users[i].password = password
+        for user, password in zip(users, passwords):
+            if not password:
+                user.set_unusable_password()
+
+        CustomUser.objects.bulk_create(users)
+        self.created += len(users)
+        self.new_user_ids.extend(user.pk for user in users)
+        self.organization_ids.update(user.organization_id for user in users)
+        for user, manager_employee_id in zip(users, managers):
+            if user.employee_id:
+                self.employee_ids[user.employee_id] = (user.organization_id, user.pk)
+            if manager_employee_id:
+                self.pending_managers[user.pk] = manager_employee_id
+
+    def _taken(self, rows):
+        """
+        (emails, usernames, employee ids) of existing users that ``rows``
+        would clash with
+        """
+        emails = {row.get("email", "").lower() for row in rows} - {""}
+        usernames = {row.get("username") or row.get("email", "").lower() for row in rows} - {""}
+        employee_ids = {row.get("employee_id") for row in rows} - {"", None}
+        existing = CustomUser.objects.annotate(email_lower=Lower("email")).filter(
+            Q(email_lower__in=emails) | Q(username__in=usernames) | Q(employee_id__in=employee_ids)
+        ).values_list("email_lower", "username", "employee_id")
+        taken = (set(), set(), set())
+        for values in existing:
+            for found, value in zip(taken, values):
+                found.add(value)
+        return taken
+
+    def _build(self, row, taken):
+        taken_emails, taken_usernames, taken_employee_ids = taken
+        errors = {}
+
+        email = row.get("email", "").lower()
+        try:
+            validate_email(email)
+        except ValidationError:
+            errors["email"] = ["Enter a valid email address."]
+        if email in self.emails or email in taken_emails:
+            errors["email"] = ["A user with this email already exists."]
+
+        username = row.get("username") or email
+        if username in self.usernames or username in taken_usernames:
+            errors["username"] = ["A user with this username already exists."]
+
+        employee_id = row.get("employee_id") or None
+        if employee_id and (employee_id in self.employee_ids or employee_id in taken_employee_ids):
+            errors["employee_id"] = ["A user with this employee_id already exists."]
+
+        organization_id = self._organization(row, errors)
+        department_id = self._lookup(self.departments, organization_id, row, "department", errors)
+        designation_id = self._lookup(self.designations, organization_id, row, "designation", errors)
+        office_id = self._lookup(self.offices, organization_id, row, "office", errors)
+
+        role = row.get("role") or "employee"
+        if role not in ROLES:
+            errors["role"] = [f"Must be one of {', '.join(sorted(ROLES))}."]
+        employment_type = row.get("employment_type") or "full_time"
+        if employment_type not in EMPLOYMENT_TYPES:
+            errors["employment_type"] = [f"Must be one of {', '.join(sorted(EMPLOYMENT_TYPES))}."]
+
+        date_of_joining = date.today()
+        if row.get("date_of_joining"):
+            try:
+                date_of_joining = date.fromisoformat(row["date_of_joining"])
+            except ValueError:
+                errors["date_of_joining"] = ["Use the YYYY-MM-DD format."]
+
+        if errors:
+            raise ValidationError(errors)
+
+        # Claim the unique values so later rows of the file clash with them
+        self.emails.add(email)
+        self.usernames.add(username)
+        if employee_id:
+            self.employee_ids[employee_id] = (organization_id, None)
+
+        user = CustomUser(
+            email=email,
+            username=username,
+            first_name=row.get("first_name", ""),
+            last_name=row.get("last_name", ""),
+            employee_id=employee_id,
+            organization_id=organization_id,
+            department_id=department_id,
+            designation_id=designation_id,
+            office_location_id=office_id,
+            role=role,
+            employment_type=employment_type,
+            date_of_joining=date_of_joining,
+            phone_number=row.get("phone_number") or None,
+        )
+        return user, row.get("password") or None, row.get("manager_employee_id") or None
+
+    def _organization(self, row, errors):
+        name = row.get("organization", "").lower()
+        if self.organization is not None:
+            if name and name != self.organization.name.strip().lower():
+                errors["organization"] = ["Rows can only be imported into your own organization."]
+            return self.organization.pk
+        if not name:
+            errors["organization"] = ["This field is required."]
+            return None
+        if name not in self.organizations:
+            errors["organization"] = [f"Unknown organization '{row['organization']}'."]
+            return None
+        return self.organizations[name]
+
+    def _lookup(self, names, organization_id, row, field, errors):
+        name = row.get(field, "")
+        if not name or organization_id is None:
+            return None
+        pk = names.get((organization_id, name.lower()))
+        if pk is None:
+            errors[field] = [f"Unknown {field} '{name}'."]
+        return pk
+
+    def _assign_managers(self):
+        """
+        Resolve manager_employee_id once every row is in, then link the new
+        users into the hierarchy closure table
+        """
+        ids = list(self.pending_managers)
+        users = CustomUser.objects.in_bulk(ids)
+        # Managers who were already employees
+        self.employee_ids.update(
+            (employee_id, (organization_id, pk))
+            for employee_id, organization_id, pk in CustomUser.objects.filter(
+                employee_id__in=set(self.pending_managers.values()) - self.employee_ids.keys()
+            ).values_list("employee_id", "organization_id", "id")
+        )
+        parents = {}
+        updated = []
+        for user_id, manager_employee_id in self.pending_managers.items():
+            user = users[user_id]
+            organization_id, manager_id = self.employee_ids.get(manager_employee_id, (None, None))
+            if manager_id is None or organization_id != user.organization_id:
+                self.warnings.append({
+                    "employee_id": user.employee_id,
+                    "errors": {"manager_employee_id": [
+                        f"Unknown manager '{manager_employee_id}' in this organization; imported without a manager."
+                    ]},
+                })
+                continue
+            user.manager_id = manager_id
+            parents[user_id] = manager_id
+            updated.append(user)
+
+        # A reporting loop inside the file cannot be placed in the tree
+        for user_id in _cycles(parents):
+            parents.pop(user_id)
+            users[user_id].manager_id = None
+            self.warnings.append({
+                "employee_id": users[user_id].employee_id,
+                "errors": {"manager_employee_id": ["Reporting loop; imported without a manager."]},
+            })
+
+        CustomUser.objects.bulk_update(updated, ["manager"], batch_size=self.chunk_size)
+        link_new_users(self.new_user_ids, parents)
+
+
+def _cycles(parents):
+    """
+    Ids of ``parents`` ({user: manager}) that sit on a reporting loop
+    """
+    state = {}
+    looped = set()
+    for start in parents:
+        path = []
+        current = start
+        while current in parents and current not in state:
+            state[current] = start
+            path.append(current)
+            current = parents[current]
+        if current in parents and state.get(current) == start:
+            looped.update(path[path.index(current):])
+    return looped
+
+
+def import_job_key(job_id):
+    return f"users:employee-import:{job_id}"
+
+
+def get_import_job(job_id):
+    return cache.get(import_job_key(job_id))
+
+
+def set_import_job(job_id, job):
+    cache.set(import_job_key(job_id), job, timeout=settings.EMPLOYEE_IMPORT_JOB_TIMEOUT)
+
+
+def stage_import(organization, upload, dry_run):
+    """
+    Copy ``upload`` into EMPLOYEE_IMPORT_STAGING_DIR for the import task.
+    Returns the job id and the staged path.
+    """
+    job_id = uuid.uuid4().hex
+    os.makedirs(settings.EMPLOYEE_IMPORT_STAGING_DIR, exist_ok=True)
+    path = os.path.join(settings.EMPLOYEE_IMPORT_STAGING_DIR, f"{organization.pk}-{job_id}.csv")
+    with open(path, "wb") as staged:
+        for chunk in upload.chunks():
+            staged.write(chunk)
+    set_import_job(job_id, {
+        "status": "queued",
+        "organization_id": organization.pk,
+        "dry_run": dry_run,
+    })
+    return job_id, path
+
+
+def run_import_job(job_id, organization_id, path, dry_run):
+    job = get_import_job(job_id) or {"organization_id": organization_id, "dry_run": dry_run}
+    set_import_job(job_id, {**job, "status": "running"})
+    try:
+        organization = Organization.objects.get(pk=organization_id)
+        importer = EmployeeImporter(organization=organization, dry_run=dry_run)
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            report = importer.run(csv.DictReader(f))
+    except UnicodeDecodeError:
+        job.update(status="failed", error="The file is not UTF-8 encoded CSV")
+    except Organization.DoesNotExist:
+        job.update(status="failed", error="The organization no longer exists")
+    else:
+        job.update(status="done", report=report)
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+    set_import_job(job_id, job)
+    return job["status"]
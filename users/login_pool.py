@@ -0,0 +1,57 @@
+"""
+Bounded thread pool for password hashing on the async login path.
+
+PBKDF2 releases the GIL, so a few threads hash in parallel without tying
+up the event loop. Attempts beyond ``LOGIN_MAX_PENDING`` are refused
+straight away instead of queueing without limit behind a login storm.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+_executor = None
+_pending = 0
+_lock = threading.Lock()
+
+
+class LoginPoolFull(Exception):
+    pass
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.LOGIN_HASH_WORKERS,
+                thread_name_prefix="login-hash",
+            )
+    return _executor
+
+
+def _call(func, args):
+    # Pool threads live outside the request cycle, so recycle their
+    # database connections like a request would
+    close_old_connections()
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
+
+
+async def run_in_login_pool(func, *args):
+    global _pending
+    with _lock:
+        if _pending >= settings.LOGIN_MAX_PENDING:
+            raise LoginPoolFull()
+        _pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_executor(), _call, func, args)
+    finally:
+        with _lock:
+            _pending -= 1
@@ -0,0 +1,53 @@
+import csv
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from organizations.models import Organization
+from users.importers import IMPORT_CHUNK_SIZE, EmployeeImporter
+
+
+class Command(BaseCommand):
+    help = "Import employees from a CSV file (see users.importers for the columns)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument(
+            "--organization",
+            type=int,
+            help="Import every row into this organization id instead of using the organization column",
+        )
+        parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+        parser.add_argument("--workers", type=int, help="Password hashing threads (default: CPU count)")
+        parser.add_argument("--dry-run", action="store_true", help="Validate only")
+        parser.add_argument("--report", help="Write the row-level error report to this JSON file")
+
+    def handle(self, *args, **options):
+        organization = None
+        if options["organization"]:
+            try:
+                organization = Organization.objects.get(pk=options["organization"])
+            except Organization.DoesNotExist:
+                raise CommandError(f"Organization {options['organization']} does not exist")
+
+        importer = EmployeeImporter(
+            organization=organization,
+            chunk_size=options["chunk_size"],
+            workers=options["workers"],
+            dry_run=options["dry_run"],
+        )
+        with open(options["path"], newline="", encoding="utf-8-sig") as f:
+            report = importer.run(csv.DictReader(f))
+
+        if options["report"]:
+            with open(options["report"], "w") as f:
+                json.dump(report, f, indent=2)
+        else:
+            for problem in (report["errors"] + report["warnings"])[:50]:
+                self.stderr.write(json.dumps(problem))
+
+        verb = "validated" if report["dry_run"] else "imported"
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['created']} employees {verb}, {report['failed']} errors, "
+            f"{len(report['warnings'])} warnings"
+        ))
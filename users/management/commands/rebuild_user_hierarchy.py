@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from users.hierarchy import rebuild_hierarchy
+
+
+class Command(BaseCommand):
+    help = "Rebuild the manager hierarchy closure table from CustomUser.manager"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        written = rebuild_hierarchy(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"{written} hierarchy links written"))
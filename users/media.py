@@ -0,0 +1,100 @@
+"""
+Profile picture pipeline.
+
+Requests only copy the upload into PROFILE_PICTURE_STAGING_DIR and queue
+users.tasks.process_profile_picture. The task downscales the image to the
+PROFILE_PICTURE_SIZES renditions, encodes them as WebP and saves them
+through the default storage (Cloudinary, or the filesystem in tests).
+"""
+
+import io
+import os
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from users.models import CustomUser
+from users.tasks import process_profile_picture
+
+PICTURE_FIELDS = list(settings.PROFILE_PICTURE_SIZES)
+
+
+def validate_profile_picture(upload):
+    if upload.size > settings.PROFILE_PICTURE_MAX_BYTES:
+        raise ValidationError("Profile picture is too large")
+    try:
+        # Reads the header only; closing the image would close the upload
+        Image.open(upload)
+    except (UnidentifiedImageError, Image.DecompressionBombError):
+        raise ValidationError("Upload a valid image")
+    finally:
+        upload.seek(0)
+
+
+def stage_profile_picture(user, upload):
+    """
+    Validate and stage ``upload`` and queue its processing. Returns at
+    once; the user's profile_picture_status is "processing" until done.
+    """
+    validate_profile_picture(upload)
+
+    os.makedirs(settings.PROFILE_PICTURE_STAGING_DIR, exist_ok=True)
+    path = os.path.join(settings.PROFILE_PICTURE_STAGING_DIR, f"{user.pk}-{uuid.uuid4().hex}")
+    with open(path, "wb") as staged:
+        for chunk in upload.chunks():
+            staged.write(chunk)
+
+    user.profile_picture_status = "processing"
+    user.save(update_fields=["profile_picture_status", "updated_at"])
+    transaction.on_commit(lambda: process_profile_picture.delay(user.pk, path))
+    return user
+
+
+def render_webp(image, size):
+    rendition = image.copy()
+    rendition.thumbnail((size, size), Image.LANCZOS)
+    buffer = io.BytesIO()
+    rendition.save(buffer, "WEBP", quality=82, method=4)
+    return ContentFile(buffer.getvalue())
+
+
+def process_staged_picture(user_id, path):
+    """
+    Turn a staged upload into WebP renditions on the user's picture fields
+    """
+    user = CustomUser.objects.filter(pk=user_id).first()
+    try:
+        if user is None:
+            return None
+        with Image.open(path) as image:
+            image = ImageOps.exif_transpose(image)
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+            renditions = {
+                field: render_webp(image, size)
+                for field, size in settings.PROFILE_PICTURE_SIZES.items()
+            }
+    except (OSError, Image.DecompressionBombError):
+        if user is not None:
+            user.profile_picture_status = "failed"
+            user.save(update_fields=["profile_picture_status", "updated_at"])
+        return None
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+    old_files = [getattr(user, field) for field in PICTURE_FIELDS]
+    old_names = [file.name for file in old_files if file]
+    name = f"{user.pk}-{uuid.uuid4().hex[:8]}.webp"
+    for field, content in renditions.items():
+        getattr(user, field).save(name, content, save=False)
+    user.profile_picture_status = "ready"
+    user.save(update_fields=PICTURE_FIELDS + ["profile_picture_status", "updated_at"])
+
+    storage = CustomUser._meta.get_field("profile_picture").storage
+    for old_name in old_names:
+        storage.delete(old_name)
+    return user
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.10 on 2026-10-18 15:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_hierarchy(apps, schema_editor):
+    CustomUser = apps.get_model('users', 'CustomUser')
+    UserHierarchy = apps.get_model('users', 'UserHierarchy')
+
+    parents = dict(CustomUser.objects.values_list('id', 'manager_id'))
+    rows = []
+    for user_id in parents:
+        seen = set()
+        current, depth = user_id, 0
+        while current is not None and current not in seen:
+            seen.add(current)
+            rows.append(UserHierarchy(ancestor_id=current, descendant_id=user_id, depth=depth))
+            current, depth = parents.get(current), depth + 1
+    UserHierarchy.objects.bulk_create(rows, batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_rename_date_of_leaving_customuser_date_of_exit'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserHierarchy',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to=settings.AUTH_USER_MODEL)),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ancestor', 'depth'], name='users_userh_ancesto_713dcb_idx'), models.Index(fields=['descendant', 'depth'], name='users_userh_descend_fb8777_idx')],
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+        migrations.RunPython(populate_hierarchy, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.10 on 2026-10-18 15:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('organizations', '0002_officelocation_login_time_officelocation_logout_time'),
+        ('users', '0007_userhierarchy'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['organization', '-created_at'], name='users_custo_organiz_38721a_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.10 on 2026-10-18 16:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_customuser_users_custo_organiz_38721a_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='profile_picture_medium',
+            field=models.ImageField(blank=True, null=True, upload_to='teamzen/user_profile/medium/'),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='profile_picture_small',
+            field=models.ImageField(blank=True, null=True, upload_to='teamzen/user_profile/small/'),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='profile_picture_status',
+            field=models.CharField(blank=True, choices=[('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.1.10 on 2026-10-18 16:39
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('organizations', '0002_officelocation_login_time_officelocation_logout_time'),
+        ('users', '0011_customuser_manager'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='customuser',
+            name='users_first_name_trgm',
+        ),
+        migrations.RemoveIndex(
+            model_name='customuser',
+            name='users_last_name_trgm',
+        ),
+        migrations.RemoveIndex(
+            model_name='customuser',
+            name='users_email_trgm',
+        ),
+        migrations.RemoveIndex(
+            model_name='customuser',
+            name='users_employee_id_trgm',
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('first_name'), name='gin_trgm_ops'), name='users_first_name_upper_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('last_name'), name='gin_trgm_ops'), name='users_last_name_upper_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('email'), name='gin_trgm_ops'), name='users_email_upper_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('employee_id'), name='gin_trgm_ops'), name='users_employee_id_upper_trgm'),
+        ),
+    ]
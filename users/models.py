@@ -1,9 +1,31 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.db.models.functions import Upper
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from organizations.models import Organization, Department, Designation, OfficeLocation
 
+class CustomUserQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        """
+        update() (and bulk_update(), which goes through it) sends no
+        post_save, so the updated users are dropped from users.cache here,
+        in one cache call once the transaction commits. A bulk deactivation
+        then takes effect on the next request.
+        """
+        from users.cache import invalidate_cached_users
+
+        user_ids = list(self.order_by().values_list("pk", flat=True))
+        rows = super().update(**kwargs)
+        invalidate_cached_users(user_ids)
+        return rows
+
+
+class CustomUserManager(UserManager.from_queryset(CustomUserQuerySet)):
+    pass
+
+
 class CustomUser(AbstractUser):
     """Extended User model with HR fields"""
     email = models.EmailField(unique=True)
@@ -23,6 +45,12 @@ class CustomUser(AbstractUser):
         ('intern', 'Intern'),
     ]
 
+    PICTURE_STATUSES = [
+        ('processing', 'Processing'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+
     EMPLOYEE_STATUS = [
         ('active', 'Active'),
         ('exited', 'Exited'),
@@ -43,6 +71,10 @@ class CustomUser(AbstractUser):
     gender = models.CharField(max_length=20, null=True, blank=True)
     phone_number = models.CharField(max_length=20, null=True, blank=True)
     profile_picture = models.ImageField(upload_to='teamzen/user_profile/', null=True, blank=True)
+    # WebP renditions made by users.tasks.process_profile_picture
+    profile_picture_medium = models.ImageField(upload_to='teamzen/user_profile/medium/', null=True, blank=True)
+    profile_picture_small = models.ImageField(upload_to='teamzen/user_profile/small/', null=True, blank=True)
+    profile_picture_status = models.CharField(max_length=20, choices=PICTURE_STATUSES, blank=True)
     
     # Employment Details
     employment_type = models.CharField(max_length=20, choices=EMPLOYMENT_TYPES, default='full_time')
@@ -61,21 +93,91 @@ class CustomUser(AbstractUser):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CustomUserManager()
+
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['organization', 'email']),
             models.Index(fields=['manager']),
+            models.Index(fields=['organization', '-created_at']),
+            # Trigram indexes behind employee search: istartswith/icontains
+            # compare UPPER(column), so that is what they index
+            GinIndex(OpClass(Upper('first_name'), name='gin_trgm_ops'), name='users_first_name_upper_trgm'),
+            GinIndex(OpClass(Upper('last_name'), name='gin_trgm_ops'), name='users_last_name_upper_trgm'),
+            GinIndex(OpClass(Upper('email'), name='gin_trgm_ops'), name='users_email_upper_trgm'),
+            GinIndex(OpClass(Upper('employee_id'), name='gin_trgm_ops'), name='users_employee_id_upper_trgm'),
         ]
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
+    def clean(self):
+        super().clean()
+        from users.hierarchy import check_manager
+
+        check_manager(self.pk, self.manager_id)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets the hierarchy and search signals tell what changed on save
+        if "manager_id" in instance.__dict__:
+            instance._loaded_manager_id = instance.manager_id
+        if "organization_id" in instance.__dict__:
+            instance._loaded_organization_id = instance.organization_id
+        from users.search import indexed_values
+
+        instance._loaded_search_values = indexed_values(instance)
+        return instance
+
     def get_subordinates(self):
         return self.subordinates.all()
 
+    def get_descendants(self, max_depth=None, include_self=False):
+        """
+        Everyone reporting to this user directly or indirectly, up to
+        ``max_depth`` levels down, in one query on UserHierarchy
+        """
+        links = {"ancestor_links__ancestor": self}
+        if not include_self:
+            links["ancestor_links__depth__gte"] = 1
+        if max_depth is not None:
+            links["ancestor_links__depth__lte"] = max_depth
+        return CustomUser.objects.filter(**links)
+
+    def get_ancestors(self, max_depth=None, include_self=False):
+        """
+        Management chain of this user, nearest manager first
+        """
+        links = {"descendant_links__descendant": self}
+        if not include_self:
+            links["descendant_links__depth__gte"] = 1
+        if max_depth is not None:
+            links["descendant_links__depth__lte"] = max_depth
+        return CustomUser.objects.filter(**links).order_by("descendant_links__depth")
+
     def has_role(self, role_name):
         return self.role == role_name
-    
 
 
+class UserHierarchy(models.Model):
+    """
+    Closure table of the manager hierarchy: one row per (ancestor,
+    descendant) pair, including each user paired with themselves at depth 0.
+    Maintained by users.signals, rebuilt by `manage.py rebuild_user_hierarchy`.
+    """
+    ancestor = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ('ancestor', 'descendant')
+        indexes = [
+            models.Index(fields=['ancestor', 'depth']),
+            models.Index(fields=['descendant', 'depth']),
+        ]
+
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
+
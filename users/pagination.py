@@ -0,0 +1,12 @@
+from rest_framework.pagination import CursorPagination
+
+
+class EmployeeCursorPagination(CursorPagination):
+    """
+    Cursor pagination for the employee directory. Every page is a range
+    scan on (organization, created_at) however deep the cursor points.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-created_at', '-id')
@@ -0,0 +1,193 @@
+"""
+Revoked JWT ids (JTIs): refresh tokens used up by rotation, and refresh and
+access tokens revoked by logout.
+
+Each revoked JTI is a key with a TTL equal to the token's remaining
+lifetime, so the store never outgrows the tokens that are still valid.
+With REDIS_URL the keys live in Redis. They also set bits in a shared
+Redis bitmap that every worker mirrors as an in-process Bloom filter. A
+lookup that misses the filter (almost all of them) is answered without
+leaving the worker. Only possible hits are confirmed against the key.
+Without Redis a process-local store is used (development, tests).
+
+Filters rotate every REFRESH_TOKEN_LIFETIME: a JTI can only matter while
+its token is alive, so the current and previous generations cover every
+live revocation. Workers poll the shared bitmap's version at most every
+REVOCATION_SYNC_SECONDS, which bounds how long a revocation made in
+another worker can go unnoticed there.
+"""
+
+import hashlib
+import threading
+import time
+
+import redis
+from django.conf import settings
+from rest_framework_simplejwt.settings import api_settings
+
+FILTER_BITS = 1 << 20
+FILTER_HASHES = 7
+
+
+class BloomFilter:
+    """
+    Bit layout matches Redis SETBIT/GETRANGE: bit 0 is the high bit of the
+    first byte
+    """
+
+    def __init__(self, data=None):
+        self.bits = bytearray(FILTER_BITS // 8)
+        if data:
+            # Redis only allocates the bitmap up to its highest set bit
+            self.bits[:len(data)] = data
+
+    @staticmethod
+    def positions(jti):
+        digest = hashlib.blake2b(jti.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return [(h1 + i * h2) % FILTER_BITS for i in range(FILTER_HASHES)]
+
+    def add(self, jti):
+        for position in self.positions(jti):
+            self.bits[position >> 3] |= 0x80 >> (position & 7)
+
+    def __contains__(self, jti):
+        return all(
+            self.bits[position >> 3] & (0x80 >> (position & 7))
+            for position in self.positions(jti)
+        )
+
+
+def _generation(now=None):
+    period = api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()
+    return int((now or time.time()) // period)
+
+
+class MemoryStore:
+    shared = False
+
+    def __init__(self):
+        self.expires = {}
+        self.lock = threading.Lock()
+
+    def add(self, jti, ttl, generation):
+        now = time.time()
+        with self.lock:
+            if self.expires.get(jti, 0) > now:
+                return False
+            if len(self.expires) > 10000:
+                self.expires = {k: v for k, v in self.expires.items() if v > now}
+            self.expires[jti] = now + ttl
+            return True
+
+    def contains(self, jti):
+        return self.expires.get(jti, 0) > time.time()
+
+
+class RedisStore:
+    shared = True
+
+    def __init__(self, url):
+        self.redis = redis.Redis.from_url(url)
+
+    def add(self, jti, ttl, generation):
+        bitmap = f"revoked-jti-filter:{generation}"
+        pipe = self.redis.pipeline()
+        pipe.set(f"revoked-jti:{jti}", 1, ex=max(int(ttl), 1), nx=True)
+        for position in BloomFilter.positions(jti):
+            pipe.setbit(bitmap, position, 1)
+        pipe.expire(bitmap, int(2 * api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()))
+        pipe.incr("revoked-jti-filter:version")
+        return bool(pipe.execute()[0])
+
+    def contains(self, jti):
+        return bool(self.redis.exists(f"revoked-jti:{jti}"))
+
+    def version(self):
+        return self.redis.get("revoked-jti-filter:version")
+
+    def bitmap(self, generation):
+        return self.redis.get(f"revoked-jti-filter:{generation}")
+
+
+class RevocationList:
+    def __init__(self, store):
+        self.store = store
+        self.filters = {}
+        self.version = None
+        self.synced_at = 0
+        self.lock = threading.Lock()
+
+    def _filter(self, generation):
+        bloom = self.filters.get(generation)
+        if bloom is None:
+            bloom = self.filters[generation] = BloomFilter()
+            for old in [g for g in self.filters if g < generation - 1]:
+                del self.filters[old]
+        return bloom
+
+    def _sync(self):
+        if not self.store.shared:
+            return
+        now = time.time()
+        if now - self.synced_at < settings.REVOCATION_SYNC_SECONDS:
+            return
+        with self.lock:
+            self.synced_at = now
+            version = self.store.version()
+            if version == self.version:
+                return
+            generation = _generation(now)
+            self.filters = {
+                g: BloomFilter(self.store.bitmap(g))
+                for g in (generation - 1, generation)
+            }
+            self.version = version
+
+    def revoke(self, jti, ttl):
+        """
+        Revoke ``jti`` for ``ttl`` seconds. Returns False when it already
+        was revoked, so using up a refresh token is an atomic claim.
+        """
+        generation = _generation()
+        revoked = self.store.add(jti, ttl, generation)
+        with self.lock:
+            self._filter(generation).add(jti)
+        return revoked
+
+    def is_revoked(self, jti):
+        self._sync()
+        generation = _generation()
+        if not any(
+            jti in bloom
+            for g, bloom in list(self.filters.items())
+            if g >= generation - 1
+        ):
+            return False
+        return self.store.contains(jti)
+
+
+_revocations = None
+
+
+def get_revocations():
+    global _revocations
+    if _revocations is None:
+        redis_url = getattr(settings, "REDIS_URL", None)
+        _revocations = RevocationList(
+            RedisStore(redis_url) if redis_url else MemoryStore()
+        )
+    return _revocations
+
+
+def revoke_token(token):
+    """
+    Revoke a validated simplejwt token until it expires
+    """
+    ttl = token["exp"] - time.time()
+    return get_revocations().revoke(token[api_settings.JTI_CLAIM], max(ttl, 1))
+
+
+def is_token_revoked(token):
+    return get_revocations().is_revoked(token[api_settings.JTI_CLAIM])
@@ -0,0 +1,158 @@
+"""
+Employee search and autocomplete.
+
+Every organization gets an in-memory prefix index: a sorted list of
+lowercased tokens (first name, last name, full name, email, email local
+part, employee id) that a keystroke searches with two bisections and no
+query. It is rebuilt when users.signals bumps the organization's version,
+which only saves changing one of the indexed values do, again after the
+commit. Each worker keeps
+the SEARCH_INDEX_CACHE_SIZE most recently searched organizations.
+Organizations larger than SEARCH_INDEX_MAX_USERS are searched in Postgres
+instead, through the trigram indexes on UPPER() of the same columns.
+"""
+
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Q
+
+from config.cache_versions import get_version
+from users.models import CustomUser
+
+MAX_SEARCH_RESULTS = 50
+
+# Columns searched and kept in memory
+SEARCH_FIELDS = ("first_name", "last_name", "email", "employee_id")
+HIT_FIELDS = ("id",) + SEARCH_FIELDS + ("profile_picture_small",)
+# Everything that decides what a user looks like in the index
+INDEXED_FIELDS = SEARCH_FIELDS + ("profile_picture_small", "is_active", "organization_id")
+
+# organization id -> (version, EmployeeSearchIndex), least recently used first
+_search_indexes = OrderedDict()
+_lock = threading.Lock()
+
+
+def employee_search_version_key(organization_id):
+    return f"users:employee-search:{organization_id}"
+
+
+def indexed_values(user):
+    """
+    The user's INDEXED_FIELDS as loaded, for telling whether a save
+    changes the index. Deferred fields count as None.
+    """
+    values = (user.__dict__.get(field) for field in INDEXED_FIELDS)
+    # Picture fields hold a name or a FieldFile
+    return tuple(getattr(value, "name", value) for value in values)
+
+
+def _terms(query):
+    return [term for term in query.lower().split() if term]
+
+
+class EmployeeSearchIndex:
+    def __init__(self, rows):
+        # One dict per employee, with the HIT_FIELDS
+        self.rows = list(rows)
+        pairs = []
+        for position, row in enumerate(self.rows):
+            first = (row["first_name"] or "").lower()
+            last = (row["last_name"] or "").lower()
+            email = (row["email"] or "").lower()
+            tokens = {first, last, f"{first} {last}".strip(), email, email.split("@")[0]}
+            tokens.update(first.split())
+            tokens.update(last.split())
+            if row["employee_id"]:
+                tokens.add(row["employee_id"].lower())
+            pairs.extend((token, position) for token in tokens if token)
+        pairs.sort()
+        self.tokens = [token for token, _ in pairs]
+        self.positions = [position for _, position in pairs]
+
+    def _prefixed(self, term):
+        start = bisect_left(self.tokens, term)
+        end = bisect_left(self.tokens, term + "\uffff")
+        return set(self.positions[start:end])
+
+    def search(self, query, limit):
+        """
+        Employees with a token starting with every term of ``query``
+        """
+        terms = _terms(query)
+        if not terms:
+            return []
+        # Longest term first: it usually matches the fewest employees
+        terms.sort(key=len, reverse=True)
+        matches = self._prefixed(terms[0])
+        for term in terms[1:]:
+            if not matches:
+                break
+            matches &= self._prefixed(term)
+
+        query = " ".join(_terms(query))
+        rows = [self.rows[position] for position in matches]
+        rows.sort(key=lambda row: _rank(row, query))
+        return rows[:limit]
+
+
+def _rank(row, query):
+    full_name = f"{row['first_name']} {row['last_name']}".strip().lower()
+    exact = query in (full_name, (row["email"] or "").lower(), (row["employee_id"] or "").lower())
+    return (not exact, not full_name.startswith(query), full_name, row["id"])
+
+
+def _employees(organization_id):
+    return CustomUser.objects.filter(organization_id=organization_id, is_active=True)
+
+
+def get_search_index(organization_id):
+    """
+    The organization's index, or None when it is too large to hold in memory
+    """
+    version = get_version(employee_search_version_key(organization_id))
+    with _lock:
+        cached = _search_indexes.get(organization_id)
+        if cached is not None and cached[0] == version:
+            _search_indexes.move_to_end(organization_id)
+            return cached[1]
+
+    rows = list(_employees(organization_id).values(*HIT_FIELDS)[: settings.SEARCH_INDEX_MAX_USERS + 1])
+    index = None
+    if len(rows) <= settings.SEARCH_INDEX_MAX_USERS:
+        index = EmployeeSearchIndex(rows)
+    with _lock:
+        _search_indexes[organization_id] = (version, index)
+        _search_indexes.move_to_end(organization_id)
+        while len(_search_indexes) > settings.SEARCH_INDEX_CACHE_SIZE:
+            _search_indexes.popitem(last=False)
+    return index
+
+
+def search_employees(organization_id, query, limit=10):
+    """
+    Up to ``limit`` active employees of the organization matching ``query``
+    as dicts of HIT_FIELDS, best match first
+    """
+    limit = max(1, min(limit, MAX_SEARCH_RESULTS))
+    index = get_search_index(organization_id)
+    if index is not None:
+        return index.search(query, limit)
+
+    terms = _terms(query)
+    if not terms:
+        return []
+    employees = _employees(organization_id)
+    # istartswith is UPPER(column) LIKE UPPER('term%'), which the
+    # users_*_upper_trgm expression indexes serve
+    for term in terms:
+        condition = Q()
+        for field in SEARCH_FIELDS:
+            condition |= Q(**{f"{field}__istartswith": term})
+        employees = employees.filter(condition)
+    rows = list(employees.values(*HIT_FIELDS)[: limit * 5])
+    query = " ".join(terms)
+    rows.sort(key=lambda row: _rank(row, query))
+    return rows[:limit]
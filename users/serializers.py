@@ -1,8 +1,37 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import Throttled
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from users.cache import get_cached_user
+from users.hierarchy import MANAGER_CYCLE_ERROR, closes_cycle
+from users.revocation import is_token_revoked, revoke_token
+from users.throttling import check_login_throttle, client_ip, record_failed_login
 from users.models import CustomUser
 
-class UserSerializer(serializers.ModelSerializer):
+class SparseFieldsetMixin:
+    """
+    Serialize only the fields named in the request's ``fields`` query
+    parameter, e.g. ``?fields=id,email,organization_name``. Only reads are
+    trimmed: a write validates and returns every field.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS:
+            return
+        requested = request.query_params.get('fields')
+        if requested:
+            keep = {name.strip() for name in requested.split(',')}
+            for name in set(self.fields) - keep:
+                self.fields.pop(name)
+
+
+class UserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """User serializer"""
     organization_name = serializers.CharField(source='organization.name', read_only=True)
 
@@ -12,12 +41,12 @@ class UserSerializer(serializers.ModelSerializer):
             'id', 'email', 'first_name', 'last_name', 'phone_number',
             'employee_id', 'role', 'department', 'designation',
             'date_of_joining', 'employment_type', 'is_active',
-            'organization', 'organization_name'
+            'organization', 'organization_name', 'profile_picture_small',
         ]
-        read_only_fields = ['id']
+        read_only_fields = ['id', 'profile_picture_small']
 
 
-class UserDetailSerializer(serializers.ModelSerializer):
+class UserDetailSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Detailed user serializer"""
     department_name = serializers.CharField(source='department.name', read_only=True)
     designation_name = serializers.CharField(source='designation.name', read_only=True)
@@ -30,12 +59,24 @@ class UserDetailSerializer(serializers.ModelSerializer):
             'phone_number', 'date_of_birth', 'gender', 'employee_id',
             'department', 'department_name', 'designation', 'designation_name',
             'manager', 'office_location', 'role', 'employment_type',
-            'date_of_joining', 'date_of_leaving', 'bank_account_number',
+            'date_of_joining', 'date_of_exit', 'bank_account_number',
             'bank_ifsc_code', 'aadhar_number', 'pan_number', 'uan_number',
-            'profile_picture', 'is_verified', 'is_active', 'created_at',
+            'profile_picture', 'profile_picture_medium', 'profile_picture_small',
+            'profile_picture_status', 'is_verified', 'is_active', 'created_at',
             'organization', 'organization_name'
         ]
-        read_only_fields = ['id', 'created_at']
+        # Pictures are uploaded through users.media, never written inline
+        read_only_fields = [
+            'id', 'created_at', 'profile_picture', 'profile_picture_medium',
+            'profile_picture_small', 'profile_picture_status',
+        ]
+
+    def validate_manager(self, manager):
+        if self.instance is not None and closes_cycle(
+            self.instance.pk, manager.pk if manager else None
+        ):
+            raise serializers.ValidationError(MANAGER_CYCLE_ERROR)
+        return manager
 
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -64,8 +105,49 @@ class LoginSerializer(serializers.Serializer):
     password = serializers.CharField(write_only=True)
 
     def validate(self, data):
+        ip = client_ip(self.context.get('request'))
+        retry_after = check_login_throttle(ip, data['email'])
+        if retry_after is not None:
+            raise Throttled(wait=retry_after)
+
         user = authenticate(username=data['email'], password=data['password'])
         if not user:
+            record_failed_login(ip, data['email'])
             raise serializers.ValidationError("Invalid credentials")
         data['user'] = user
-        return data
\ No newline at end of file
+        return data
+
+
+class RevocableTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    TokenRefreshSerializer backed by users.revocation instead of the
+    token_blacklist tables, with the user read from the user cache
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+
+        if api_settings.ROTATE_REFRESH_TOKENS and api_settings.BLACKLIST_AFTER_ROTATION:
+            # Revoking is an atomic claim: of two concurrent refreshes with
+            # the same token only one gets new tokens
+            if not revoke_token(refresh):
+                raise InvalidToken(_("Token is blacklisted"))
+        elif is_token_revoked(refresh):
+            raise InvalidToken(_("Token is blacklisted"))
+
+        user = get_cached_user(refresh[api_settings.USER_ID_CLAIM])
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(
+                self.error_messages['no_active_account'],
+                'no_active_account',
+            )
+
+        data = {'access': str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+
+        return data
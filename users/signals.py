@@ -0,0 +1,95 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from config.cache_versions import bump_version, bump_versions
+from organizations.models import Department, Designation, OfficeLocation, Organization
+from users.cache import invalidate_cached_users, organization_version_key, user_version_key
+from users.hierarchy import add_user, move_subtree
+from users.models import CustomUser
+from users.search import INDEXED_FIELDS, employee_search_version_key, indexed_values
+
+# Saves touching only other fields (e.g. last_login) keep the search index
+SEARCH_INDEX_FIELDS = set(INDEXED_FIELDS) | {"organization"}
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_cached_user(sender, instance, **kwargs):
+    # Now, for later reads in this transaction, and again after the commit
+    # for workers that read the old row meanwhile
+    bump_version(user_version_key(instance.pk))
+    invalidate_cached_users([instance.pk])
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_employee_search(sender, instance, created=None, update_fields=None, **kwargs):
+    if update_fields is not None and not SEARCH_INDEX_FIELDS & set(update_fields):
+        return
+    # A full save() of a loaded user that changed none of the indexed
+    # values (created is None on delete)
+    loaded = getattr(instance, "_loaded_search_values", None)
+    instance._loaded_search_values = indexed_values(instance)
+    if created is False and loaded == instance._loaded_search_values:
+        return
+    organization_ids = {instance.organization_id, getattr(instance, "_loaded_organization_id", None)}
+    keys = [employee_search_version_key(organization_id) for organization_id in organization_ids - {None}]
+    # As for cached users: now, and again once other workers can see the
+    # change, so an index built from the old rows meanwhile is dropped
+    bump_versions(keys)
+    transaction.on_commit(lambda: bump_versions(keys))
+    instance._loaded_organization_id = instance.organization_id
+
+
+@receiver(post_save, sender=Organization)
+@receiver(post_delete, sender=Organization)
+def invalidate_organization_snapshots(sender, instance, **kwargs):
+    bump_version(organization_version_key(instance.pk))
+
+
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+@receiver(post_save, sender=Designation)
+@receiver(post_delete, sender=Designation)
+@receiver(post_save, sender=OfficeLocation)
+@receiver(post_delete, sender=OfficeLocation)
+def invalidate_organization_part_snapshots(sender, instance, **kwargs):
+    bump_version(organization_version_key(instance.organization_id))
+
+
+def _saves_manager(update_fields):
+    return update_fields is None or "manager" in update_fields or "manager_id" in update_fields
+
+
+@receiver(pre_save, sender=CustomUser)
+def load_manager_id(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Cycles are refused by validation (UserDetailSerializer, CustomUser.clean);
+    # this only lets update_hierarchy tell whether the manager changed
+    if raw or instance.pk is None or not _saves_manager(update_fields):
+        return
+    if not hasattr(instance, "_loaded_manager_id"):
+        instance._loaded_manager_id = (
+            CustomUser.objects.filter(pk=instance.pk)
+            .values_list("manager_id", flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=CustomUser)
+def update_hierarchy(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or not _saves_manager(update_fields):
+        return
+    if created:
+        add_user(instance)
+    elif instance.manager_id != instance._loaded_manager_id:
+        move_subtree(instance.pk, instance.manager_id)
+    instance._loaded_manager_id = instance.manager_id
+
+
+@receiver(pre_delete, sender=CustomUser)
+def detach_reports(sender, instance, **kwargs):
+    # manager is SET_NULL, which bypasses save(): detach the reports'
+    # subtrees from the deleted user's chain here
+    for report_id in CustomUser.objects.filter(manager=instance).values_list("id", flat=True):
+        move_subtree(report_id, None)
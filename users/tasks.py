@@ -0,0 +1,14 @@
+from celery import shared_task
+
+from users import importers, media
+
+
+@shared_task
+def process_profile_picture(user_id, path):
+    user = media.process_staged_picture(user_id, path)
+    return user.profile_picture_status if user else None
+
+
+@shared_task
+def import_employees(job_id, organization_id, path, dry_run=False):
+    return importers.run_import_job(job_id, organization_id, path, dry_run)
@@ -1,3 +1,516 @@
-from django.test import TestCase
+import io
+import pickle
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, TransactionTestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from organizations.models import Organization
+from config.cache_versions import get_version
+from users import cache as users_cache, search
+from users.cache import get_cached_user, user_version_key
+from users.importers import EmployeeImporter
+from users.models import CustomUser
+
+
+class UsersTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = Organization.objects.create(name="Acme", headquarters_address="-")
+        cls.hr = CustomUser.objects.create_user(
+            email="hr@example.com", username="hr", password="secret-password",
+            organization=cls.organization, role="hr", first_name="Hannah", last_name="Reed",
+        )
+        cls.employee = CustomUser.objects.create_user(
+            email="employee@example.com", username="employee", password="secret-password",
+            organization=cls.organization, manager=cls.hr, first_name="Evan", last_name="Moss",
+        )
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+        return client
+
+
+class CachedUserTests(UsersTestCase):
+    def test_deactivated_user_is_rejected_on_the_next_request(self):
+        client = self.client_for(self.employee)
+        self.assertEqual(client.get("/api/users/me/").status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            employee = CustomUser.objects.get(pk=self.employee.pk)
+            employee.is_active = False
+            employee.save()
+
+        self.assertEqual(client.get("/api/users/me/").status_code, 401)
+
+    def test_bulk_deactivation_stops_authentication(self):
+        client = self.client_for(self.employee)
+        self.assertEqual(client.get("/api/users/me/").status_code, 200)
+        self.assertTrue(get_cached_user(self.employee.id).is_active)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CustomUser.objects.filter(organization=self.organization, role="employee").update(is_active=False)
+
+        self.assertFalse(get_cached_user(self.employee.id).is_active)
+        self.assertEqual(client.get("/api/users/me/").status_code, 401)
+
+    def test_rows_read_before_the_commit_are_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            employee = CustomUser.objects.get(pk=self.employee.pk)
+            employee.role = "hr"
+            employee.save()
+            # Another worker, still seeing the old row, caches it under the new stamp
+            version = get_version(user_version_key(self.employee.pk))
+            cache.set(f"{user_version_key(self.employee.pk)}:{version}", pickle.dumps(self.employee))
+            users_cache._local.clear()
+            self.assertEqual(get_cached_user(self.employee.pk).role, "employee")
+
+        self.assertEqual(get_cached_user(self.employee.pk).role, "hr")
+
+    def test_bulk_update_refreshes_cached_users(self):
+        get_cached_user(self.employee.id)
+        self.employee.first_name = "Eve"
+        with self.captureOnCommitCallbacks(execute=True):
+            CustomUser.objects.bulk_update([self.employee], ["first_name"])
+        self.assertEqual(get_cached_user(self.employee.id).first_name, "Eve")
+
+    def test_bulk_update_bumps_in_one_cache_call(self):
+        users = list(CustomUser.objects.all())
+        with self.captureOnCommitCallbacks() as callbacks:
+            CustomUser.objects.bulk_update(users, ["first_name"])
+        with mock.patch.object(cache, "set_many") as set_many:
+            for callback in callbacks:
+                callback()
+        set_many.assert_called_once()
+        self.assertEqual(set(set_many.call_args.args[0]), {user_version_key(user.pk) for user in users})
+
+    def test_worker_copies_expire(self):
+        get_cached_user(self.employee.pk)
+        version, loaded_at, _ = users_cache._local[self.employee.pk]
+        stale = CustomUser.objects.get(pk=self.employee.pk)
+        stale.first_name = "Stale"
+        users_cache._local[self.employee.pk] = (version, loaded_at, pickle.dumps(stale))
+        self.assertEqual(get_cached_user(self.employee.pk).first_name, "Stale")
+        with override_settings(USER_CACHE_LOCAL_MAX_AGE=0):
+            self.assertEqual(get_cached_user(self.employee.pk).first_name, "Evan")
+
+
+class MeTests(UsersTestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = self.client_for(self.employee)
+
+    def test_unchanged_profile_answers_not_modified(self):
+        response = self.client.get("/api/users/me/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["first_name"], "Evan")
+        etag = response["ETag"]
+
+        response = self.client.get("/api/users/me/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(response.content, b"")
+
+    def test_changes_move_the_etag(self):
+        etag = self.client.get("/api/users/me/")["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put("/api/users/update_profile/", {"first_name": "Eve"}, format="json")
+
+        response = self.client.get("/api/users/me/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.json()["first_name"], "Eve")
+
+    def test_manager_changes_move_the_etag(self):
+        etag = self.client.get("/api/users/me/")["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hr.first_name = "Hana"
+            self.hr.save()
+        self.assertEqual(self.client.get("/api/users/me/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+@override_settings(LOGIN_THROTTLE_RATES={"ip": (5, 60), "account": (3, 60)})
+class LoginTests(TransactionTestCase):
+    # The login pool's threads use their own database connections, which
+    # would not see a TestCase's uncommitted rows
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            email="employee@example.com", username="employee", password="secret-password",
+        )
+
+    def login(self, email="employee@example.com", password="secret-password", **kwargs):
+        return self.client.post(
+            "/api/auth/login/", {"email": email, "password": password},
+            content_type="application/json", **kwargs,
+        )
+
+    def test_login_sets_cookies(self):
+        response = self.login()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["user"]["email"], "employee@example.com")
+        self.assertIn("access_token", response.cookies)
+        self.assertIn("refresh_token", response.cookies)
+
+    def test_users_login_route(self):
+        response = self.client.post(
+            "/api/users/login/", {"email": "employee@example.com", "password": "secret-password"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("access_token", response.cookies)
+
+    def test_form_encoded_login(self):
+        response = self.client.post(
+            "/api/auth/login/", {"email": "employee@example.com", "password": "secret-password"}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_bad_credentials_answer_like_the_serializer(self):
+        response = self.login(password="wrong")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"non_field_errors": ["Invalid credentials"]})
+        response = self.client.post("/api/auth/login/", {}, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {"email", "password"})
+
+    def test_body_that_is_not_an_object(self):
+        for body in ("[]", "5", '"email"'):
+            response = self.client.post("/api/auth/login/", body, content_type="application/json")
+            self.assertEqual(response.status_code, 400, body)
+        response = self.client.post("/api/auth/login/", "{", content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_successful_logins_are_not_throttled(self):
+        for _ in range(10):
+            self.assertEqual(self.login().status_code, 200)
+
+    def test_failed_logins_throttle_the_account(self):
+        for _ in range(3):
+            self.assertEqual(self.login(password="wrong").status_code, 400)
+        response = self.login()
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, "NUM_PROXIES": 1})
+    def test_failed_logins_throttle_the_forwarded_client_ip(self):
+        for i in range(5):
+            response = self.login(email=f"nobody-{i}@example.com", HTTP_X_FORWARDED_FOR="203.0.113.7")
+            self.assertEqual(response.status_code, 400)
+        response = self.login(HTTP_X_FORWARDED_FOR="203.0.113.7")
+        self.assertEqual(response.status_code, 429)
+        # Another client behind the same proxy
+        response = self.login(HTTP_X_FORWARDED_FOR="198.51.100.20")
+        self.assertEqual(response.status_code, 200)
+
+
+class TokenRevocationTests(UsersTestCase):
+    def refresh(self, token):
+        return APIClient().post("/api/auth/refresh/", {"refresh": str(token)}, format="json")
+
+    def test_refresh_rotates_and_revokes_the_used_token(self):
+        refresh = RefreshToken.for_user(self.employee)
+        response = self.refresh(refresh)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.json()["refresh"], str(refresh))
+
+        self.assertEqual(self.refresh(refresh).status_code, 401)
+        self.assertEqual(self.refresh(response.json()["refresh"]).status_code, 200)
+
+    def test_logout_revokes_both_tokens(self):
+        refresh = RefreshToken.for_user(self.employee)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+        self.assertEqual(client.get("/api/users/me/").status_code, 200)
+
+        response = client.post("/api/users/logout/", {"refresh": str(refresh)}, format="json")
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(client.get("/api/users/me/").status_code, 401)
+        self.assertEqual(self.refresh(refresh).status_code, 401)
+
+
+class HierarchyTests(UsersTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # hr <- employee <- intern
+        cls.intern = CustomUser.objects.create_user(
+            email="intern@example.com", username="intern", password="secret-password",
+            organization=cls.organization, manager=cls.employee,
+        )
+
+    def test_closure_table_follows_manager_changes(self):
+        self.assertEqual(set(self.hr.get_descendants()), {self.employee, self.intern})
+        self.assertEqual(list(self.intern.get_ancestors()), [self.employee, self.hr])
+
+        self.employee.manager = None
+        self.employee.save()
+        self.assertEqual(set(self.hr.get_descendants()), set())
+        self.assertEqual(list(self.intern.get_ancestors()), [self.employee])
+
+    def test_cycles_are_refused_by_the_api(self):
+        client = self.client_for(self.hr)
+        for manager in (self.hr, self.intern):
+            response = client.put("/api/users/update_profile/", {"manager": manager.id}, format="json")
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("manager", response.json())
+        self.hr.refresh_from_db()
+        self.assertIsNone(self.hr.manager_id)
+
+        response = self.client_for(self.intern).put(
+            "/api/users/update_profile/", {"manager": self.hr.id}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(self.intern.get_ancestors()), [self.hr])
+
+    def test_cycles_are_refused_by_model_validation(self):
+        self.hr.manager = self.intern
+        with self.assertRaises(ValidationError):
+            self.hr.full_clean()
+
+
+class EmployeeSearchTests(UsersTestCase):
+    def setUp(self):
+        # Indexes built by an earlier test outlive its rolled back rows
+        cache.clear()
+        search._search_indexes.clear()
+
+    def names(self, query):
+        return [hit["first_name"] for hit in search.search_employees(self.organization.id, query)]
+
+    def version(self):
+        return get_version(search.employee_search_version_key(self.organization.id))
+
+    def test_prefix_search(self):
+        self.assertEqual(self.names("ev"), ["Evan"])
+        self.assertEqual(self.names("REED h"), ["Hannah"])
+        self.assertEqual(self.names("employee@"), ["Evan"])
+        self.assertEqual(self.names("nobody"), [])
+
+    @override_settings(SEARCH_INDEX_MAX_USERS=0)
+    def test_large_organizations_are_searched_in_the_database(self):
+        self.assertIsNone(search.get_search_index(self.organization.id))
+        self.assertEqual(self.names("ev"), ["Evan"])
+        self.assertEqual(self.names("REED h"), ["Hannah"])
+
+    @override_settings(SEARCH_INDEX_CACHE_SIZE=1)
+    def test_indexes_are_bounded(self):
+        other = Organization.objects.create(name="Other", headquarters_address="-")
+        search.get_search_index(self.organization.id)
+        search.get_search_index(other.id)
+        self.assertEqual(list(search._search_indexes), [other.id])
+
+    def test_only_indexed_changes_rebuild_the_index(self):
+        version = self.version()
+        employee = CustomUser.objects.get(pk=self.employee.pk)
+        employee.phone_number = "555-0100"
+        employee.save()
+        self.assertEqual(self.version(), version)
+
+        employee.first_name = "Eve"
+        employee.save()
+        self.assertNotEqual(self.version(), version)
+        self.assertEqual(self.names("eve"), ["Eve"])
+
+        employee.is_active = False
+        employee.save(update_fields=["is_active"])
+        self.assertEqual(self.names("eve"), [])
+
+    def test_deactivated_users_leave_the_results_after_the_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            employee = CustomUser.objects.get(pk=self.employee.pk)
+            employee.is_active = False
+            employee.save(update_fields=["is_active"])
+            # Another worker, still seeing the old rows, indexes them under the new stamp
+            search._search_indexes[self.organization.id] = (
+                self.version(), search.EmployeeSearchIndex(
+                    CustomUser.objects.filter(organization=self.organization).values(*search.HIT_FIELDS)
+                ),
+            )
+            self.assertEqual(self.names("ev"), ["Evan"])
+
+        self.assertEqual(self.names("ev"), [])
+
+
+class EmployeeDirectoryTests(UsersTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for number in range(3):
+            CustomUser.objects.create_user(
+                email=f"staff{number}@example.com", username=f"staff{number}", password="secret-password",
+                organization=cls.organization,
+            )
+        other = Organization.objects.create(name="Other", headquarters_address="-")
+        CustomUser.objects.create_user(
+            email="outsider@example.com", username="outsider", password="secret-password", organization=other,
+        )
+
+    def setUp(self):
+        self.client = self.client_for(self.hr)
+
+    def expected_ids(self):
+        return list(
+            CustomUser.objects.filter(organization=self.organization)
+            .order_by("-created_at", "-id").values_list("id", flat=True)
+        )
+
+    def test_cursor_pages_walk_the_organization_in_order(self):
+        pages, url = [], "/api/users/?page_size=2"
+        while url:
+            page = self.client.get(url).json()
+            pages.append([employee["id"] for employee in page["results"]])
+            url = page["next"]
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual(sum(pages, []), self.expected_ids())
+
+        previous = self.client.get(page["previous"]).json()
+        self.assertEqual([employee["id"] for employee in previous["results"]], pages[1])
+
+    def test_pages_take_the_same_queries_whatever_their_size(self):
+        self.client.get("/api/users/?page_size=1")
+        for page_size in (1, 5):
+            with self.assertNumQueries(1):
+                response = self.client.get(f"/api/users/?page_size={page_size}")
+            self.assertEqual(len(response.json()["results"]), page_size)
+
+    def test_fields_trim_the_listing(self):
+        page = self.client.get("/api/users/?fields=id,organization_name").json()
+        self.assertEqual(
+            page["results"][0], {"id": self.expected_ids()[0], "organization_name": "Acme"}
+        )
+
+    def test_writes_ignore_fields(self):
+        response = self.client.patch(
+            f"/api/users/{self.employee.id}/?fields=id", {"first_name": "Eve"}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["first_name"], "Eve")
+        self.assertEqual(response.json()["email"], "employee@example.com")
+
+
+@override_settings(PROFILE_PICTURE_STAGING_DIR=tempfile.gettempdir())
+class ProfilePictureTests(UsersTestCase):
+    def picture(self, size=(100, 100)):
+        buffer = io.BytesIO()
+        Image.new("RGB", size).save(buffer, "PNG")
+        return SimpleUploadedFile("picture.png", buffer.getvalue(), content_type="image/png")
+
+    def update(self, upload):
+        return self.client_for(self.employee).put(
+            "/api/users/update_profile/", {"first_name": "Eve", "profile_picture": upload}, format="multipart"
+        )
+
+    def test_picture_is_staged_with_the_profile(self):
+        with mock.patch("users.media.process_profile_picture") as task:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.update(self.picture())
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(task.delay.called)
+        self.employee.refresh_from_db()
+        self.assertEqual(self.employee.first_name, "Eve")
+        self.assertEqual(self.employee.profile_picture_status, "processing")
+
+    def test_rejected_picture_saves_nothing(self):
+        upload = SimpleUploadedFile("picture.png", b"not an image", content_type="image/png")
+        response = self.update(upload)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("profile_picture", response.json())
+        self.employee.refresh_from_db()
+        self.assertEqual(self.employee.first_name, "Evan")
+
+    def test_decompression_bombs_are_rejected(self):
+        with mock.patch.object(Image, "MAX_IMAGE_PIXELS", 1000):
+            response = self.update(self.picture())
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("profile_picture", response.json())
+        self.employee.refresh_from_db()
+        self.assertEqual(self.employee.first_name, "Evan")
+
+
+@override_settings(EMPLOYEE_IMPORT_STAGING_DIR=tempfile.gettempdir())
+class EmployeeImportTests(UsersTestCase):
+    CSV = (
+        "email,first_name,last_name,employee_id,manager_employee_id,password\n"
+        "ana@example.com,Ana,Diaz,A1,,first-password\n"
+        "ben@example.com,Ben,Ng,A2,A1,\n"
+        "employee@example.com,Dup,Licate,A3,,\n"
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        other = Organization.objects.create(name="Other", headquarters_address="-")
+        CustomUser.objects.create_user(
+            email="taken@example.com", username="taken", password="secret-password",
+            organization=other, employee_id="T1",
+        )
+
+    def upload(self, user, content, **data):
+        upload = SimpleUploadedFile("employees.csv", content.encode(), content_type="text/csv")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client_for(user).post(
+                "/api/users/import_csv/", {"file": upload, **data}, format="multipart"
+            )
+        self.assertEqual(response.status_code, 202)
+        return self.client_for(user).get(f"/api/users/import_csv/{response.json()['job_id']}/")
+
+    def test_import_runs_in_the_background(self):
+        response = self.upload(self.hr, self.CSV)
+        self.assertEqual(response.status_code, 200)
+        job = response.json()
+        self.assertEqual(job["status"], "done")
+        self.assertEqual(job["report"]["created"], 2)
+        self.assertEqual([error["row"] for error in job["report"]["errors"]], [4])
+
+        ana = CustomUser.objects.get(email="ana@example.com")
+        ben = CustomUser.objects.get(email="ben@example.com")
+        self.assertEqual(ana.organization, self.organization)
+        self.assertTrue(ana.check_password("first-password"))
+        self.assertFalse(ben.has_usable_password())
+        self.assertEqual(ben.manager, ana)
+        self.assertEqual(list(ben.get_ancestors()), [ana])
+
+    def test_dry_run_writes_nothing(self):
+        job = self.upload(self.hr, self.CSV, dry_run="true").json()
+        self.assertEqual(job["report"]["created"], 2)
+        self.assertFalse(CustomUser.objects.filter(email="ana@example.com").exists())
+
+    def test_other_tenants_values_are_duplicates(self):
+        csv = "email,username,employee_id\nTAKEN@example.com,new,N1\nnew@example.com,taken,N2\nnew2@example.com,new2,T1\n"
+        job = self.upload(self.hr, csv).json()
+        self.assertEqual(job["report"]["created"], 0)
+        self.assertEqual(
+            [set(error["errors"]) for error in job["report"]["errors"]],
+            [{"email"}, {"username"}, {"employee_id"}],
+        )
+
+    def test_reports_are_private_to_hr_of_the_organization(self):
+        upload = SimpleUploadedFile("employees.csv", self.CSV.encode(), content_type="text/csv")
+        response = self.client_for(self.employee).post(
+            "/api/users/import_csv/", {"file": upload}, format="multipart"
+        )
+        self.assertEqual(response.status_code, 403)
+        job_id = self.upload(self.hr, self.CSV).json()["job_id"]
+        response = self.client_for(self.employee).get(f"/api/users/import_csv/{job_id}/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_conflicting_writes_roll_the_import_back(self):
+        importer = EmployeeImporter(organization=self.organization)
+        rows = [{"email": "ana@example.com"}, {"email": "taken@example.com"}]
+        # As if taken@example.com had been created after the chunk was checked
+        with mock.patch.object(EmployeeImporter, "_taken", return_value=(set(), set(), set())):
+            report = importer.run(rows)
+        self.assertEqual(report["created"], 0)
+        self.assertEqual(len(report["errors"]), 1)
+        self.assertFalse(CustomUser.objects.filter(email="ana@example.com").exists())
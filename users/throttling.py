@@ -0,0 +1,95 @@
+"""
+Token-bucket throttling of failed login attempts, per client IP and per
+account.
+
+Only failures spend tokens. A morning login storm is never throttled, it
+queues in users.login_pool, and nobody can lock an account out without
+guessing wrong passwords for it. The client IP is the one DRF's throttles
+use: the REMOTE_ADDR, or the X-Forwarded-For hop added by the last of
+REST_FRAMEWORK["NUM_PROXIES"] trusted proxies.
+
+Bucket state lives in the Django cache so every worker sees the same
+counts. Updates are read-modify-write without a lock: concurrent attempts
+may occasionally both get the last token, which is fine for throttling.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+
+class TokenBucket:
+    """
+    ``capacity`` attempts in a burst, refilled evenly over ``period`` seconds
+    """
+
+    def __init__(self, scope, capacity, period):
+        self.scope = scope
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.period = period
+
+    def key(self, ident):
+        return f"throttle:{self.scope}:{ident}"
+
+    def _tokens(self, state, now):
+        tokens, updated = state or (self.capacity, now)
+        return min(self.capacity, tokens + (now - updated) * self.rate)
+
+    def _wait(self, state, now):
+        tokens = self._tokens(state, now)
+        return None if tokens >= 1 else (1 - tokens) / self.rate
+
+    def _take(self, state, now):
+        return max(self._tokens(state, now) - 1, 0), now
+
+    def wait(self, ident):
+        """
+        None when a token is available, otherwise the number of seconds
+        until the next one
+        """
+        return self._wait(cache.get(self.key(ident)), time.time())
+
+    def consume(self, ident):
+        """
+        Take one token, if any is left
+        """
+        state = self._take(cache.get(self.key(ident)), time.time())
+        cache.set(self.key(ident), state, timeout=self.period)
+
+
+
+def login_buckets():
+    return [
+        TokenBucket(f"login-{scope}", capacity, period)
+        for scope, (capacity, period) in settings.LOGIN_THROTTLE_RATES.items()
+    ]
+
+
+def client_ip(request):
+    return BaseThrottle().get_ident(request) if request is not None else None
+
+
+def _idents(ip, email):
+    return {"login-ip": ip or "unknown", "login-account": (email or "").strip().lower()}
+
+
+def check_login_throttle(ip, email):
+    """
+    Seconds to wait before trying again, or None if the attempt may proceed
+    """
+    idents = _idents(ip, email)
+    for bucket in login_buckets():
+        retry_after = bucket.wait(idents[bucket.scope])
+        if retry_after is not None:
+            return retry_after
+    return None
+
+
+def record_failed_login(ip, email):
+    idents = _idents(ip, email)
+    for bucket in login_buckets():
+        bucket.consume(idents[bucket.scope])
+
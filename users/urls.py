@@ -1,13 +1,13 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from users.views import UserViewSet, RegisterView, LoginView, LogoutView
+from users.views import UserViewSet, RegisterView, LogoutView, async_login
 
 router = DefaultRouter()
 router.register(r'', UserViewSet, basename='users')
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
-    path('login/', LoginView.as_view(), name='login'),
+    path('login/', async_login, name='login'),
     path("logout/", LogoutView.as_view(), name="logout"),
     path('', include(router.urls)),
 ]
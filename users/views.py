@@ -1,5 +1,6 @@
 from rest_framework import viewsets, status, generics
 from rest_framework.decorators import action
+from rest_framework.exceptions import Throttled
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.views import APIView
@@ -8,11 +9,62 @@ from users.models import CustomUser
 from rest_framework_simplejwt.views import TokenRefreshView
 from users.serializers import UserSerializer, UserDetailSerializer, RegisterSerializer, LoginSerializer
 from django.conf import settings
+from django.db import transaction
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework_simplejwt.exceptions import TokenError
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils.http import parse_etags
+from users.cache import get_me_payload, me_etag
+from users.importers import get_import_job, stage_import
+from users.media import stage_profile_picture, validate_profile_picture
+from users.pagination import EmployeeCursorPagination
+from users.login_pool import LoginPoolFull, run_in_login_pool
+from users.revocation import revoke_token
+from users.tasks import import_employees
+import json
+import math
+
+
+def set_auth_cookies(response, refresh):
+    response.set_cookie(
+        key="access_token",
+        value=str(refresh.access_token),
+        httponly=True,
+        secure=settings.DEBUG is False,
+        samesite="Lax",
+        max_age=30 * 60,
+    )
+    response.set_cookie(
+        key="refresh_token",
+        value=str(refresh),
+        httponly=True,
+        secure=settings.DEBUG is False,
+        samesite="Lax",
+        max_age=60 * 60 * 24 * 7,
+    )
+
 
 class UserViewSet(viewsets.ModelViewSet):
     """User management viewset"""
     queryset = CustomUser.objects.all()
     serializer_class = UserSerializer
+    pagination_class = EmployeeCursorPagination
+
+    def get_queryset(self):
+        """
+        Employees of the caller's organization, with the relations the
+        serializers name joined in
+        """
+        user = self.request.user
+        queryset = super().get_queryset().select_related(
+            'organization', 'department', 'designation'
+        )
+        if user.is_superuser:
+            return queryset
+        if not user.is_authenticated:
+            return queryset.none()
+        return queryset.filter(organization_id=user.organization_id)
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
@@ -22,18 +74,92 @@ class UserViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def me(self, request):
         """Get current user info"""
-        serializer = UserDetailSerializer(request.user)
-        return Response(serializer.data)
+        etag = me_etag(request.user)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            payload = get_me_payload(
+                request.user,
+                lambda user: UserDetailSerializer(user).data,
+                etag,
+            )
+            response = Response(payload)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    @action(detail=False, methods=['post'])
+    def import_csv(self, request):
+        """
+        Queue a bulk import of employees of the caller's organization from
+        a CSV upload; poll import_csv/<job_id>/ for the report
+        """
+        user = request.user
+        if user.role not in ['hr', 'admin'] or user.organization_id is None:
+            return Response({'error': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
+
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+        job_id, path = stage_import(user.organization, upload, dry_run)
+        transaction.on_commit(
+            lambda: import_employees.delay(job_id, user.organization_id, path, dry_run)
+        )
+        return Response(
+            {'job_id': job_id, 'status': 'queued', 'dry_run': dry_run},
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+    @action(detail=False, methods=['get'], url_path=r'import_csv/(?P<job_id>[0-9a-f]{32})')
+    def import_status(self, request, job_id=None):
+        """Status and report of a queued import"""
+        user = request.user
+        job = get_import_job(job_id)
+        if (
+            user.role not in ['hr', 'admin']
+            or job is None
+            or job['organization_id'] != user.organization_id
+        ):
+            return Response({'error': 'Import not found'}, status=status.HTTP_404_NOT_FOUND)
+        job = {key: value for key, value in job.items() if key != 'organization_id'}
+        return Response({'job_id': job_id, **job})
 
     @action(detail=False, methods=['put'])
     def update_profile(self, request):
         """Update user profile"""
         user = request.user
         serializer = UserDetailSerializer(user, data=request.data, partial=True)
-        if serializer.is_valid():
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        # A rejected picture must not leave the other fields half-saved
+        upload = request.FILES.get('profile_picture')
+        if upload is not None:
+            try:
+                validate_profile_picture(upload)
+            except DjangoValidationError as e:
+                return Response({'profile_picture': e.messages}, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
             serializer.save()
-            return Response(serializer.data)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            if upload is not None:
+                stage_profile_picture(user, upload)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['post'])
+    def profile_picture(self, request):
+        """Upload a profile picture; thumbnails are made in the background"""
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            user = stage_profile_picture(request.user, upload)
+        except DjangoValidationError as e:
+            return Response({'error': e.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            {'profile_picture_status': user.profile_picture_status},
+            status=status.HTTP_202_ACCEPTED,
+        )
 
     @action(detail=False, methods=['post'])
     def change_password(self, request):
@@ -87,41 +213,55 @@ class RegisterView(generics.CreateAPIView):
         return response
 
 
-class LoginView(generics.GenericAPIView):
-    """User login view"""
-    serializer_class = LoginSerializer
-    permission_classes = []
+def _login(data, request):
+    """
+    Runs in the login pool: hashing and the user queries stay off the
+    event loop.
+    """
+    serializer = LoginSerializer(data=data, context={'request': request})
+    if not serializer.is_valid():
+        return serializer.errors, None
+    user = serializer.validated_data['user']
+    return {'user': UserSerializer(user).data}, RefreshToken.for_user(user)
 
-    def post(self, request):
-        serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        user = serializer.validated_data['user']
-        refresh = RefreshToken.for_user(user)
-        response = Response({
-            'user': UserSerializer(user).data,
-        }, status=status.HTTP_200_OK)
-    
-        # 🔐 Set cookies
-        response.set_cookie(
-            key="access_token",
-            value=str(refresh.access_token),
-            httponly=True,
-            secure=settings.DEBUG is False,
-            samesite="Lax",
-            max_age=30 * 60,
-        )
 
-        response.set_cookie(
-            key="refresh_token",
-            value=str(refresh),
-            httponly=True,
-            secure=settings.DEBUG is False,
-            samesite="Lax",
-            max_age=60 * 60 * 24 * 7,
-        )
+@csrf_exempt
+async def async_login(request):
+    """
+    Login with LoginSerializer, answering with the user and the auth
+    cookies. Password hashing runs in a bounded pool so a login storm
+    queues behind it instead of occupying request workers.
+    """
+    if request.method != "POST":
+        return JsonResponse({'detail': 'Method "%s" not allowed.' % request.method}, status=405)
 
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError as e:
+            return JsonResponse({'detail': f'JSON parse error - {e}'}, status=400)
+    else:
+        data = request.POST
+
+    try:
+        payload, refresh = await run_in_login_pool(_login, data, request)
+    except LoginPoolFull:
+        response = JsonResponse({'detail': 'Login is busy, try again shortly'}, status=503)
+        response['Retry-After'] = '1'
+        return response
+    except Throttled as e:
+        response = JsonResponse({'detail': str(e.detail)}, status=e.status_code)
+        response['Retry-After'] = str(math.ceil(e.wait))
         return response
 
+    # Serializer errors, e.g. {"non_field_errors": ["Invalid credentials"]}
+    if refresh is None:
+        return JsonResponse(payload, status=400)
+
+    response = JsonResponse(payload, status=200)
+    set_auth_cookies(response, refresh)
+    return response
+
 
 class CookieTokenRefreshView(TokenRefreshView):
     permission_classes = []
@@ -168,6 +308,16 @@ class CookieTokenRefreshView(TokenRefreshView):
 
 class LogoutView(APIView):
     def post(self, request):
+        # Revoke both tokens so copies of the cookies stop working too
+        if request.auth is not None:
+            revoke_token(request.auth)
+        raw_refresh = request.data.get('refresh') or request.COOKIES.get('refresh_token')
+        if raw_refresh:
+            try:
+                revoke_token(RefreshToken(raw_refresh))
+            except TokenError:
+                pass
+
         response = Response({"detail": "Logged out"}, status=200)
         response.delete_cookie("access_token")
         response.delete_cookie("refresh_token")